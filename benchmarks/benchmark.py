@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import numpy as np
+import mistlib as mist
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "../examples")
+
+# Properties needed by the adamantine, AdditiveFOAM and 3DThesis writers
+WRITER_PROPERTIES = [
+    "density",
+    "specific_heat_solid",
+    "specific_heat_liquid",
+    "thermal_conductivity_solid",
+    "thermal_conductivity_liquid",
+    "latent_heat_fusion",
+    "liquidus_temperature",
+    "solidus_eutectic_temperature",
+]
+
+
+def make_synthetic_library(directory, num_materials, seed=0):
+    # Write num_materials material files into directory, cycling through the
+    # examples. Every numeric property value is scaled by a random factor
+    # close to one so that the materials are distinct but physically similar.
+    rng = random.Random(seed)
+    examples = []
+    for name in sorted(os.listdir(EXAMPLES_DIR)):
+        if name.endswith(".json"):
+            with open(os.path.join(EXAMPLES_DIR, name), "r") as f:
+                examples.append(json.load(f))
+
+    files = []
+    for i in range(num_materials):
+        data = json.loads(json.dumps(examples[i % len(examples)]))
+        data["name"] = f"{data['name']}_{i}"
+        for p in data.get("thermophysical_properties", {}).values():
+            scale = rng.uniform(0.95, 1.05)
+            if isinstance(p.get("value"), (int, float)):
+                p["value"] = p["value"] * scale
+            if "value_laurent_poly" in p:
+                p["value_laurent_poly"] = [
+                    [c * scale, e] for c, e in p["value_laurent_poly"]
+                ]
+        file = os.path.join(directory, f"material_{i:06d}.json")
+        with open(file, "w") as f:
+            json.dump(data, f, indent=4)
+        files.append(file)
+    return files
+
+
+def time_call(function, repeat, number=1):
+    # Best and median time per call over repeat rounds of number calls
+    times = timeit.Timer(function).repeat(repeat=repeat, number=number)
+    times = [t / number for t in times]
+    return {
+        "best": min(times),
+        "median": float(np.median(times)),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def calls_per_round(function, target=0.05):
+    # Number of calls that take roughly target seconds, so that very fast
+    # functions are timed over many calls. The first call is not timed, it
+    # may include one-off work such as compiling an evaluator.
+    function()
+    start = time.perf_counter()
+    function()
+    elapsed = max(time.perf_counter() - start, 1.0e-7)
+    return max(1, min(100000, int(target / elapsed)))
+
+
+def run_benchmarks(num_materials=100, array_size=100000, repeat=5, seed=0):
+    results = {}
+
+    def record(name, function, number=None, count=1):
+        if number is None:
+            number = calls_per_round(function)
+        result = time_call(function, repeat, number)
+        # Per item times for benchmarks that loop over the library
+        result["items"] = count
+        result["best_per_item"] = result["best"] / count
+        results[name] = result
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        library_dir = os.path.join(tmp_dir, "library")
+        os.makedirs(library_dir)
+        files = make_synthetic_library(library_dir, num_materials, seed)
+
+        # Loading
+        record(
+            "load_json",
+            lambda: [mist.core.MaterialInformation(file) for file in files],
+            number=1,
+            count=len(files),
+        )
+        materials = [mist.core.MaterialInformation(file) for file in files]
+        writable = [
+            m
+            for m in materials
+            if all(m.properties.get(p) is not None for p in WRITER_PROPERTIES)
+        ]
+        assert len(writable) > 0
+
+        # Property evaluation
+        mat = writable[0]
+        prop = mat.properties["specific_heat_solid"]
+        temperatures = np.linspace(300.0, 1700.0, array_size)
+        record(
+            "evaluate_laurent_polynomial_scalar",
+            lambda: prop.evaluate_laurent_polynomial(1000.0),
+        )
+        record(
+            "evaluate_laurent_polynomial_array",
+            lambda: prop.evaluate_laurent_polynomial(temperatures),
+            count=array_size,
+        )
+
+        # get_property, both memoized and with the cache cleared on every call
+        record(
+            "get_property_scalar_cached",
+            lambda: mat.get_property("specific_heat_solid", "benchmark", 1000.0),
+        )
+
+        def get_property_uncached():
+            mat.clear_property_cache()
+            return mat.get_property("specific_heat_solid", "benchmark", 1000.0)
+
+        record("get_property_scalar_uncached", get_property_uncached)
+        record(
+            "get_property_array",
+            lambda: mat.get_property("specific_heat_solid", "benchmark", temperatures),
+            count=array_size,
+        )
+
+        results["memory"] = measure_memory(files)
+
+        # Writers, over the whole library
+        out_dir = os.path.join(tmp_dir, "out")
+        os.makedirs(out_dir)
+        markdown_file = os.path.join(out_dir, "material.md")
+        record(
+            "write_markdown",
+            lambda: [m.write_markdown(markdown_file) for m in materials],
+            number=1,
+            count=len(materials),
+        )
+        adamantine_file = os.path.join(out_dir, "mistinput.info")
+        record(
+            "write_adamantine_input",
+            lambda: [m.write_adamantine_input(adamantine_file) for m in writable],
+            number=1,
+            count=len(writable),
+        )
+        transport_file = os.path.join(out_dir, "transportProperties")
+        thermo_file = os.path.join(out_dir, "thermoPath")
+        record(
+            "write_additivefoam_input",
+            lambda: [
+                m.write_additivefoam_input(transport_file, thermo_file)
+                for m in writable
+            ],
+            number=1,
+            count=len(writable),
+        )
+        thesis_file = os.path.join(out_dir, "3dthesis_input.txt")
+        record(
+            "write_3dthesis_input",
+            lambda: [m.write_3dthesis_input(thesis_file) for m in writable],
+            number=1,
+            count=len(writable),
+        )
+
+    return results
+
+
+def measure_memory(files):
+    # Bytes per material held by loaded MaterialInformation objects and by a
+    # CoefficientStore of the same materials
+    materials = [mist.core.MaterialInformation(file) for file in files[:1]]
+    tracemalloc.start()
+    materials = [mist.core.MaterialInformation(file) for file in files]
+    materials_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    store = mist.store.CoefficientStore(materials)
+    store_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {
+        "materials_per_item": materials_size / len(files),
+        "coefficient_store_per_item": store_size / len(store),
+        "items": len(files),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "git_revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results, baseline, threshold=1.2):
+    # Names of the benchmarks that are more than threshold times slower than
+    # in the baseline run, with the ratio of best times
+    regressions = {}
+    for name, result in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if name == "memory" and previous is not None:
+            ratio = result["materials_per_item"] / previous["materials_per_item"]
+            if ratio > threshold:
+                regressions[name] = ratio
+            continue
+        if previous is None or previous["best_per_item"] <= 0.0:
+            continue
+        ratio = result["best_per_item"] / previous["best_per_item"]
+        if ratio > threshold:
+            regressions[name] = ratio
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark loading, property evaluation and input deck writing."
+    )
+    parser.add_argument(
+        "-n",
+        "--materials",
+        type=int,
+        default=100,
+        help="Number of materials in the synthetic library",
+    )
+    parser.add_argument(
+        "--array-size",
+        type=int,
+        default=100000,
+        help="Number of temperatures for the array benchmarks",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=5, help="Number of timing rounds"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed for the synthetic library"
+    )
+    parser.add_argument(
+        "-o", "--output", default=None, help="JSON file for the results"
+    )
+    parser.add_argument(
+        "--compare", default=None, help="JSON results of a previous run"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="Slowdown relative to --compare that counts as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = {
+        "parameters": {
+            "materials": args.materials,
+            "array_size": args.array_size,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "environment": environment(),
+        "benchmarks": run_benchmarks(
+            args.materials, args.array_size, args.repeat, args.seed
+        ),
+    }
+
+    text = json.dumps(results, indent=4)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions.items():
+            print(f"Warning: {name} is {ratio:.2f}x slower than in {args.compare}.")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
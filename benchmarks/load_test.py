@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import numpy as np
+from mistlib.server import PropertyClient, PropertyServer, ServerThread
+from benchmark import environment, make_synthetic_library
+
+# Properties requested by the load test
+LOAD_TEST_PROPERTIES = [
+    "density",
+    "specific_heat_solid",
+    "specific_heat_liquid",
+    "thermal_conductivity_solid",
+    "thermal_conductivity_liquid",
+]
+
+
+def available_queries(client, materials, properties=LOAD_TEST_PROPERTIES):
+    # (material, property) pairs the server can evaluate, so that the load
+    # test does not time requests that fail (e.g. materials without
+    # thermophysical properties)
+    requests = [
+        {"material": material, "property": property, "temperatures": [300.0]}
+        for material in materials
+        for property in properties
+    ]
+    results = client.evaluate_batch(requests)
+    return [
+        (request["material"], request["property"])
+        for request, result in zip(requests, results)
+        if "values" in result
+    ]
+
+
+def make_requests(queries, num_requests, batch_size, num_temperatures, hot, seed):
+    # Request bodies for one client, from the (material, property) pairs in
+    # queries. A fraction hot of the requests repeat a small set of queries
+    # (and should be served from the result cache), the others use random
+    # temperatures.
+    rng = random.Random(seed)
+    hot_temperatures = np.linspace(300.0, 2000.0, num_temperatures).tolist()
+    bodies = []
+    for i in range(num_requests):
+        items = []
+        for j in range(batch_size):
+            if rng.random() < hot:
+                material, property = queries[j % min(len(queries), 4)]
+                temperatures = hot_temperatures
+            else:
+                material, property = rng.choice(queries)
+                temperatures = [
+                    rng.uniform(300.0, 2000.0) for k in range(num_temperatures)
+                ]
+            items.append(
+                {
+                    "material": material,
+                    "property": property,
+                    "temperatures": temperatures,
+                }
+            )
+        bodies.append(json.dumps({"requests": items}).encode("utf-8"))
+    return bodies
+
+
+async def open_connection(host, port, unix_socket):
+    if unix_socket is not None:
+        return await asyncio.open_unix_connection(unix_socket)
+    return await asyncio.open_connection(host, port)
+
+
+async def run_client(host, port, unix_socket, bodies, latencies):
+    # Send the requests one after the other over a keep-alive connection.
+    # Returns the number of failed requests and of failed items of the
+    # batches that succeeded.
+    reader, writer = await open_connection(host, port, unix_socket)
+    errors = 0
+    item_errors = 0
+    for body in bodies:
+        start = time.perf_counter()
+        writer.write(
+            (
+                "POST /evaluate HTTP/1.1\r\n"
+                "Host: localhost\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "\r\n"
+            ).encode("latin-1")
+            + body
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            if key.strip().lower() == "content-length":
+                length = int(value)
+        content = await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors = errors + 1
+            continue
+        results = json.loads(content)["results"]
+        item_errors = item_errors + sum(1 for result in results if "error" in result)
+    writer.close()
+    return errors, item_errors
+
+
+async def run_clients(host, port, unix_socket, client_bodies):
+    latencies = []
+    start = time.perf_counter()
+    errors = await asyncio.gather(
+        *[
+            run_client(host, port, unix_socket, bodies, latencies)
+            for bodies in client_bodies
+        ]
+    )
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies, sum(e[0] for e in errors), sum(e[1] for e in errors)
+
+
+def run_load_test(
+    host,
+    port,
+    unix_socket=None,
+    clients=16,
+    requests=200,
+    batch_size=8,
+    num_temperatures=64,
+    hot=0.5,
+    seed=0,
+):
+    # Run the load test against a running server and return the client side
+    # latencies and throughput together with the server's /stats
+    client = PropertyClient(host, port, unix_socket)
+    queries = available_queries(client, client.materials())
+    if len(queries) == 0:
+        raise ValueError("No material of the server has the load test properties.")
+    client_bodies = [
+        make_requests(queries, requests, batch_size, num_temperatures, hot, seed + i)
+        for i in range(clients)
+    ]
+    elapsed, latencies, errors, item_errors = asyncio.run(
+        run_clients(host, port, unix_socket, client_bodies)
+    )
+    latencies = np.array(latencies)
+    # Only evaluations that returned values count towards the throughput
+    evaluations = (len(latencies) - errors) * batch_size - item_errors
+    results = {
+        "requests": len(latencies),
+        "errors": errors + item_errors,
+        "failed_requests": errors,
+        "failed_evaluations": item_errors,
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "evaluations_per_second": evaluations / elapsed,
+        "latency": {
+            "mean": float(latencies.mean()),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+            "max": float(latencies.max()),
+        },
+        "server": client.stats(),
+    }
+    client.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load test the property server with concurrent clients."
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=None,
+        help="Port of a running server (by default a server is started on a "
+        "synthetic library)",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Host of the server")
+    parser.add_argument(
+        "--unix-socket", default=None, help="Unix socket of a running server"
+    )
+    parser.add_argument(
+        "-n",
+        "--materials",
+        type=int,
+        default=100,
+        help="Number of materials in the synthetic library",
+    )
+    parser.add_argument(
+        "-c", "--clients", type=int, default=16, help="Number of concurrent clients"
+    )
+    parser.add_argument(
+        "-r", "--requests", type=int, default=200, help="Requests per client"
+    )
+    parser.add_argument(
+        "-b", "--batch-size", type=int, default=8, help="Evaluations per request"
+    )
+    parser.add_argument(
+        "-t",
+        "--temperatures",
+        type=int,
+        default=64,
+        help="Temperatures per evaluation",
+    )
+    parser.add_argument(
+        "--hot",
+        type=float,
+        default=0.5,
+        help="Fraction of evaluations that repeat a small set of queries",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "-o", "--output", default=None, help="JSON file for the results"
+    )
+    args = parser.parse_args(argv)
+
+    parameters = {
+        "clients": args.clients,
+        "requests": args.requests,
+        "batch_size": args.batch_size,
+        "temperatures": args.temperatures,
+        "hot": args.hot,
+        "seed": args.seed,
+    }
+
+    if args.port is not None or args.unix_socket is not None:
+        results = run_load_test(
+            args.host,
+            args.port,
+            args.unix_socket,
+            args.clients,
+            args.requests,
+            args.batch_size,
+            args.temperatures,
+            args.hot,
+            args.seed,
+        )
+    else:
+        parameters["materials"] = args.materials
+        with tempfile.TemporaryDirectory() as directory:
+            make_synthetic_library(directory, args.materials, args.seed)
+            thread = ServerThread(PropertyServer(directory, preload=True))
+            host, port = thread.address()[:2]
+            try:
+                results = run_load_test(
+                    host,
+                    port,
+                    None,
+                    args.clients,
+                    args.requests,
+                    args.batch_size,
+                    args.temperatures,
+                    args.hot,
+                    args.seed,
+                )
+            finally:
+                thread.stop()
+
+    text = json.dumps(
+        {"parameters": parameters, "environment": environment(), "results": results},
+        indent=4,
+    )
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,36 @@
+import importlib
+
 from mistlib import core
+
+# The remaining submodules are imported on first attribute access (e.g.
+# mistlib.batch) so that "import mistlib" stays cheap for processes that only
+# load materials and evaluate properties
+SUBMODULES = (
+    "library",
+    "cache",
+    "batch",
+    "report",
+    "enthalpy",
+    "profiling",
+    "serialization",
+    "validation",
+    "store",
+    "server",
+    "uncertainty",
+    "composition",
+    "units",
+    "query",
+    "manifest",
+    "phases",
+    "derived",
+)
+
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module("mistlib." + name)
+    raise AttributeError(f"module 'mistlib' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(SUBMODULES))
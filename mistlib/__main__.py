@@ -0,0 +1,25 @@
+import sys
+
+from mistlib import batch
+from mistlib import server
+from mistlib import validation
+
+# Command line entry point: python -m mistlib <command> [options]
+COMMANDS = {
+    "export": batch.main,
+    "validate": validation.main,
+    "serve": server.main,
+}
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) == 0 or argv[0] not in COMMANDS:
+        print(f"Usage: python -m mistlib {{{','.join(COMMANDS)}}} [options]")
+        return 2
+    return COMMANDS[argv[0]](argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,465 @@
+import argparse
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from mistlib import profiling
+from mistlib.core import adamantine_input_content, thesis_input_content
+from mistlib.library import (
+    check_file_name,
+    load_source,
+    material_sources,
+    source_label,
+)
+from mistlib.manifest import BuildManifest
+
+# Supported export targets. Solver input decks are written by default, the
+# datasheet targets have to be requested explicitly.
+TARGETS = ("adamantine", "additivefoam", "3dthesis")
+REPORT_TARGETS = ("markdown", "pdf")
+
+# Targets whose decks can be written from columns of solver inputs (see
+# write_decks), with the function building the deck text and the file name
+DECK_CONTENT = {
+    "adamantine": adamantine_input_content,
+    "3dthesis": thesis_input_content,
+}
+DECK_FILES = {
+    "adamantine": "mistinput.info",
+    "3dthesis": "3dthesis_input.txt",
+}
+
+
+class ExportResult:
+    # Outcome of exporting one material to one target. skipped is True for
+    # decks that were up to date in an incremental export.
+    def __init__(self, material, target, files=None, error=None, skipped=False):
+        self.material = material
+        self.target = target
+        self.files = files if files is not None else []
+        self.error = error
+        self.skipped = skipped
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"failed: {self.error}"
+        if self.skipped:
+            status = "up to date"
+        return f"ExportResult({self.material}, {self.target}, {status})"
+
+
+def export_material(material, target, output_dir, options=None):
+    # Write the input deck(s) for one target into
+    # <output_dir>/<material name>/<target>/ and return the files written
+    if options is None:
+        options = {}
+    check_file_name(material.name)
+    target_dir = os.path.join(output_dir, material.name, target)
+    os.makedirs(target_dir, exist_ok=True)
+
+    if target == "adamantine":
+        file = os.path.join(target_dir, "mistinput.info")
+        material.write_adamantine_input(file)
+        files = [file]
+    elif target == "additivefoam":
+        files = material.write_additivefoam_input(
+            transport_file=os.path.join(target_dir, "transportProperties"),
+            thermo_file=os.path.join(target_dir, "thermoPath"),
+        )
+    elif target == "3dthesis":
+        file = os.path.join(target_dir, "3dthesis_input.txt")
+        material.write_3dthesis_input(
+            file, initial_temperature=options.get("initial_temperature")
+        )
+        files = [file]
+    elif target == "markdown":
+        file = os.path.join(target_dir, material.name + ".md")
+        material.write_markdown(file, options.get("tables", ["properties"]))
+        files = [file]
+    elif target == "pdf":
+        file = os.path.join(target_dir, material.name + ".pdf")
+        material.write_pdf(file, options.get("tables", ["properties"]))
+        files = [file]
+    else:
+        raise ValueError(
+            f"Unknown export target {target}, expected one of {TARGETS + REPORT_TARGETS}."
+        )
+
+    return files
+
+
+def validation_target(target):
+    # Validation profile of an export target
+    if target in REPORT_TARGETS:
+        return "report"
+    return target
+
+
+def export_item(source, targets, output_dir, options):
+    # Load (if needed) and export one material to all targets. Failures are
+    # recorded per target instead of being raised.
+    label = source_label(source)
+    try:
+        material = load_source(source)
+        label = material.name
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        return [ExportResult(label, target, error=error) for target in targets]
+
+    report = None
+    if options.get("validate"):
+        # Reject incomplete materials before writing anything
+        from mistlib.validation import validate_material
+
+        report = validate_material(
+            material, [validation_target(target) for target in targets]
+        )
+
+    results = []
+    for target in targets:
+        if report is not None and not report.ok_for(validation_target(target)):
+            messages = [
+                issue.message for issue in report.errors(validation_target(target))
+            ]
+            error = "ValidationError: " + " ".join(messages)
+            results.append(ExportResult(label, target, error=error))
+            continue
+        try:
+            files = export_material(material, target, output_dir, options)
+            results.append(ExportResult(label, target, files))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            results.append(ExportResult(label, target, error=error))
+    return results
+
+
+def export_selected(item, output_dir, options):
+    # Export one material to the targets selected for it, see
+    # export_incremental
+    source, targets = item
+    return export_item(source, targets, output_dir, options)
+
+
+def run_profiled(task, source, args):
+    # task for a worker process with profiling enabled. The worker's
+    # statistics are returned with the result and merged by the parent.
+    profiling.enable()
+    profiling.reset()
+    result = task(source, *args)
+    return result, profiling.get_stats()
+
+
+def map_sources(task, sources, workers, args=()):
+    # Yield task(source, *args) for every source, in input order. With more
+    # than one worker the tasks run in a process pool, with a bounded number
+    # of tasks in flight so that generators are consumed lazily and large
+    # batches do not sit in memory. task has to be a module level function.
+    if workers <= 1:
+        for source in sources:
+            yield task(source, *args)
+        return
+
+    profile = profiling.is_enabled()
+
+    def collect(future):
+        if profile:
+            result, stats = future.result()
+            profiling.merge(stats)
+            return result
+        return future.result()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        done_results = {}
+        next_index = 0
+        max_pending = 4 * workers
+        for i, source in enumerate(sources):
+            if profile:
+                future = executor.submit(run_profiled, task, source, args)
+            else:
+                future = executor.submit(task, source, *args)
+            pending[future] = i
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    done_results[pending.pop(future)] = collect(future)
+            while next_index in done_results:
+                yield done_results.pop(next_index)
+                next_index = next_index + 1
+        for future in list(pending):
+            done_results[pending.pop(future)] = collect(future)
+        while next_index in done_results:
+            yield done_results.pop(next_index)
+            next_index = next_index + 1
+
+
+def export_batch(
+    materials,
+    targets=TARGETS,
+    output_dir=".",
+    workers=None,
+    options=None,
+    incremental=False,
+):
+    # Export many materials to several targets. materials can be a
+    # MaterialLibrary, a directory, or any iterable (including generators) of
+    # JSON file paths and MaterialInformation objects. Work is spread over a
+    # process pool with one task per material, and a list of ExportResult
+    # (one per material and target, in input order) is returned.
+    #
+    # With incremental (True, or a BuildManifest) only the decks whose source,
+    # target options or outputs changed since the last incremental export to
+    # output_dir are written, see mistlib.manifest.
+    if isinstance(targets, str):
+        targets = [targets]
+    for target in targets:
+        if target not in TARGETS + REPORT_TARGETS:
+            raise ValueError(
+                f"Unknown export target {target}, expected one of {TARGETS + REPORT_TARGETS}."
+            )
+    if options is None:
+        options = {}
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if incremental:
+        manifest = incremental
+        if not isinstance(manifest, BuildManifest):
+            manifest = BuildManifest(output_dir)
+        return export_incremental(
+            material_sources(materials), targets, output_dir, workers, options, manifest
+        )
+
+    results = []
+    for item_results in map_sources(
+        export_item,
+        material_sources(materials),
+        workers,
+        (targets, output_dir, options),
+    ):
+        results.extend(item_results)
+    return results
+
+
+def export_incremental(sources, targets, output_dir, workers, options, manifest):
+    # export_batch for the stale decks of the manifest only. Sources are
+    # checked (and hashed if they changed) in this process, and only the
+    # materials with at least one stale target are sent to the workers.
+    checked = []
+
+    def stale_items():
+        for source in sources:
+            stale = [
+                target
+                for target in targets
+                if manifest.is_stale(source, target, options)
+            ]
+            checked.append((source, stale))
+            if len(stale) > 0:
+                yield source, stale
+
+    exported = list(
+        map_sources(export_selected, stale_items(), workers, (output_dir, options))
+    )
+
+    results = []
+    position = 0
+    for source, stale in checked:
+        written = {}
+        if len(stale) > 0:
+            written = {result.target: result for result in exported[position]}
+            position = position + 1
+        for target in targets:
+            result = written.get(target)
+            if result is None:
+                result = ExportResult(
+                    manifest.material_name(source, target),
+                    target,
+                    manifest.outputs(source, target),
+                    skipped=True,
+                )
+            elif result.ok:
+                manifest.record(source, target, options, result.material, result.files)
+            else:
+                manifest.forget(source, target)
+            results.append(result)
+    manifest.save()
+    return results
+
+
+def deck_inputs(columns, target, initial_temperature=None):
+    # Columns of solver inputs for write_decks, evaluated the same way as
+    # MaterialInformation.adamantine_inputs and thesis_inputs but for many
+    # variants of a material at once. columns is any columnar material set
+    # (e.g. mistlib.uncertainty.Ensemble or mistlib.composition.CompositionSweep)
+    # providing len(), scalar(property_name) and
+    # evaluate_at(property_name, values) with one value per variant.
+    solidus = columns.scalar("solidus_eutectic_temperature")
+    if target == "adamantine":
+        return {
+            "specific_heat_solid": columns.evaluate_at("specific_heat_solid", solidus),
+            "specific_heat_liquid": columns.evaluate_at(
+                "specific_heat_liquid", solidus
+            ),
+            "thermal_conductivity_solid": columns.evaluate_at(
+                "thermal_conductivity_solid", solidus
+            ),
+            "density": columns.evaluate_at("density", solidus),
+            "thermal_conductivity_liquid": columns.evaluate_at(
+                "thermal_conductivity_liquid", solidus
+            ),
+            "emissivity": columns.evaluate_at("emissivity", solidus),
+            "solidus_temperature": solidus,
+            "liquidus_temperature": columns.scalar("liquidus_temperature"),
+            "latent_heat_fusion": columns.scalar("latent_heat_fusion"),
+        }
+    if target == "3dthesis":
+        if initial_temperature is None:
+            initial_temperature = -1
+        return {
+            "thermal_conductivity": columns.evaluate_at(
+                "thermal_conductivity_solid", solidus
+            ),
+            "density": columns.evaluate_at("density", solidus),
+            "specific_heat": columns.evaluate_at("specific_heat_solid", solidus),
+            "initial_temperature": [initial_temperature] * len(columns),
+            "liquidus_temperature": columns.scalar("liquidus_temperature"),
+        }
+    raise ValueError(
+        f"Unknown deck target {target}, expected one of {tuple(DECK_CONTENT)}."
+    )
+
+
+def write_deck_chunk(chunk, target):
+    # Write the decks of one chunk of write_decks
+    files, inputs = chunk
+    content = DECK_CONTENT[target]
+    for i, file in enumerate(files):
+        directory = os.path.dirname(file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file, "w") as f:
+            f.write(content(**{name: values[i] for name, values in inputs.items()}))
+    return len(files)
+
+
+def deck_chunks(files, inputs, chunk_size):
+    for start in range(0, len(files), chunk_size):
+        end = start + chunk_size
+        chunk = {}
+        for name, values in inputs.items():
+            if isinstance(values, np.ndarray):
+                chunk[name] = values[start:end].tolist()
+            else:
+                chunk[name] = list(values[start:end])
+        yield files[start:end], chunk
+
+
+def write_decks(target, files, inputs, workers=None, chunk_size=256):
+    # Write one input deck per file from columns of solver inputs, e.g. the
+    # samples of an uncertainty ensemble. inputs maps the arguments of the
+    # target's content function (DECK_CONTENT) to sequences with one value per
+    # file. The decks are written in chunks by a process pool, so no
+    # MaterialInformation is built per deck. Returns the number written.
+    if target not in DECK_CONTENT:
+        raise ValueError(
+            f"Unknown deck target {target}, expected one of {tuple(DECK_CONTENT)}."
+        )
+    for name, values in inputs.items():
+        assert len(values) == len(files)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, (len(files) + chunk_size - 1) // chunk_size)
+
+    return sum(
+        map_sources(
+            write_deck_chunk, deck_chunks(files, inputs, chunk_size), workers, (target,)
+        )
+    )
+
+
+def write_pdfs(
+    materials, output_dir=".", workers=None, tables=["properties"], incremental=False
+):
+    # Render PDF datasheets for many materials in parallel
+    return export_batch(
+        materials, ["pdf"], output_dir, workers, {"tables": tables}, incremental
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m mistlib export",
+        description="Write simulation input decks for many materials in parallel.",
+    )
+    parser.add_argument(
+        "materials",
+        nargs="+",
+        help="Material JSON files, directories of them, or JSON Lines/JSON array "
+        "files with many materials",
+    )
+    parser.add_argument("-o", "--output", default=".", help="Output directory")
+    parser.add_argument(
+        "-t",
+        "--targets",
+        nargs="+",
+        default=list(TARGETS),
+        choices=TARGETS + REPORT_TARGETS,
+        help="Codes to write input for",
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--initial-temperature",
+        type=float,
+        default=None,
+        help="Initial temperature for 3DThesis",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Skip materials that are incomplete for a target",
+    )
+    parser.add_argument(
+        "--tables",
+        nargs="+",
+        default=["properties"],
+        help="Tables included in Markdown and PDF datasheets",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only write decks whose material, options or outputs changed since "
+        "the last incremental export (tracked in <output>/.mist-manifest.json)",
+    )
+    args = parser.parse_args(argv)
+
+    options = {
+        "initial_temperature": args.initial_temperature,
+        "tables": args.tables,
+        "validate": args.validate,
+    }
+    results = export_batch(
+        args.materials,
+        args.targets,
+        args.output,
+        args.workers,
+        options,
+        args.incremental,
+    )
+
+    failures = [result for result in results if not result.ok]
+    for result in failures:
+        print(f"Error: {result.material} ({result.target}): {result.error}")
+    skipped = len([result for result in results if result.skipped])
+    print(
+        f"Exported {len(results) - len(failures)} of {len(results)} decks to {args.output}."
+    )
+    if args.incremental:
+        print(f"{skipped} decks were up to date.")
+    return 1 if failures else 0
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+from mistlib.core import MaterialInformation
+from mistlib.profiling import profiled
+
+# Bump when the layout of the cached objects changes so that old entries are
+# rebuilt instead of unpickled
+CACHE_FORMAT_VERSION = 2
+
+
+class MaterialCache:
+    # Opt-in on-disk cache of parsed materials. Each entry is a small metadata
+    # header (format version, source path, mtime, size and content hash)
+    # followed by the pickled MaterialInformation, so a cache hit skips JSON
+    # parsing and Property construction entirely.
+    #
+    # validate="mtime" trusts the source modification time and size,
+    # validate="hash" re-hashes the source file contents on every load.
+    def __init__(self, cache_dir, validate="mtime"):
+        assert validate in ("mtime", "hash")
+        self.cache_dir = cache_dir
+        self.validate = validate
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        return
+
+    def cache_file(self, file):
+        key = hashlib.sha256(os.path.abspath(file).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:32] + ".mist")
+
+    @profiled("cache_load")
+    def load(self, file):
+        stat = os.stat(file)
+        content_hash = None
+        if self.validate == "hash":
+            content_hash = file_hash(file)
+
+        material = self.read_entry(file, stat, content_hash)
+        if material is not None:
+            self.hits = self.hits + 1
+            return material
+
+        self.misses = self.misses + 1
+        if content_hash is None:
+            content_hash = file_hash(file)
+        material = MaterialInformation(file)
+        self.write_entry(file, stat, content_hash, material)
+        return material
+
+    def read_entry(self, file, stat, content_hash):
+        try:
+            with open(self.cache_file(file), "rb") as f:
+                header = pickle.load(f)
+                if not self.header_is_valid(header, file, stat, content_hash):
+                    return None
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Corrupt or incompatible entries are rebuilt
+            return None
+
+    def header_is_valid(self, header, file, stat, content_hash):
+        if header.get("version") != CACHE_FORMAT_VERSION:
+            return False
+        if header.get("source") != os.path.abspath(file):
+            return False
+        if self.validate == "hash":
+            return header.get("hash") == content_hash
+        return (
+            header.get("mtime") == stat.st_mtime_ns
+            and header.get("size") == stat.st_size
+        )
+
+    def write_entry(self, file, stat, content_hash, material):
+        header = {
+            "version": CACHE_FORMAT_VERSION,
+            "source": os.path.abspath(file),
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": content_hash,
+        }
+        # Write to a private temporary file and rename it into place so that
+        # concurrent processes never see a partial entry
+        fd, temp_file = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(material, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, self.cache_file(file))
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+        return
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".mist"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+        return
+
+
+def file_hash(file):
+    h = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,224 @@
+import csv
+import os
+
+import numpy as np
+
+from mistlib import batch
+from mistlib.core import MaterialInformation, ValueTypes
+from mistlib.library import iter_materials
+
+# Built-in mixing rules of CompositionSweep
+MIXING_RULES = ("linear", "vegard")
+
+
+def composition_grid(contents):
+    # All combinations of the solute contents in contents, e.g.
+    # {"Cu": np.linspace(0, 5, 51), "Mg": np.linspace(0, 2, 21)}, as a dict of
+    # flat arrays with one entry per composition (1071 in the example)
+    elements = list(contents)
+    grids = np.meshgrid(*[np.asarray(contents[e], dtype=np.float64) for e in elements])
+    return {element: grid.reshape(-1) for element, grid in zip(elements, grids)}
+
+
+def linear_mixing(property_name, weights, values):
+    # Weighted average of the endpoint values. weights is (points, endpoints)
+    # and values (points, endpoints) or (points, endpoints, n).
+    if values.ndim == 3:
+        return np.einsum("ij,ijk->ik", weights, values)
+    return np.einsum("ij,ij->i", weights, values)
+
+
+class CompositionSweep:
+    # Properties of many compositions mixed from a few endpoint (reference)
+    # materials. Every composition gets one weight per endpoint, solving
+    #   sum_i w_i = 1 and sum_i w_i c_i = c
+    # (in the least squares sense if there are more endpoints than solutes
+    # plus one) for the solute contents c_i of the endpoints, and properties
+    # are mixed with these weights by one of the rules
+    #   "linear"  P = sum_i w_i P_i
+    #   "vegard"  P = sum_i w_i P_i - b sum_{i<j} w_i w_j, Vegard's law with a
+    #             bowing parameter b per property (bowing argument, default 0)
+    #   callable  rule(property_name, weights, values) with weights of shape
+    #             (points, endpoints) and endpoint values of shape
+    #             (points, endpoints) or (points, endpoints, n), returning the
+    #             mixed values
+    #
+    # The endpoint properties are evaluated once per call and mixed for all
+    # compositions in one vectorized step, without building a
+    # MaterialInformation per composition. Solute contents are in the unit of
+    # the endpoints' composition entries (e.g. at.%). endpoint_compositions
+    # gives (or overrides) the solute contents of the endpoints, as one dict
+    # per endpoint.
+    def __init__(
+        self,
+        endpoints,
+        compositions,
+        rule="linear",
+        bowing=None,
+        endpoint_compositions=None,
+    ):
+        self.endpoints = list(iter_materials(endpoints))
+        self.elements = list(compositions)
+        self.compositions = np.column_stack(
+            [np.asarray(compositions[e], dtype=np.float64) for e in self.elements]
+        )
+        self.num_points = self.compositions.shape[0]
+        if isinstance(rule, str) and rule not in MIXING_RULES:
+            raise ValueError(
+                f"Unknown mixing rule {rule}, expected one of {MIXING_RULES}."
+            )
+        self.rule = rule
+        self.bowing = bowing if bowing is not None else {}
+
+        # Solute contents of the endpoints, (endpoints, elements)
+        self.endpoint_contents = np.zeros((len(self.endpoints), len(self.elements)))
+        for i, material in enumerate(self.endpoints):
+            overrides = {}
+            if endpoint_compositions is not None:
+                overrides = endpoint_compositions[i]
+            for j, element in enumerate(self.elements):
+                self.endpoint_contents[i, j] = self.endpoint_content(
+                    material, element, overrides
+                )
+
+        # Mixing weights, (points, endpoints)
+        system = np.column_stack([self.endpoint_contents, np.ones(len(self.endpoints))])
+        targets = np.column_stack([self.compositions, np.ones(self.num_points)])
+        self.weights = targets @ np.linalg.pinv(system)
+
+        tolerance = 1e-9
+        self.extrapolated = np.any(
+            (self.weights < -tolerance) | (self.weights > 1.0 + tolerance), axis=1
+        )
+        if np.any(self.extrapolated):
+            print(
+                f"Warning: {np.count_nonzero(self.extrapolated)} compositions are outside the endpoints, their properties are extrapolated."
+            )
+
+        # Thermophysical properties defined for every endpoint
+        self.property_names = [
+            name
+            for name in MaterialInformation.thermophysical_property_names
+            if all(name in material.properties for material in self.endpoints)
+        ]
+
+        return
+
+    def endpoint_content(self, material, element, overrides):
+        if element in overrides:
+            return float(overrides[element])
+        composition = material.composition or {}
+        if element not in (composition.get("solute_elements") or []):
+            return 0.0
+        if composition.get(element) is None:
+            raise ValueError(
+                f"{material.name} has no content for {element}, pass it in endpoint_compositions."
+            )
+        return float(composition[element].value)
+
+    def __len__(self):
+        return self.num_points
+
+    def endpoint_properties(self, property_name):
+        properties = []
+        for material in self.endpoints:
+            p = material.properties.get(property_name)
+            if p is None:
+                raise KeyError(f"{material.name} has no property {property_name}.")
+            if p.value_type not in (
+                ValueTypes.SCALAR,
+                ValueTypes.LAURENT_POLYNOMIAL,
+                ValueTypes.TABLE,
+            ):
+                raise ValueError(f"{property_name} of {material.name} is not numeric.")
+            properties.append(p)
+        return properties
+
+    def mix(self, property_name, values, per_point=False):
+        # Mix endpoint values of shape (endpoints, n), the same dependent
+        # variable values for every composition, or with per_point of shape
+        # (endpoints, points), one value per composition
+        if self.rule == "linear" or self.rule == "vegard":
+            if per_point:
+                mixed = np.einsum("ij,ji->i", self.weights, values)
+            else:
+                mixed = self.weights @ values
+            if self.rule == "vegard" and property_name in self.bowing:
+                pairs = (1.0 - np.sum(self.weights**2, axis=1)) / 2.0
+                if mixed.ndim == 2:
+                    pairs = pairs[:, None]
+                mixed = mixed - self.bowing[property_name] * pairs
+            return mixed
+        if per_point:
+            return self.rule(property_name, self.weights, values.T)
+        shape = (self.num_points,) + values.shape
+        return self.rule(property_name, self.weights, np.broadcast_to(values, shape))
+
+    def evaluate(self, property_name, dependent_variable_value):
+        # Property of every composition at the same dependent variable
+        # value(s): a (points,) array for a scalar, (points, n) for n values
+        x = np.asarray(dependent_variable_value, dtype=np.float64)
+        scalar = x.ndim == 0
+        x = x.reshape(-1)
+        values = np.array(
+            [
+                np.broadcast_to(np.asarray(p.compile()(x), dtype=np.float64), x.shape)
+                for p in self.endpoint_properties(property_name)
+            ]
+        )
+        result = np.asarray(self.mix(property_name, values))
+        if scalar:
+            return result[:, 0]
+        return result
+
+    def evaluate_at(self, property_name, dependent_variable_values):
+        # Property of every composition, each at its own dependent variable
+        # value (e.g. each composition's solidus temperature)
+        x = np.asarray(dependent_variable_values, dtype=np.float64)
+        assert x.shape == (self.num_points,)
+        values = np.array(
+            [
+                np.broadcast_to(np.asarray(p.compile()(x), dtype=np.float64), x.shape)
+                for p in self.endpoint_properties(property_name)
+            ]
+        )
+        return np.asarray(self.mix(property_name, values, per_point=True))
+
+    def scalar(self, property_name):
+        # Mixed values of a SCALAR property
+        for p in self.endpoint_properties(property_name):
+            assert p.value_type == ValueTypes.SCALAR
+        return self.evaluate(property_name, 0.0)
+
+    def solver_inputs(self, target, initial_temperature=None):
+        # Columns of solver inputs for the decks of a target
+        return batch.deck_inputs(self, target, initial_temperature)
+
+    def write_decks(
+        self, directory, target, workers=None, initial_temperature=None, chunk_size=256
+    ):
+        # Write <directory>/composition_<i>/<deck file> for every composition,
+        # plus <directory>/compositions.csv with the solute contents and solver
+        # inputs of each deck. Returns the deck files.
+        inputs = self.solver_inputs(target, initial_temperature)
+        files = [
+            os.path.join(directory, f"composition_{i:05d}", batch.DECK_FILES[target])
+            for i in range(self.num_points)
+        ]
+        batch.write_decks(target, files, inputs, workers, chunk_size)
+        self.write_compositions(os.path.join(directory, "compositions.csv"), inputs)
+        return files
+
+    def write_compositions(self, file, inputs=None):
+        # CSV table of the solute contents (and optionally solver inputs) of
+        # every composition
+        if inputs is None:
+            inputs = {}
+        with open(file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["composition"] + self.elements + list(inputs))
+            columns = [self.compositions[:, j] for j in range(len(self.elements))]
+            columns = columns + [np.asarray(values) for values in inputs.values()]
+            for i in range(self.num_points):
+                writer.writerow([i] + [column[i] for column in columns])
+        return
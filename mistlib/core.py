@@ -1,7 +1,15 @@
+import hashlib
+import importlib
+import io
 import json
-import pandoc
 import os
+import sys
 from enum import Enum
+from collections import OrderedDict
+import numpy as np
+
+from mistlib.profiling import profiled
+from mistlib.units import conversion
 
 
 class ValueTypes(Enum):
@@ -11,6 +19,33 @@ class ValueTypes(Enum):
 
 
 class Property:
+    # Properties are stored in slots rather than a per-instance __dict__, and
+    # their strings are interned (see intern_string), to keep large material
+    # sets small in memory
+    __slots__ = (
+        "name",
+        "value_type",
+        "_value",
+        "_value_laurent_poly",
+        "_laurent_coefficients",
+        "_laurent_exponents",
+        "_value_table",
+        "_table_x",
+        "_table_y",
+        "_table_interpolation",
+        "_table_extrapolation",
+        "_version",
+        "_evaluator",
+        "unit",
+        "reference",
+        "uncertainty",
+        "print_symbol",
+        "print_name",
+        "dependent_variable_print_name",
+        "dependent_variable_print_symbol",
+        "dependent_variable_unit",
+    )
+
     def __init__(
         self,
         name,
@@ -25,101 +60,763 @@ class Property:
         reference=None,
         uncertainty=None,
         print_symbol=None,
+        table_interpolation=None,
+        table_extrapolation=None,
     ):
 
-        self.name = name
+        self._version = 0
+        self.name = intern_string(name)
+        self.value_type = None
         self.value = None
         self.value_laurent_poly = None
         self.value_table = None
-        self.unit = unit
-        self.reference = reference
-        self.uncertainty = uncertainty
-        self.print_symbol = print_symbol
+        self.unit = intern_string(unit)
+        self.reference = intern_string(reference)
+        self.uncertainty = intern_string(uncertainty)
+        self.print_symbol = intern_string(print_symbol)
 
         # Dependent variable information (for Laurent polynomial and table values)
-        self.dependent_variable_print_name = dependent_variable_print_name
-        self.dependent_variable_print_symbol = dependent_variable_print_symbol
-        self.dependent_variable_unit = dependent_variable_unit
+        self.dependent_variable_print_name = intern_string(
+            dependent_variable_print_name
+        )
+        self.dependent_variable_print_symbol = intern_string(
+            dependent_variable_print_symbol
+        )
+        self.dependent_variable_unit = intern_string(dependent_variable_unit)
+
+        # Interpolation settings (for table values)
+        if table_interpolation == None:
+            table_interpolation = "linear"
+        if table_extrapolation == None:
+            table_extrapolation = "constant"
+        self.table_interpolation = intern_string(table_interpolation)
+        self.table_extrapolation = intern_string(table_extrapolation)
 
         if print_name == None:
-            self.print_name = name
+            self.print_name = self.name
         else:
-            self.print_name = print_name
+            self.print_name = intern_string(print_name)
 
         num_value_definitions = 0
         if value != None:
             self.value_type = ValueTypes.SCALAR
             self.value = value
             num_value_definitions = num_value_definitions + 1
-        if value_laurent_poly != None:
+        if value_laurent_poly is not None:
             self.value_type = ValueTypes.LAURENT_POLYNOMIAL
             self.value_laurent_poly = value_laurent_poly
             num_value_definitions = num_value_definitions + 1
-        if value_table != None:
+        if value_table is not None:
             self.value_type = ValueTypes.TABLE
             self.value_table = value_table
             num_value_definitions = num_value_definitions + 1
-            print("Tabular input values are not currently supported.")
-            assert False
 
         # Check that only one type of value is defined
         assert num_value_definitions < 2
 
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        self._value_changed()
+
+    @property
+    def value_laurent_poly(self):
+        return self._value_laurent_poly
+
+    @value_laurent_poly.setter
+    def value_laurent_poly(self, value_laurent_poly):
+        # Keep the terms as contiguous coefficient/exponent arrays so that they
+        # are only converted once, not on every evaluation
+        self._value_laurent_poly = value_laurent_poly
+        if value_laurent_poly is None:
+            self._laurent_coefficients = None
+            self._laurent_exponents = None
+        else:
+            terms = np.asarray(value_laurent_poly, dtype=np.float64).reshape(-1, 2)
+            self._laurent_coefficients = np.ascontiguousarray(terms[:, 0])
+            self._laurent_exponents = np.ascontiguousarray(terms[:, 1])
+        self._value_changed()
+
+    @property
+    def value_table(self):
+        return self._value_table
+
+    @value_table.setter
+    def value_table(self, value_table):
+        # Tables are [dependent variable value, value] pairs. They are stored as
+        # contiguous arrays sorted by the dependent variable for binary search.
+        self._value_table = value_table
+        if value_table is None:
+            self._table_x = None
+            self._table_y = None
+        else:
+            points = np.asarray(value_table, dtype=np.float64).reshape(-1, 2)
+            order = np.argsort(points[:, 0], kind="stable")
+            self._table_x = np.ascontiguousarray(points[order, 0])
+            self._table_y = np.ascontiguousarray(points[order, 1])
+
+            # Check that there is at least one point and no repeated points
+            assert len(self._table_x) > 0
+            assert np.all(np.diff(self._table_x) > 0.0)
+        self._value_changed()
+
+    @property
+    def table_interpolation(self):
+        return self._table_interpolation
+
+    @table_interpolation.setter
+    def table_interpolation(self, table_interpolation):
+        assert table_interpolation in TABLE_INTERPOLATIONS
+        self._table_interpolation = table_interpolation
+        self._value_changed()
+
+    @property
+    def table_extrapolation(self):
+        return self._table_extrapolation
+
+    @table_extrapolation.setter
+    def table_extrapolation(self, table_extrapolation):
+        assert table_extrapolation in TABLE_EXTRAPOLATIONS
+        self._table_extrapolation = table_extrapolation
+        self._value_changed()
+
+    def _value_changed(self):
+        # Any change to the stored value invalidates the compiled evaluator and
+        # (through the version number) cached MaterialInformation.get_property
+        # results. Note that in-place edits of value_laurent_poly are not
+        # detected, the list has to be reassigned.
+        self._version = self._version + 1
+        self._evaluator = None
+
+    def __reduce__(self):
+        # Pickle as a flat tuple of attribute values with the value type as an
+        # int and the numeric arrays as raw bytes. This keeps pickles small and
+        # fast to load, and the compiled evaluator is rebuilt on demand.
+        arrays = [
+            None if a is None else a.tobytes()
+            for a in (
+                self._laurent_coefficients,
+                self._laurent_exponents,
+                self._table_x,
+                self._table_y,
+            )
+        ]
+        values = (
+            self.name,
+            None if self.value_type is None else self.value_type.value,
+            self._value,
+            self._version,
+            self._value_laurent_poly,
+            arrays[0],
+            arrays[1],
+            self._value_table,
+            arrays[2],
+            arrays[3],
+            self._table_interpolation,
+            self._table_extrapolation,
+            self.unit,
+            self.reference,
+            self.uncertainty,
+            self.print_symbol,
+            self.print_name,
+            self.dependent_variable_print_name,
+            self.dependent_variable_print_symbol,
+            self.dependent_variable_unit,
+        )
+        return (restore_property, values)
+
+    @profiled("evaluate_laurent_polynomial")
     def evaluate_laurent_polynomial(self, dependent_variable_value):
-        sum = 0.0
-        for term in self.value_laurent_poly:
-            sum = sum + term[0] * dependent_variable_value ** term[1]
-        return sum
+        # Evaluate for a scalar or for a NumPy array of any shape in one
+        # vectorized pass. Scalars return a float, arrays an array of the same
+        # shape. Negative powers of zero give inf and fractional powers of
+        # negative numbers give nan instead of raising or returning complex.
+        return evaluate_laurent_terms(
+            self._laurent_coefficients,
+            self._laurent_exponents,
+            dependent_variable_value,
+        )
+
+    def interpolate_table(self, dependent_variable_value):
+        # Evaluate a table for a scalar or a NumPy array of any shape
+        return self.compile()(dependent_variable_value)
+
+    def antiderivative(self, dependent_variable_value):
+        # Analytic antiderivative with respect to the dependent variable, for a
+        # scalar or an array. Laurent polynomials integrate term by term (with
+        # a log term for exponent -1), tables integrate their interpolant
+        # exactly and is zero at the first table point.
+        if self.value_type == ValueTypes.SCALAR:
+            x = np.asarray(dependent_variable_value, dtype=np.float64)
+            result = self.value * x
+            if np.ndim(result) == 0:
+                return float(result)
+            return result
+        elif self.value_type == ValueTypes.LAURENT_POLYNOMIAL:
+            return laurent_antiderivative(
+                self._laurent_coefficients,
+                self._laurent_exponents,
+                dependent_variable_value,
+            )
+        elif self.value_type == ValueTypes.TABLE:
+            evaluator = self.compile()
+            return table_antiderivative(
+                evaluator.table_x,
+                evaluator.table_y,
+                dependent_variable_value,
+                evaluator.table_slopes,
+                evaluator.table_extrapolation,
+            )
+        print(f"Error: {self.name} has no value to integrate.")
+        return None
+
+    def integrate(self, lower, upper):
+        # Definite integral from lower to upper (scalars or arrays)
+        return self.antiderivative(upper) - self.antiderivative(lower)
+
+    def to_dict(self):
+        # JSON representation in the layout read by
+        # MaterialInformation.json_blob_to_property. Unset fields that the
+        # data files always list are written as "None".
+        data = {"print_name": self.print_name}
+        if self.value_type == ValueTypes.SCALAR:
+            data["value"] = self.value
+        elif self.value_type == ValueTypes.LAURENT_POLYNOMIAL:
+            data["value_laurent_poly"] = self.value_laurent_poly
+        elif self.value_type == ValueTypes.TABLE:
+            data["value_table"] = self.value_table
+            data["table_interpolation"] = self.table_interpolation
+            data["table_extrapolation"] = self.table_extrapolation
+        for field in [
+            "dependent_variable_print_name",
+            "dependent_variable_print_symbol",
+            "dependent_variable_unit",
+        ]:
+            if getattr(self, field) is not None:
+                data[field] = getattr(self, field)
+        for field in ["unit", "reference", "uncertainty", "print_symbol"]:
+            value = getattr(self, field)
+            data[field] = "None" if value is None else value
+        return data
+
+    def compile(self, unit=None):
+        # Return a callable evaluator for the current value, reused until the
+        # value changes. With a unit (a unit string or a unit system such as
+        # "SI", see mistlib.units) the conversion from self.unit is folded into
+        # the evaluator's coefficients, so it costs nothing per evaluation.
+        if self._evaluator is None:
+            self._evaluator = PropertyEvaluator(self)
+        if unit is None:
+            return self._evaluator
+        return self._evaluator.in_unit(self, unit)
+
+    @profiled("evaluate")
+    def evaluate(self, dependent_variable_value=None, unit=None):
+        return self.compile(unit)(dependent_variable_value)
+
+
+def import_report_dependency(name):
+    # The PDF rendering stack is slow to import and only needed for writing
+    # reports, so it is imported on first use rather than with mistlib
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        raise ImportError(
+            f"Writing reports requires the {name} package, install it with pip install mistlib[report]."
+        ) from e
+
+
+def intern_string(value):
+    # Units, references and print metadata repeat across the properties of
+    # one material and across materials, so a single shared copy of each
+    # string is kept. Anything that is not a string is returned unchanged.
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
+def json_default(value):
+    # NumPy values (e.g. set programmatically) are written as plain JSON
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def restore_property(
+    name,
+    value_type,
+    value,
+    version,
+    value_laurent_poly,
+    laurent_coefficients,
+    laurent_exponents,
+    value_table,
+    table_x,
+    table_y,
+    table_interpolation,
+    table_extrapolation,
+    unit,
+    reference,
+    uncertainty,
+    print_symbol,
+    print_name,
+    dependent_variable_print_name,
+    dependent_variable_print_symbol,
+    dependent_variable_unit,
+):
+    # Rebuild a pickled Property without going through __init__
+    property = Property.__new__(Property)
+    if laurent_coefficients is not None:
+        laurent_coefficients = np.frombuffer(laurent_coefficients)
+        laurent_exponents = np.frombuffer(laurent_exponents)
+    if table_x is not None:
+        table_x = np.frombuffer(table_x)
+        table_y = np.frombuffer(table_y)
+    property.name = intern_string(name)
+    property.value_type = None if value_type is None else VALUE_TYPES[value_type]
+    property._value = value
+    property._version = version
+    property._evaluator = None
+    property._value_laurent_poly = value_laurent_poly
+    property._laurent_coefficients = laurent_coefficients
+    property._laurent_exponents = laurent_exponents
+    property._value_table = value_table
+    property._table_x = table_x
+    property._table_y = table_y
+    property._table_interpolation = intern_string(table_interpolation)
+    property._table_extrapolation = intern_string(table_extrapolation)
+    property.unit = intern_string(unit)
+    property.reference = intern_string(reference)
+    property.uncertainty = intern_string(uncertainty)
+    property.print_symbol = intern_string(print_symbol)
+    property.print_name = intern_string(print_name)
+    property.dependent_variable_print_name = intern_string(
+        dependent_variable_print_name
+    )
+    property.dependent_variable_print_symbol = intern_string(
+        dependent_variable_print_symbol
+    )
+    property.dependent_variable_unit = intern_string(dependent_variable_unit)
+    return property
+
+
+VALUE_TYPES = {value_type.value: value_type for value_type in ValueTypes}
+
+
+def load_property_tables(path, mmap_mode="r"):
+    # Load tables written by MaterialInformation.save_property_tables. Tables
+    # in a .npy directory are memory mapped (read-only by default).
+    if os.path.isdir(path):
+        tables = {}
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".npy"):
+                tables[name[:-4]] = np.load(
+                    os.path.join(path, name), mmap_mode=mmap_mode
+                )
+        return tables
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def evaluate_laurent_terms(coefficients, exponents, dependent_variable_value):
+    x = np.asarray(dependent_variable_value, dtype=np.float64)
+    result = np.zeros(x.shape)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for coefficient, exponent in zip(coefficients, exponents):
+            if exponent == 0.0:
+                result += coefficient
+            elif exponent == 1.0:
+                result += coefficient * x
+            else:
+                result += coefficient * np.power(x, exponent)
 
+    if result.ndim == 0:
+        return float(result)
+    return result
 
-class SinglePhase:
-    def __init__(self, name, print_name=None):
 
-        self.property_names = [
-            "eutectic_contact_angle",
-            "gibbs_thomson_coeff",
-            "liquidus_slope",
-            "solubility_limit",
-            "solute_diffusivities",
-            "solute_misfit_strains",
-            "taylor_factor",
-            "shear_modulus_base_element",
-            "burgers_vector_base_element",
-            "poisson_ratio_base_element",
-        ]
+# Supported table interpolation and extrapolation types. "constant"
+# extrapolation holds the end values, "linear" extends the end segments (or end
+# slopes for monotone cubic interpolation) and "nan" marks values out of range.
+TABLE_INTERPOLATIONS = ("linear", "monotone_cubic")
+TABLE_EXTRAPOLATIONS = ("constant", "linear", "nan")
+
+
+def laurent_antiderivative(coefficients, exponents, dependent_variable_value):
+    x = np.asarray(dependent_variable_value, dtype=np.float64)
+    result = np.zeros(x.shape)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for coefficient, exponent in zip(coefficients, exponents):
+            if exponent == -1.0:
+                result += coefficient * np.log(x)
+            else:
+                result += coefficient / (exponent + 1.0) * np.power(x, exponent + 1.0)
+
+    if result.ndim == 0:
+        return float(result)
+    return result
+
+
+def table_antiderivative(
+    x_table, y_table, dependent_variable_value, slopes=None, extrapolation="constant"
+):
+    # Exact integral of the table interpolant (see interpolate_table_arrays)
+    # from the first table point
+    x = np.asarray(dependent_variable_value, dtype=np.float64)
+    n = len(x_table)
+    if n == 1:
+        result = y_table[0] * (x - x_table[0])
+    else:
+        h_table = np.diff(x_table)
+        if slopes is None:
+            segment_integrals = 0.5 * h_table * (y_table[:-1] + y_table[1:])
+        else:
+            segment_integrals = h_table * (
+                0.5 * (y_table[:-1] + y_table[1:])
+                + h_table * (slopes[:-1] - slopes[1:]) / 12.0
+            )
+        cumulative = np.concatenate(([0.0], np.cumsum(segment_integrals)))
+
+        x_clipped = np.clip(x, x_table[0], x_table[-1])
+        idx = np.searchsorted(x_table, x_clipped, side="right") - 1
+        idx = np.clip(idx, 0, n - 2)
+        x0 = x_table[idx]
+        y0 = y_table[idx]
+        y1 = y_table[idx + 1]
+        h = h_table[idx]
+        t = (x_clipped - x0) / h
+        t2 = t * t
+        t3 = t2 * t
+        t4 = t3 * t
+        if slopes is None:
+            partial = h * (y0 * t + 0.5 * (y1 - y0) * t2)
+        else:
+            partial = h * (
+                (t - t3 + 0.5 * t4) * y0
+                + (0.5 * t2 - 2.0 * t3 / 3.0 + 0.25 * t4) * h * slopes[idx]
+                + (t3 - 0.5 * t4) * y1
+                + (0.25 * t4 - t3 / 3.0) * h * slopes[idx + 1]
+            )
+        result = cumulative[idx] + partial
+
+        # Integral of the extrapolated values outside of the table
+        below = np.minimum(x - x_table[0], 0.0)
+        above = np.maximum(x - x_table[-1], 0.0)
+        result = result + y_table[0] * below + y_table[-1] * above
+        if extrapolation == "linear":
+            if slopes is None:
+                start_slope = (y_table[1] - y_table[0]) / h_table[0]
+                end_slope = (y_table[-1] - y_table[-2]) / h_table[-1]
+            else:
+                start_slope = slopes[0]
+                end_slope = slopes[-1]
+            result = result + 0.5 * (start_slope * below**2 + end_slope * above**2)
+
+    if extrapolation == "nan":
+        result = np.where((x < x_table[0]) | (x > x_table[-1]), np.nan, result)
+
+    if np.ndim(result) == 0:
+        return float(result)
+    return result
+
+
+def monotone_cubic_slopes(x, y):
+    # Node derivatives for monotone piecewise cubic Hermite interpolation
+    # (Fritsch-Carlson with the three point end conditions used by PCHIP)
+    n = len(x)
+    h = np.diff(x)
+    m = np.diff(y) / h
+    d = np.zeros(n)
+    if n < 2:
+        return d
+    if n == 2:
+        d[:] = m[0]
+        return d
+
+    # Interior points: weighted harmonic mean where the secants agree in sign
+    w1 = 2.0 * h[1:] + h[:-1]
+    w2 = h[1:] + 2.0 * h[:-1]
+    same_sign = m[:-1] * m[1:] > 0.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        harmonic = (w1 + w2) / (w1 / m[:-1] + w2 / m[1:])
+    d[1:-1] = np.where(same_sign, harmonic, 0.0)
+
+    # End points
+    for end, h0, h1, m0, m1 in (
+        (0, h[0], h[1], m[0], m[1]),
+        (-1, h[-1], h[-2], m[-1], m[-2]),
+    ):
+        slope = ((2.0 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+        if np.sign(slope) != np.sign(m0):
+            slope = 0.0
+        elif np.sign(m0) != np.sign(m1) and abs(slope) > 3.0 * abs(m0):
+            slope = 3.0 * m0
+        d[end] = slope
+    return d
+
+
+def interpolate_table_arrays(
+    x_table, y_table, dependent_variable_value, slopes=None, extrapolation="constant"
+):
+    # Piecewise interpolation of sorted table arrays, located with a binary
+    # search. Linear if slopes is None, otherwise cubic Hermite with the given
+    # node derivatives.
+    x = np.asarray(dependent_variable_value, dtype=np.float64)
+    n = len(x_table)
+    if n == 1:
+        result = np.full(x.shape, y_table[0])
+    else:
+        x_clipped = np.clip(x, x_table[0], x_table[-1])
+        idx = np.searchsorted(x_table, x_clipped, side="right") - 1
+        idx = np.clip(idx, 0, n - 2)
+        x0 = x_table[idx]
+        y0 = y_table[idx]
+        h = x_table[idx + 1] - x0
+        t = (x_clipped - x0) / h
+        if slopes is None:
+            result = y0 + t * (y_table[idx + 1] - y0)
+        else:
+            t2 = t * t
+            t3 = t2 * t
+            result = (
+                (2.0 * t3 - 3.0 * t2 + 1.0) * y0
+                + (t3 - 2.0 * t2 + t) * h * slopes[idx]
+                + (-2.0 * t3 + 3.0 * t2) * y_table[idx + 1]
+                + (t3 - t2) * h * slopes[idx + 1]
+            )
+
+        if extrapolation == "linear":
+            if slopes is None:
+                start_slope = (y_table[1] - y_table[0]) / (x_table[1] - x_table[0])
+                end_slope = (y_table[-1] - y_table[-2]) / (x_table[-1] - x_table[-2])
+            else:
+                start_slope = slopes[0]
+                end_slope = slopes[-1]
+            result = result + np.where(
+                x < x_table[0],
+                (x - x_table[0]) * start_slope,
+                np.where(x > x_table[-1], (x - x_table[-1]) * end_slope, 0.0),
+            )
+
+    if extrapolation == "nan":
+        result = np.where((x < x_table[0]) | (x > x_table[-1]), np.nan, result)
+
+    if np.ndim(result) == 0:
+        return float(result)
+    return result
+
+
+def adamantine_input_content(
+    density,
+    specific_heat_solid,
+    specific_heat_liquid,
+    thermal_conductivity_solid,
+    thermal_conductivity_liquid,
+    emissivity,
+    solidus_temperature,
+    liquidus_temperature,
+    latent_heat_fusion,
+):
+    # Text of an adamantine material input deck
+    return (
+        f"materials\n{{"
+        f"\n\tn_material 1"
+        f"\n\tproperty_format polynomial"
+        f"\n\tmaterial_0"
+        f"\n\t{{"
+        f"\n\t\tsolid"
+        f"\n\t\t{{"
+        f"\n\t\t\tdensity {density} ;"
+        f"\n\t\t\tspecific_heat {specific_heat_solid} ;"
+        f"\n\t\t\tthermal_conductivity_x {thermal_conductivity_solid} ;"
+        f"\n\t\t\tthermal_conductivity_z {thermal_conductivity_solid} ;"
+        f"\n\t\t\temissivity {emissivity} ;"
+        f"\n\t\t}}"
+        f"\n\t\tliquid"
+        f"\n\t\t{{"
+        f"\n\t\t\tdensity {density} ;"
+        f"\n\t\t\tspecific_heat {specific_heat_liquid} ;"
+        f"\n\t\t\tthermal_conductivity_x {thermal_conductivity_liquid} ;"
+        f"\n\t\t\tthermal_conductivity_z {thermal_conductivity_liquid} ;"
+        f"\n\t\t\temissivity {emissivity} ;"
+        f"\n\t\t}}"
+        f"\n\tsolidus {solidus_temperature} ;"
+        f"\n\tliquidus {liquidus_temperature} ;"
+        f"\n\tlatent heat {latent_heat_fusion} ;"
+        f"\n\t}}"
+        f"\n}}"
+    )
+
+
+def thesis_input_content(
+    initial_temperature,
+    liquidus_temperature,
+    thermal_conductivity,
+    specific_heat,
+    density,
+):
+    # Text of a 3DThesis input deck
+    return (
+        "Constants\n"
+        "{\n"
+        f"\t T_0\t{initial_temperature}\n"
+        f"\t T_L\t{liquidus_temperature}\n"
+        f"\t k\t{thermal_conductivity}\n"
+        f"\t c\t{specific_heat}\n"
+        f"\t p\t{density}\n"
+        "}"
+    )
+
+
+class PropertyEvaluator:
+    # Lightweight callable created by Property.compile(). The value type
+    # dispatch happens once here instead of on every evaluation. Values can be
+    # converted to another unit as scale * value + offset, which is applied to
+    # the coefficients, table values or scalar once.
+    def __init__(self, property, scale=1.0, offset=0.0):
+        self.name = property.name
+        self.value_type = property.value_type
+        self.value = None
+        self.coefficients = None
+        self.exponents = None
+        self.table_x = None
+        self.table_y = None
+        self.table_slopes = None
+        self.table_extrapolation = None
+        self.converted = None
+
+        if self.value_type == ValueTypes.SCALAR:
+            self.value = property.value
+            if scale != 1.0 or offset != 0.0:
+                self.value = self.value * scale + offset
+            self._evaluate = self._evaluate_scalar
+        elif self.value_type == ValueTypes.LAURENT_POLYNOMIAL:
+            self.coefficients = property._laurent_coefficients
+            self.exponents = property._laurent_exponents
+            if scale != 1.0:
+                self.coefficients = self.coefficients * scale
+            if offset != 0.0:
+                self.coefficients = np.append(self.coefficients, offset)
+                self.exponents = np.append(self.exponents, 0.0)
+            self._evaluate = self._evaluate_laurent_polynomial
+        elif self.value_type == ValueTypes.TABLE:
+            self.table_x = property._table_x
+            self.table_y = property._table_y
+            if scale != 1.0 or offset != 0.0:
+                self.table_y = self.table_y * scale + offset
+            if property.table_interpolation == "monotone_cubic":
+                self.table_slopes = monotone_cubic_slopes(self.table_x, self.table_y)
+            self.table_extrapolation = property.table_extrapolation
+            self._evaluate = self._evaluate_table
+        else:
+            self._evaluate = self._evaluate_unsupported
+
+    def __call__(self, dependent_variable_value=None):
+        return self._evaluate(dependent_variable_value)
+
+    def in_unit(self, property, unit):
+        # Evaluator returning values in unit, created once per unit
+        if self.converted is None:
+            self.converted = {}
+        evaluator = self.converted.get(unit)
+        if evaluator is None:
+            plan = conversion(property.unit, unit)
+            if plan.is_identity:
+                evaluator = self
+            else:
+                evaluator = PropertyEvaluator(property, plan.scale, plan.offset)
+            self.converted[unit] = evaluator
+        return evaluator
+
+    def _evaluate_scalar(self, dependent_variable_value):
+        # Scalars are returned unchanged, arrays are broadcast to the input shape
+        if dependent_variable_value is None or np.ndim(dependent_variable_value) == 0:
+            return self.value
+        return np.full(np.shape(dependent_variable_value), self.value, dtype=np.float64)
+
+    def _evaluate_laurent_polynomial(self, dependent_variable_value):
+        return evaluate_laurent_terms(
+            self.coefficients, self.exponents, dependent_variable_value
+        )
+
+    def _evaluate_table(self, dependent_variable_value):
+        return interpolate_table_arrays(
+            self.table_x,
+            self.table_y,
+            dependent_variable_value,
+            self.table_slopes,
+            self.table_extrapolation,
+        )
+
+    def _evaluate_unsupported(self, dependent_variable_value):
+        print(
+            f"Error: evaluation of {self.value_type} is not supported for {self.name}."
+        )
+        return None
+
+
+class SinglePhase:
+    __slots__ = ("name", "print_name", "properties")
+
+    # Shared by all phases
+    property_names = (
+        "eutectic_contact_angle",
+        "gibbs_thomson_coeff",
+        "liquidus_slope",
+        "solubility_limit",
+        "solute_diffusivities",
+        "solute_misfit_strains",
+        "taylor_factor",
+        "shear_modulus_base_element",
+        "burgers_vector_base_element",
+        "poisson_ratio_base_element",
+    )
 
-        self.name = name
-        self.print_name = print_name
+    def __init__(self, name, print_name=None):
+        self.name = intern_string(name)
+        self.print_name = intern_string(print_name)
         self.properties = {}
 
 
 class MaterialInformation:
-    def __init__(self, file=None):
+    # Maximum number of (property, reference temperature) results memoized by
+    # get_property
+    property_cache_size = 256
+
+    # Shared by all materials
+    composition_names = ("base_element", "solute_elements")
+
+    thermophysical_property_names = (
+        "density",
+        "specific_heat_solid",
+        "specific_heat_liquid",
+        "thermal_conductivity_solid",
+        "thermal_conductivity_liquid",
+        "dynamic_viscosity",
+        "thermal_expansion",
+        "latent_heat_fusion",
+        "latent_heat_vaporization",
+        "emissivity",
+        "molecular_mass",
+        "liquidus_temperature",
+        "log_vapor_pressure",
+        "laser_absorption",
+        "solidus_eutectic_temperature",
+        "hall_petch_coefficient",
+    )
 
-        self.composition_names = ["base_element", "solute_elements"]
-
-        self.thermophysical_property_names = [
-            "density",
-            "specific_heat_solid",
-            "specific_heat_liquid",
-            "thermal_conductivity_solid",
-            "thermal_conductivity_liquid",
-            "dynamic_viscosity",
-            "thermal_expansion",
-            "latent_heat_fusion",
-            "latent_heat_vaporization",
-            "emissivity",
-            "molecular_mass",
-            "liquidus_temperature",
-            "log_vapor_pressure",
-            "laser_absorption",
-            "solidus_eutectic_temperature",
-            "hall_petch_coefficient",
-        ]
+    def __init__(self, file=None):
 
         self.composition = {}
         self.properties = {}
         self.phase_properties = {}
+        self._property_cache = OrderedDict()
 
         if file == None:
             # Set all values to None
@@ -137,82 +834,108 @@ class MaterialInformation:
 
         return
 
+    def __getstate__(self):
+        # Memoized get_property results are not pickled
+        state = self.__dict__.copy()
+        state["_property_cache"] = OrderedDict()
+        return state
+
+    @profiled("load_json")
     def load_json(self, file):
         # Load a JSON file
-        # Do we want to check for entries that don't match expected entries?
         with open(file, "r") as f:
             data = json.load(f)
-            self.name = data["name"]
-            self.notes = data["note"]
+        self.load_dict(data)
 
-            if "composition" in data.keys():
-                self.composition["base_element"] = self.populate_optional_field(
-                    data["composition"], "base_element"
-                )
-                self.composition["solute_elements"] = self.populate_optional_field(
-                    data["composition"], "solute_elements"
+        return
+
+    def load_dict(self, data):
+        # Load the material from the contents of a JSON file, replacing any
+        # previously loaded information
+        # Do we want to check for entries that don't match expected entries?
+        self.composition = {}
+        self.properties = {}
+        self.phase_properties = {}
+        self._property_cache = OrderedDict()
+
+        self.name = data["name"]
+        self.notes = data["note"]
+
+        if "composition" in data.keys():
+            self.composition["base_element"] = intern_string(
+                self.populate_optional_field(data["composition"], "base_element")
+            )
+            solute_elements = self.populate_optional_field(
+                data["composition"], "solute_elements"
+            )
+            if solute_elements is not None:
+                solute_elements = [intern_string(e) for e in solute_elements]
+            self.composition["solute_elements"] = solute_elements
+
+            if self.composition["base_element"] in data["composition"].keys():
+                self.composition[self.composition["base_element"]] = (
+                    self.json_blob_to_property(
+                        data["composition"], self.composition["base_element"]
+                    )
                 )
 
-                if self.composition["base_element"] in data["composition"].keys():
-                    self.composition[self.composition["base_element"]] = (
-                        self.json_blob_to_property(
-                            data["composition"], self.composition["base_element"]
-                        )
+            for solute_element in self.composition["solute_elements"]:
+                if solute_element in data["composition"].keys():
+                    self.composition[solute_element] = self.json_blob_to_property(
+                        data["composition"], solute_element
                     )
 
-                for solute_element in self.composition["solute_elements"]:
-                    if solute_element in data["composition"].keys():
-                        self.composition[solute_element] = self.json_blob_to_property(
-                            data["composition"], solute_element
-                        )
+        if "single_phase_properties" in data.keys():
+            self.phases = self.populate_optional_field(
+                data["single_phase_properties"], "phases"
+            )
+            for phase in self.phases:
+                phase_name = phase
+                phase_print_name = data["single_phase_properties"][phase]["print_name"]
+                single_phase = SinglePhase(phase_name, phase_print_name)
+                for p in single_phase.property_names:
+                    if p == "solute_diffusivities" or p == "solute_misfit_strains":
+                        # These have an extra level compared to all of the other properties and so it needs to be handled separately
+                        if p in data["single_phase_properties"][phase].keys():
+                            temp_dict = {}
+                            for element in self.composition["solute_elements"]:
+                                temp_val = None
+                                if (
+                                    element
+                                    in data["single_phase_properties"][phase][p].keys()
+                                ):
+                                    temp_val = self.json_blob_to_property(
+                                        data["single_phase_properties"][phase][p],
+                                        element,
+                                    )
+                                temp_dict[element] = temp_val
+                            single_phase.properties[p] = temp_dict
 
-            if "single_phase_properties" in data.keys():
-                self.phases = self.populate_optional_field(
-                    data["single_phase_properties"], "phases"
-                )
-                for phase in self.phases:
-                    phase_name = phase
-                    phase_print_name = data["single_phase_properties"][phase][
-                        "print_name"
-                    ]
-                    single_phase = SinglePhase(phase_name, phase_print_name)
-                    for p in single_phase.property_names:
-                        if p == "solute_diffusivities" or p == "solute_misfit_strains":
-                            # These have an extra level compared to all of the other properties and so it needs to be handled separately
-                            if p in data["single_phase_properties"][phase].keys():
-                                temp_dict = {}
-                                for element in self.composition["solute_elements"]:
-                                    temp_val = None
-                                    if (
-                                        element
-                                        in data["single_phase_properties"][phase][
-                                            p
-                                        ].keys()
-                                    ):
-                                        temp_val = self.json_blob_to_property(
-                                            data["single_phase_properties"][phase][p],
-                                            element,
-                                        )
-                                    temp_dict[element] = temp_val
-                                single_phase.properties[p] = temp_dict
-
-                        else:
-                            if p in data["single_phase_properties"][phase].keys():
-                                single_phase.properties[p] = self.json_blob_to_property(
-                                    data["single_phase_properties"][phase], p
-                                )
-
-                    self.phase_properties[phase] = single_phase
-
-            if "thermophysical_properties" in data.keys():
-                for p in self.thermophysical_property_names:
-                    if p in data["thermophysical_properties"].keys():
-                        self.properties[p] = self.json_blob_to_property(
-                            data["thermophysical_properties"], p
-                        )
+                    else:
+                        if p in data["single_phase_properties"][phase].keys():
+                            single_phase.properties[p] = self.json_blob_to_property(
+                                data["single_phase_properties"][phase], p
+                            )
+
+                self.phase_properties[phase] = single_phase
+
+        if "thermophysical_properties" in data.keys():
+            for p in self.thermophysical_property_names:
+                if p in data["thermophysical_properties"].keys():
+                    self.properties[p] = self.json_blob_to_property(
+                        data["thermophysical_properties"], p
+                    )
+            # Properties mist does not know about are kept as well, so that
+            # the files are written back unchanged
+            for p in data["thermophysical_properties"].keys():
+                if p not in self.properties:
+                    self.properties[p] = self.json_blob_to_property(
+                        data["thermophysical_properties"], p
+                    )
 
         return
 
+    @profiled("json_blob_to_property")
     def json_blob_to_property(self, json_blob, property_string):
         tree = json_blob[property_string]
         # Mandatory fields
@@ -236,6 +959,8 @@ class MaterialInformation:
         reference = self.populate_optional_field(tree, "reference")
         uncertainty = self.populate_optional_field(tree, "uncertainty")
         print_symbol = self.populate_optional_field(tree, "print_symbol")
+        table_interpolation = self.populate_optional_field(tree, "table_interpolation")
+        table_extrapolation = self.populate_optional_field(tree, "table_extrapolation")
 
         property = Property(
             name,
@@ -250,6 +975,8 @@ class MaterialInformation:
             reference,
             uncertainty,
             print_symbol,
+            table_interpolation,
+            table_extrapolation,
         )
 
         return property
@@ -291,213 +1018,360 @@ class MaterialInformation:
 
         return latex_str
 
-    def write_json(self, file):
-        # Write a JSON file with the current material information
-        # TODO
-        return
-
-    def write_markdown(self, file, tables=["properties"]):
-        # TODO: Add support for the other types of properties
-
-        # Write a Markdown file with the current material information
-        with open(file, "w") as f:
-            reference_list = []
-            num_refs = 0
-
-            f.write("# Material Properties: " + self.name + "\n\n")
-
-            if "composition" in tables:
-                f.write("## Composition \n")
-
-                f.write("|Element | Concentration | Units | Data Source | \n")
-                f.write("|---------| ----- | ----- | ----------- | \n")
+    def latex_table(self, value_table, dependent_variable_print_symbol):
+        symbol = self.replace_none_with_string(dependent_variable_print_symbol, "x")
+        latex_str = ""
+        for point in value_table:
+            latex_str = (
+                latex_str
+                + str(point[1])
+                + " ($"
+                + symbol
+                + "$ = "
+                + str(point[0])
+                + "), "
+            )
 
-                elements = [self.composition["base_element"]]
-                elements.extend(self.composition["solute_elements"])
-                for element in elements:
-                    print_name_str = element
-                    value_str = str(self.composition[element].value)
-                    unit_str = self.composition[element].unit
+        latex_str = latex_str.rstrip(", ")
 
-                    next_ref = self.composition[element].reference
-                    ref_index = None
+        return latex_str
 
-                    if next_ref != None:
-                        ref_index = -1
-                        for idx, ref in enumerate(reference_list):
-                            if next_ref == ref:
-                                ref_index = idx
-                                break
+    @profiled("write_json", output="file")
+    def write_json(self, file, indent=4):
+        # Write a JSON file with the current material information in the
+        # format read by load_json. file can also be an open text stream. Keys
+        # are always written in the same order, so the same material always
+        # gives the same file.
+        content = self.json_string(indent)
+        if hasattr(file, "write"):
+            file.write(content)
+        else:
+            with open(file, "w", encoding="utf-8") as f:
+                f.write(content)
 
-                        if ref_index == -1:
-                            ref_index = len(reference_list)
-                            reference_list.append(next_ref)
+        return
 
-                    ref_str = None
-                    if ref_index == None:
-                        ref_str = "-"
+    def json_string(self, indent=4):
+        # The JSON text written by write_json. indent=None gives a compact
+        # single line (used for JSON Lines files).
+        data = self.to_dict()
+        if indent is None:
+            content = json.dumps(
+                data, separators=(",", ":"), ensure_ascii=False, default=json_default
+            )
+            return content + "\n"
+
+        # Keep the value arrays on one line, as in the hand-written files, by
+        # writing placeholders and substituting the arrays afterwards
+        arrays = []
+
+        def replace_arrays(tree):
+            for key, value in tree.items():
+                if key in ("value_laurent_poly", "value_table"):
+                    tree[key] = f"@mist_array_{len(arrays)}@"
+                    arrays.append(value)
+                elif isinstance(value, dict):
+                    replace_arrays(value)
+
+        replace_arrays(data)
+        content = json.dumps(
+            data, indent=indent, ensure_ascii=False, default=json_default
+        )
+        for i, value in enumerate(arrays):
+            content = content.replace(
+                f'"@mist_array_{i}@"', json.dumps(value, default=json_default), 1
+            )
+        return content + "\n"
+
+    def content_hash(self):
+        # SHA-256 of the canonical (compact) JSON, identical for materials
+        # with identical information
+        content = self.json_string(indent=None)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def to_dict(self):
+        # Nested dict with the layout of the JSON files, in canonical order
+        data = {"name": self.name, "note": self.notes}
+
+        if self.composition:
+            composition = {
+                "base_element": self.composition.get("base_element"),
+                "solute_elements": self.composition.get("solute_elements"),
+            }
+            elements = [composition["base_element"]] + list(
+                composition["solute_elements"] or []
+            )
+            for element in elements:
+                if self.composition.get(element) is not None:
+                    composition[element] = self.composition[element].to_dict()
+            data["composition"] = composition
+
+        # Known properties first, in their usual order, then any others
+        names = list(self.thermophysical_property_names) + sorted(
+            p for p in self.properties if p not in self.thermophysical_property_names
+        )
+        properties = {}
+        for p in names:
+            if self.properties.get(p) is not None:
+                properties[p] = self.properties[p].to_dict()
+        if properties:
+            data["thermophysical_properties"] = properties
+
+        if self.phase_properties:
+            single_phase_properties = {"phases": list(self.phase_properties.keys())}
+            for phase_name, phase in self.phase_properties.items():
+                entry = {"print_name": phase.print_name}
+                for p in phase.property_names:
+                    value = phase.properties.get(p)
+                    if value is None:
+                        continue
+                    if isinstance(value, dict):
+                        # Per solute element properties
+                        entry[p] = {
+                            element: v.to_dict()
+                            for element, v in value.items()
+                            if v is not None
+                        }
                     else:
-                        ref_str = "[" + str(ref_index + 1) + "]"
-
-                    f.write(
-                        "| "
-                        + print_name_str
-                        + " | "
-                        + value_str
-                        + " | $"
-                        + unit_str
-                        + "$ | "
-                        + ref_str
-                        + " |"
-                        + "\n"
-                    )
+                        entry[p] = value.to_dict()
+                single_phase_properties[phase_name] = entry
+            data["single_phase_properties"] = single_phase_properties
 
-            if "properties" in tables:
+        return data
 
-                f.write("## Thermophysical Properties \n")
+    @profiled("write_markdown", output="file")
+    def write_markdown(self, file, tables=["properties"]):
+        # Write a Markdown file with the current material information. file
+        # can also be an open text stream (e.g. io.StringIO). The available
+        # tables are "composition", "properties" and "phases".
+        if hasattr(file, "write"):
+            self.write_markdown_stream(file, tables)
+        else:
+            with open(file, "w") as f:
+                self.write_markdown_stream(f, tables)
 
-                f.write("|Property | Value | Units | Data Source | \n")
-                f.write("|---------| ----- | ----- | ----------- | \n")
+        return
 
-                for p in self.thermophysical_property_names:
-                    if p in self.properties.keys():
-                        next_ref = self.properties[p].reference
-                        ref_index = None
+    def markdown_string(self, tables=["properties"]):
+        # Render the Markdown in memory
+        stream = io.StringIO()
+        self.write_markdown_stream(stream, tables)
+        return stream.getvalue()
+
+    def write_markdown_stream(self, f, tables, references=None, level=1):
+        # Write the Markdown for this material to an open text stream.
+        # references maps each reference string to its index. If a dict is
+        # passed in it is shared (and extended) across calls and the reference
+        # list is left to the caller, see mistlib.report. level sets the
+        # heading level of the material title.
+        write_references = references is None
+        if references is None:
+            references = {}
+        section = "#" * (level + 1)
+
+        lines = ["#" * level + " Material Properties: " + self.name + "\n\n"]
+        if "composition" in tables:
+            lines.extend(self.markdown_composition_table(references, section))
+        if "properties" in tables:
+            lines.extend(self.markdown_properties_table(references, section))
+        if "phases" in tables:
+            lines.extend(self.markdown_phase_tables(references, section))
+        lines.append("\n")
+        if self.notes is not None:
+            lines.append(section + " Notes \n")
+            lines.append(self.notes + "\n")
+            lines.append("\n")
+        if write_references:
+            lines.extend(self.markdown_references(references, section))
+
+        f.write("".join(lines))
 
-                        if next_ref != None:
-                            ref_index = -1
-                            for idx, ref in enumerate(reference_list):
-                                if next_ref == ref:
-                                    ref_index = idx
-                                    break
+        return
 
-                            if ref_index == -1:
-                                ref_index = len(reference_list)
-                                reference_list.append(next_ref)
+    def markdown_reference_string(self, reference, references):
+        # Constant time lookup of the reference number, new references are
+        # numbered in order of appearance
+        if reference == None:
+            return "-"
+        ref_index = references.get(reference)
+        if ref_index is None:
+            ref_index = len(references)
+            references[reference] = ref_index
+        return "[" + str(ref_index + 1) + "]"
+
+    def markdown_value_string(self, property):
+        value_str = None
+        if property.value_type == ValueTypes.SCALAR:
+            value_str = self.replace_none_with_string(property.value, "-")
+        elif property.value_type == ValueTypes.LAURENT_POLYNOMIAL:
+            value_str = self.latex_laurent_poly(
+                property.value_laurent_poly,
+                property.dependent_variable_print_symbol,
+            )
+        elif property.value_type == ValueTypes.TABLE:
+            value_str = self.latex_table(
+                property.value_table,
+                property.dependent_variable_print_symbol,
+            )
+        else:
+            value_str = "-"
+        return value_str
+
+    def markdown_row(self, print_name_str, value_str, unit_str, ref_str):
+        return (
+            "| "
+            + print_name_str
+            + " | "
+            + value_str
+            + " | $"
+            + unit_str
+            + "$ | "
+            + ref_str
+            + " |"
+            + "\n"
+        )
 
-                        print_name_str = self.properties[p].print_name
+    def markdown_composition_table(self, references, section="##"):
+        lines = [
+            section + " Composition \n",
+            "|Element | Concentration | Units | Data Source | \n",
+            "|---------| ----- | ----- | ----------- | \n",
+        ]
 
-                        value_str = None
-                        if self.properties[p].value_type == ValueTypes.SCALAR:
-                            value_str = self.replace_none_with_string(
-                                self.properties[p].value, "-"
-                            )
-                        elif (
-                            self.properties[p].value_type
-                            == ValueTypes.LAURENT_POLYNOMIAL
-                        ):
-                            value_str = self.latex_laurent_poly(
-                                self.properties[p].value_laurent_poly,
-                                self.properties[p].dependent_variable_print_symbol,
-                            )
-                        elif (
-                            self.properties[p].value_type
-                            == ValueTypes.LAURENT_POLYNOMIAL
-                        ):
-                            value_str = self.replace_none_with_string(
-                                self.properties[p].value_table, "-"
-                            )
-                        else:
-                            value_str = "-"
+        if not self.composition or self.composition.get("base_element") is None:
+            return lines
+
+        elements = [self.composition["base_element"]]
+        elements.extend(self.composition["solute_elements"])
+        for element in elements:
+            p = self.composition.get(element)
+            if p is None:
+                lines.append(self.markdown_row(element, "-", "-", "-"))
+                continue
+            lines.append(
+                self.markdown_row(
+                    element,
+                    str(p.value),
+                    self.replace_none_with_string(p.unit, "-"),
+                    self.markdown_reference_string(p.reference, references),
+                )
+            )
+        return lines
 
-                        unit_str = self.replace_none_with_string(
-                            self.properties[p].unit, "-"
-                        )
+    def markdown_properties_table(self, references, section="##"):
+        lines = [
+            section + " Thermophysical Properties \n",
+            "|Property | Value | Units | Data Source | \n",
+            "|---------| ----- | ----- | ----------- | \n",
+        ]
 
-                        ref_str = None
-                        if ref_index == None:
-                            ref_str = "-"
-                        else:
-                            ref_str = "[" + str(ref_index + 1) + "]"
-
-                        f.write(
-                            "| "
-                            + print_name_str
-                            + " | "
-                            + value_str
-                            + " | $"
-                            + unit_str
-                            + "$ | "
-                            + ref_str
-                            + " |"
-                            + "\n"
+        for p in self.thermophysical_property_names:
+            if self.properties.get(p) is not None:
+                prop = self.properties[p]
+                ref_str = self.markdown_reference_string(prop.reference, references)
+                lines.append(
+                    self.markdown_row(
+                        prop.print_name,
+                        self.markdown_value_string(prop),
+                        self.replace_none_with_string(prop.unit, "-"),
+                        ref_str,
+                    )
+                )
+        return lines
+
+    def markdown_phase_tables(self, references, section="##"):
+        # One table per phase. Per-solute properties (solute_diffusivities and
+        # solute_misfit_strains) get one row per solute element.
+        lines = [section + " Single Phase Properties \n"]
+        for phase_name, phase in self.phase_properties.items():
+            print_name = self.replace_none_with_string(phase.print_name, phase_name)
+            lines.append(section + "# " + print_name + " \n")
+            lines.append("|Property | Value | Units | Data Source | \n")
+            lines.append("|---------| ----- | ----- | ----------- | \n")
+
+            for p in phase.property_names:
+                if phase.properties.get(p) is None:
+                    continue
+                if isinstance(phase.properties[p], dict):
+                    props = [
+                        prop
+                        for prop in phase.properties[p].values()
+                        if prop is not None
+                    ]
+                else:
+                    props = [phase.properties[p]]
+
+                for prop in props:
+                    ref_str = self.markdown_reference_string(prop.reference, references)
+                    lines.append(
+                        self.markdown_row(
+                            prop.print_name,
+                            self.markdown_value_string(prop),
+                            self.replace_none_with_string(prop.unit, "-"),
+                            ref_str,
                         )
-            f.write("\n")
-            if self.notes is not None:
-                f.write("## Notes \n")
-                f.write(self.notes + "\n")
-                f.write("\n")
-            f.write("## References \n")
-            for idx, ref in enumerate(reference_list):
-                ref_str = self.replace_none_with_string(ref, "-")
-                f.write("[" + str(idx + 1) + "] " + ref_str + "\n")
-                f.write("\n")
-
-        return
-
-    def write_pdf(self, file):
-        # Write a PDF file with the current material information
-        temp_md_file = "temp.md"
-        self.write_markdown(temp_md_file)
-        doc = pandoc.read(file=temp_md_file)
+                    )
+            lines.append("\n")
+        return lines
+
+    def markdown_references(self, references, section="##"):
+        lines = [section + " References \n"]
+        for reference, idx in references.items():
+            ref_str = self.replace_none_with_string(reference, "-")
+            lines.append("[" + str(idx + 1) + "] " + ref_str + "\n")
+            lines.append("\n")
+        return lines
+
+    @profiled("write_pdf", output="file")
+    def write_pdf(self, file, tables=["properties"]):
+        # Write a PDF file with the current material information. The Markdown
+        # is passed to pandoc from memory, so no intermediate file is written
+        # to the working directory and concurrent exports do not collide.
+        pandoc = import_report_dependency("pandoc")
+        doc = pandoc.read(source=self.markdown_string(tables), format="markdown")
         pandoc.write(
             doc, file=file, format="pdf", options=["-V", "geometry:margin=1in"]
         )
-        os.remove(temp_md_file)
 
         return
 
+    @profiled("write_adamantine_input", output="file")
     def write_adamantine_input(self, file):
+        content = adamantine_input_content(**self.adamantine_inputs())
+        with open(file, "w") as f:
+            f.write(content)
+
+    def adamantine_inputs(self):
+        # Values written to the adamantine input deck, see
+        # adamantine_input_content
         reference_temperature = self.properties[
             "solidus_eutectic_temperature"
         ].value  # For adamantine we assume that all temperature-dependent material properties are evaluated at the solidus temperature
         code_name = "adamantine"
 
-        specific_heat_1 = self.get_property(
-            "specific_heat_solid", code_name, reference_temperature
-        )
-        specific_heat_2 = self.get_property(
-            "specific_heat_liquid", code_name, reference_temperature
-        )
-        thermal_conductivity_1 = self.get_property(
-            "thermal_conductivity_solid", code_name, reference_temperature
-        )
-        density = self.get_property("density", code_name, reference_temperature)
-        thermal_conductivity_2 = self.get_property(
-            "thermal_conductivity_liquid", code_name, reference_temperature
-        )
-        emissivity = self.get_property("emissivity", code_name, reference_temperature)
-
-        content = (
-            f"materials\n{{"
-            f"\n\tn_material 1"
-            f"\n\tproperty_format polynomial"
-            f"\n\tmaterial_0"
-            f"\n\t{{"
-            f"\n\t\tsolid"
-            f"\n\t\t{{"
-            f"\n\t\t\tdensity {density} ;"
-            f"\n\t\t\tspecific_heat {specific_heat_1} ;"
-            f"\n\t\t\tthermal_conductivity_x {thermal_conductivity_1} ;"
-            f"\n\t\t\tthermal_conductivity_z {thermal_conductivity_1} ;"
-            f"\n\t\t\temissivity {emissivity} ;"
-            f"\n\t\t}}"
-            f"\n\t\tliquid"
-            f"\n\t\t{{"
-            f"\n\t\t\tdensity {density} ;"
-            f"\n\t\t\tspecific_heat {specific_heat_2} ;"
-            f"\n\t\t\tthermal_conductivity_x {thermal_conductivity_2} ;"
-            f"\n\t\t\tthermal_conductivity_z {thermal_conductivity_2} ;"
-            f"\n\t\t\temissivity {emissivity} ;"
-            f"\n\t\t}}"
-            f"\n\tsolidus {self.properties['solidus_eutectic_temperature'].value} ;"
-            f"\n\tliquidus {self.properties['liquidus_temperature'].value} ;"
-            f"\n\tlatent heat {self.properties['latent_heat_fusion'].value} ;"
-            f"\n\t}}"
-            f"\n}}"
-        )
-        with open(file, "w") as f:
-            f.write(content)
+        return {
+            "specific_heat_solid": self.get_property(
+                "specific_heat_solid", code_name, reference_temperature
+            ),
+            "specific_heat_liquid": self.get_property(
+                "specific_heat_liquid", code_name, reference_temperature
+            ),
+            "thermal_conductivity_solid": self.get_property(
+                "thermal_conductivity_solid", code_name, reference_temperature
+            ),
+            "density": self.get_property("density", code_name, reference_temperature),
+            "thermal_conductivity_liquid": self.get_property(
+                "thermal_conductivity_liquid", code_name, reference_temperature
+            ),
+            "emissivity": self.get_property(
+                "emissivity", code_name, reference_temperature
+            ),
+            "solidus_temperature": self.properties[
+                "solidus_eutectic_temperature"
+            ].value,
+            "liquidus_temperature": self.properties["liquidus_temperature"].value,
+            "latent_heat_fusion": self.properties["latent_heat_fusion"].value,
+        }
 
     def append_file(input_filename, output_filename):
         # Get current directory of the script
@@ -517,6 +1391,7 @@ class MaterialInformation:
 
         return
 
+    @profiled("write_additivefoam_transportProp", output="file")
     def write_additivefoam_transportProp(self, file="transportProperties"):
         code_name = "AdditiveFOAM"
         comment_block = """/*---------------------------------------------------------------------------
@@ -549,6 +1424,13 @@ class MaterialInformation:
                     while len(all_coeff.split("\t")) < 4:
                         all_coeff += "0.0\t"
                 return f"\t{variable_name}\t({all_coeff.strip()});\n"
+            elif p.value_type == ValueTypes.TABLE:
+                # Least squares fit of (up to) a quadratic to the table points
+                print(f"Warning: fitting tabular values with a polynomial.")
+                degree = min(2, len(p._table_x) - 1)
+                coeff = np.polynomial.polynomial.polyfit(p._table_x, p._table_y, degree)
+                coeff = list(coeff) + [0.0] * (3 - len(coeff))
+                return f"\t{variable_name}\t({coeff[0]}\t{coeff[1]}\t{coeff[2]});\n"
             else:
                 print(f"Warning: converting scalar into polynomial.")
                 return f"\t{variable_name}\t({p.value}\t0.0\t0.0);\n"
@@ -590,6 +1472,7 @@ class MaterialInformation:
             f.write(content)
         return file
 
+    @profiled("write_additivefoam_thermoPath", output="file")
     def write_additivefoam_thermoPath(self, file="thermoPath"):
         with open(file, "w") as g:
             eutectic_temp = self.properties["solidus_eutectic_temperature"].value
@@ -606,7 +1489,16 @@ class MaterialInformation:
         self.write_additivefoam_thermoPath(file=thermo_file)
         return [transport_file, thermo_file]
 
+    @profiled("write_3dthesis_input", output="file")
     def write_3dthesis_input(self, file, initial_temperature=None):
+        content_to_write = thesis_input_content(
+            **self.thesis_inputs(initial_temperature)
+        )
+        with open(file, "w") as f:
+            f.write(content_to_write)
+
+    def thesis_inputs(self, initial_temperature=None):
+        # Values written to the 3DThesis input deck, see thesis_input_content
         # 3DThesis/autothesis/Condor assumes at "T_0" initial temperature value. Myna populates this from Peregrine. For now we add a placeholder of -1 unless the user specifies an initial temperature.
         if initial_temperature == None:
             initial_temperature = -1
@@ -614,47 +1506,186 @@ class MaterialInformation:
         code_name = "autothesis"
         # For autothesis we assume that all temperature-dependent material properties are evaluated at the solidus temperature
         reference_temperature = self.properties["solidus_eutectic_temperature"].value
-        thermal_conductivity = self.get_property(
-            "thermal_conductivity_solid", code_name, reference_temperature
-        )
-        density = self.get_property("density", code_name, reference_temperature)
-        specific_heat = self.get_property(
-            "specific_heat_solid", code_name, reference_temperature
-        )
+        return {
+            "thermal_conductivity": self.get_property(
+                "thermal_conductivity_solid", code_name, reference_temperature
+            ),
+            "density": self.get_property("density", code_name, reference_temperature),
+            "specific_heat": self.get_property(
+                "specific_heat_solid", code_name, reference_temperature
+            ),
+            "initial_temperature": initial_temperature,
+            "liquidus_temperature": self.properties["liquidus_temperature"].value,
+        }
+
+    @profiled("get_property")
+    def get_property(self, property_name, code_name, reference_temperature, unit=None):
+        # With a unit (or unit system, see mistlib.units) the value is
+        # converted from the unit of the property
+        p = self.properties[property_name]
 
-        content_to_write = (
-            "Constants\n"
-            "{\n"
-            f"\t T_0\t{initial_temperature}\n"
-            f"\t T_L\t{self.properties['liquidus_temperature'].value}\n"
-            f"\t k\t{thermal_conductivity}\n"
-            f"\t c\t{specific_heat}\n"
-            f"\t p\t{density}\n"
-            "}"
-        )
-        with open(file, "w") as f:
-            f.write(content_to_write)
+        # Memoize results per (property, reference temperature, unit). Entries
+        # are only reused if the Property object and its value are unchanged.
+        if unit is None:
+            key = (property_name, reference_temperature)
+        else:
+            key = (property_name, reference_temperature, unit)
+        try:
+            entry = self._property_cache.get(key)
+        except TypeError:
+            # Unhashable input (e.g. an array of temperatures), so skip the cache
+            return self.evaluate_property(p, code_name, reference_temperature, unit)
+
+        if entry is not None and entry[0] is p and entry[1] == p._version:
+            self._property_cache.move_to_end(key)
+            return entry[2]
+
+        prop = self.evaluate_property(p, code_name, reference_temperature, unit)
+        if prop is not None:
+            self._property_cache[key] = (p, p._version, prop)
+            if len(self._property_cache) > self.property_cache_size:
+                self._property_cache.popitem(last=False)
+        return prop
 
-    def get_property(self, property_name, code_name, reference_temperature):
+    def evaluate_property(self, p, code_name, reference_temperature, unit=None):
         prop = None
-        p = self.properties[property_name]
-        if p.value_type == ValueTypes.SCALAR:
-            prop = p.value
-        elif p.value_type == ValueTypes.LAURENT_POLYNOMIAL:
-            prop = p.evaluate_laurent_polynomial(reference_temperature)
+        if p.value_type in (
+            ValueTypes.SCALAR,
+            ValueTypes.LAURENT_POLYNOMIAL,
+            ValueTypes.TABLE,
+        ):
+            prop = p.compile(unit)(reference_temperature)
         else:
             print(
-                f"Error: {code_name} requires either SCALAR or LAURENT_POLYNOMIAL ValueTypes for {property_name}."
+                f"Error: {code_name} requires a SCALAR, LAURENT_POLYNOMIAL or TABLE ValueType for {p.name}."
             )
         return prop
 
+    def clear_property_cache(self):
+        self._property_cache.clear()
+
+    def temperature_dependent_property_names(self):
+        return [
+            p
+            for p in self.thermophysical_property_names
+            if self.properties.get(p) is not None
+            and self.properties[p].value_type
+            in (ValueTypes.LAURENT_POLYNOMIAL, ValueTypes.TABLE)
+        ]
+
+    def tabulate_properties(self, temperatures, property_names=None, unit=None):
+        # Evaluate properties on a temperature grid, one vectorized pass per
+        # property. By default all temperature-dependent thermophysical
+        # properties are included, scalar properties can be requested by name
+        # and are broadcast to the grid. unit is a unit system (e.g. "SI") for
+        # all properties.
+        if property_names is None:
+            property_names = self.temperature_dependent_property_names()
+        temperatures = np.ascontiguousarray(temperatures, dtype=np.float64)
+
+        tables = {"temperature": temperatures}
+        for p in property_names:
+            tables[p] = np.asarray(
+                self.properties[p].compile(unit)(temperatures), dtype=np.float64
+            )
+        return tables
+
+    def phase_tensors(self, property_names=None, unit=None):
+        # Single phase properties packed into arrays over phases, solutes and
+        # temperatures, see mistlib.phases.PhaseTensors
+        from mistlib.phases import PhaseTensors
+
+        return PhaseTensors(self, property_names, unit)
+
+    def derived_properties(self, phase=None, parameters=None, unit="SI"):
+        # Evaluator of derived quantities such as the thermal diffusivity or
+        # the freezing range, see mistlib.derived.DerivedProperties
+        from mistlib.derived import DerivedProperties
+
+        return DerivedProperties(self, phase, parameters, unit)
+
+    def adaptive_temperature_grid(
+        self,
+        t_min,
+        t_max,
+        property_names=None,
+        tolerance=1.0e-4,
+        initial_points=17,
+        max_points=100000,
+    ):
+        # Build a temperature grid on which linear interpolation between grid
+        # points reproduces every property to within the relative tolerance.
+        # Each pass evaluates all interval midpoints at once and splits the
+        # intervals where the interpolation error is too large.
+        if property_names is None:
+            property_names = self.temperature_dependent_property_names()
+        evaluators = [self.properties[p].compile() for p in property_names]
+
+        grid = np.linspace(t_min, t_max, initial_points)
+        while len(grid) < max_points:
+            midpoints = 0.5 * (grid[:-1] + grid[1:])
+            refine = np.zeros(len(midpoints), dtype=bool)
+            for evaluator in evaluators:
+                values = np.asarray(evaluator(grid), dtype=np.float64)
+                exact = np.asarray(evaluator(midpoints), dtype=np.float64)
+                interpolated = 0.5 * (values[:-1] + values[1:])
+                scale = np.maximum(np.abs(exact), np.finfo(np.float64).tiny)
+                refine |= np.abs(interpolated - exact) > tolerance * scale
+            if not np.any(refine):
+                break
+            refine_points = midpoints[refine][: max_points - len(grid)]
+            grid = np.sort(np.concatenate((grid, refine_points)))
+
+        return grid
+
+    @profiled("save_property_tables", output="return")
+    def save_property_tables(
+        self, path, temperatures, property_names=None, format="npy"
+    ):
+        # Save tabulated properties for other processes. With format="npy"
+        # path is a directory with one .npy file per property (plus
+        # temperature.npy and units.json), which can be opened without copies
+        # through np.load(..., mmap_mode="r") or load_property_tables. With
+        # format="npz" a single uncompressed .npz archive is written instead.
+        tables = self.tabulate_properties(temperatures, property_names)
+        units = {
+            p: self.properties[p].unit for p in tables.keys() if p != "temperature"
+        }
+        units["temperature"] = "K"
+
+        if format == "npy":
+            os.makedirs(path, exist_ok=True)
+            files = []
+            for p, values in tables.items():
+                file = os.path.join(path, p + ".npy")
+                np.save(file, values)
+                files.append(file)
+            file = os.path.join(path, "units.json")
+            with open(file, "w") as f:
+                json.dump({"name": self.name, "units": units}, f, indent=4)
+            files.append(file)
+            return files
+        elif format == "npz":
+            np.savez(path, **tables)
+            if not path.endswith(".npz"):
+                path = path + ".npz"
+            return [path]
+        else:
+            print(f"Error: unknown property table format {format}.")
+            return []
+
     def replace_none_with_string(self, entry, replace_string):
         if entry == None:
             return replace_string
         else:
             return str(entry)
 
-    def validate_completeness(self):
-        # Check if the information is complete by a user-specified standard
-        # TODO
-        return
+    def validate_completeness(self, targets=None):
+        # Check that the information is complete (and sensible) for the
+        # given targets ("adamantine", "additivefoam", "3dthesis", "report",
+        # all by default) and return a mistlib.validation.ValidationReport
+        from mistlib.validation import TARGETS, validate_material
+
+        if targets is None:
+            targets = TARGETS
+        return validate_material(self, targets)
@@ -0,0 +1,306 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from mistlib.core import ValueTypes
+
+
+class DerivedQuantity:
+    # A quantity computed from other quantities: function(*inputs) is called
+    # with the values of the inputs (arrays over the temperatures) and has to
+    # be vectorized. unit is the unit of the result when the inputs are in SI
+    # units.
+    def __init__(self, name, inputs, function, unit=None, description=None):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.function = function
+        self.unit = unit
+        self.description = description
+
+    def __repr__(self):
+        return f"DerivedQuantity({self.name}, inputs={self.inputs})"
+
+
+# Derived quantities available to DerivedProperties by default
+REGISTRY = {}
+
+
+def register(name, inputs, unit=None, description=None, registry=None):
+    # Decorator adding a function to a registry (REGISTRY by default), e.g.
+    #   @register("thermal_effusivity", ["thermal_conductivity_solid",
+    #             "volumetric_heat_capacity_solid"], "J/(m^2~K~s^(1/2))")
+    #   def thermal_effusivity(k, rho_cp):
+    #       return np.sqrt(k * rho_cp)
+    if registry is None:
+        registry = REGISTRY
+
+    def decorator(function):
+        registry[name] = DerivedQuantity(name, inputs, function, unit, description)
+        return function
+
+    return decorator
+
+
+def dependency_order(names, registry=None):
+    # The derived quantities needed for names, each after its inputs. Names
+    # that are not in the registry are inputs taken from the material.
+    if registry is None:
+        registry = REGISTRY
+    order = []
+    done = set()
+    visiting = []
+
+    def visit(name):
+        if name in done or name not in registry:
+            return
+        if name in visiting:
+            cycle = visiting[visiting.index(name) :] + [name]
+            raise ValueError(f"Derived quantities depend on each other: {cycle}.")
+        visiting.append(name)
+        for dependency in registry[name].inputs:
+            visit(dependency)
+        visiting.pop()
+        done.add(name)
+        order.append(name)
+
+    for name in names:
+        visit(name)
+    return order
+
+
+@register(
+    "volumetric_heat_capacity_solid",
+    ["density", "specific_heat_solid"],
+    "J/(m^3~K)",
+    "Heat capacity per volume of the solid",
+)
+def volumetric_heat_capacity(density, specific_heat):
+    return density * specific_heat
+
+
+register(
+    "volumetric_heat_capacity_liquid",
+    ["density", "specific_heat_liquid"],
+    "J/(m^3~K)",
+    "Heat capacity per volume of the liquid",
+)(volumetric_heat_capacity)
+
+
+@register(
+    "thermal_diffusivity_solid",
+    ["thermal_conductivity_solid", "volumetric_heat_capacity_solid"],
+    "m^2/s",
+    "Thermal diffusivity of the solid, k / (rho c_p)",
+)
+def thermal_diffusivity(thermal_conductivity, volumetric_heat_capacity):
+    return thermal_conductivity / volumetric_heat_capacity
+
+
+register(
+    "thermal_diffusivity_liquid",
+    ["thermal_conductivity_liquid", "volumetric_heat_capacity_liquid"],
+    "m^2/s",
+    "Thermal diffusivity of the liquid, k / (rho c_p)",
+)(thermal_diffusivity)
+
+
+@register(
+    "freezing_range",
+    ["liquidus_temperature", "solidus_eutectic_temperature"],
+    "K",
+    "Liquidus minus solidus (or eutectic) temperature",
+)
+def freezing_range(liquidus_temperature, solidus_temperature):
+    return liquidus_temperature - solidus_temperature
+
+
+@register(
+    "stefan_number",
+    ["specific_heat_solid", "freezing_range", "latent_heat_fusion"],
+    None,
+    "Sensible heat over the freezing range relative to the latent heat, c_p dT / L",
+)
+def stefan_number(specific_heat, freezing_range, latent_heat):
+    return specific_heat * freezing_range / latent_heat
+
+
+@register(
+    "growth_restriction_factor",
+    ["liquidus_slope", "solute_contents", "partition_coefficient"],
+    "K",
+    "Growth restriction factor sum_i m c_0,i (k_i - 1) of the primary phase",
+)
+def growth_restriction_factor(liquidus_slope, solute_contents, partition_coefficient):
+    return np.sum(liquidus_slope * solute_contents * (partition_coefficient - 1.0), 0)
+
+
+def scalar_if_0d(value):
+    if isinstance(value, np.ndarray) and value.ndim == 0:
+        return value[()]
+    return value
+
+
+class DerivedProperties:
+    # Evaluates derived quantities of one material from a registry of
+    # DerivedQuantity. The inputs of a derived quantity are other derived
+    # quantities or, in this order of precedence,
+    #   parameters       values passed in parameters, a number, an array over
+    #                    the temperatures or a dict {solute element: value}
+    #   properties       thermophysical properties of the material
+    #   phase properties properties of phase (e.g. liquidus_slope); per solute
+    #                    properties are arrays over the solutes
+    #   solute_contents  the solute contents of the composition
+    # Per solute values have the solutes (self.solutes) as their first axis.
+    #
+    # Thermophysical properties are converted to unit ("SI" by default, None
+    # keeps the units of the material). Phase properties and solute contents
+    # keep the units of the material (mist files give liquidus slopes and
+    # contents in at.%), and parameters have to be given in the same units as
+    # the values they are combined with. Every quantity is evaluated once
+    # for the whole temperature array, and all results, including the inputs
+    # shared by several derived quantities, are memoized per temperature
+    # array until a property of the material changes.
+    def __init__(
+        self,
+        material,
+        phase=None,
+        parameters=None,
+        unit="SI",
+        registry=None,
+        cache_size=16,
+    ):
+        self.material = material
+        self.phase = phase
+        self.parameters = parameters if parameters is not None else {}
+        self.unit = unit
+        self.registry = registry if registry is not None else REGISTRY
+        self.cache_size = cache_size
+        composition = material.composition or {}
+        self.solutes = tuple(composition.get("solute_elements") or [])
+        self._tensors = None
+        self._state = None
+        # Temperature key -> {quantity name: values}
+        self._memo = OrderedDict()
+
+        return
+
+    def state(self):
+        # Changes whenever a property of the material is replaced or modified
+        state = [
+            (name, id(p), p._version) for name, p in self.material.properties.items()
+        ]
+        for phase_name, phase in self.material.phase_properties.items():
+            for name, value in phase.properties.items():
+                values = value.values() if isinstance(value, dict) else [value]
+                state.extend(
+                    (phase_name, name, id(p), p._version)
+                    for p in values
+                    if p is not None
+                )
+        return tuple(state)
+
+    def memo(self, temperatures):
+        state = self.state()
+        if state != self._state:
+            self._state = state
+            self._tensors = None
+            self._memo.clear()
+        if temperatures is None:
+            key = None
+        else:
+            key = (temperatures.shape, temperatures.tobytes())
+        values = self._memo.get(key)
+        if values is None:
+            values = {}
+            self._memo[key] = values
+            if len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+        else:
+            self._memo.move_to_end(key)
+        return values
+
+    def per_solute(self, values, temperatures):
+        # Array over the solutes, broadcastable against the temperatures
+        values = np.array([values[element] for element in self.solutes], dtype=float)
+        ndim = 0 if temperatures is None else temperatures.ndim
+        return values.reshape((len(self.solutes),) + (1,) * ndim)
+
+    def phase_tensors(self):
+        if self._tensors is None:
+            self._tensors = self.material.phase_tensors()
+        return self._tensors
+
+    def property_value(self, p, temperatures, unit=None):
+        evaluator = p.compile()
+        if unit is not None:
+            try:
+                evaluator = p.compile(unit)
+            except ValueError:
+                print(f"Warning: can not convert {p.name} to {unit}.")
+        if temperatures is None:
+            if p.value_type != ValueTypes.SCALAR:
+                raise ValueError(
+                    f"{p.name} depends on the temperature, pass temperatures."
+                )
+            return float(evaluator())
+        return np.broadcast_to(
+            np.asarray(evaluator(temperatures), dtype=np.float64), temperatures.shape
+        )
+
+    def input_value(self, name, temperatures):
+        # Value of a quantity that is not derived
+        if name in self.parameters:
+            value = self.parameters[name]
+            if isinstance(value, dict):
+                return self.per_solute(value, temperatures)
+            return np.asarray(value, dtype=np.float64)
+        p = self.material.properties.get(name)
+        if p is not None:
+            return self.property_value(p, temperatures, self.unit)
+        if name == "solute_contents":
+            contents = {}
+            for element in self.solutes:
+                content = self.material.composition.get(element)
+                if content is None:
+                    raise KeyError(
+                        f"{self.material.name} has no content for {element}, pass solute_contents in parameters."
+                    )
+                contents[element] = self.property_value(content, None)
+            return self.per_solute(contents, temperatures)
+        if self.phase is not None:
+            tensors = self.phase_tensors()
+            if name in tensors.properties:
+                value = tensors.evaluate(name, temperatures)[
+                    tensors.phase_index(self.phase)
+                ]
+                if np.any(np.isnan(value)):
+                    raise KeyError(f"Phase {self.phase} has no {name}.")
+                return value
+        raise KeyError(f"{self.material.name} has no {name}.")
+
+    def evaluate(self, name, temperatures=None):
+        # Value of a derived quantity (or any input) at the temperatures, an
+        # array of the temperatures' shape (or a number without temperatures)
+        return self.evaluate_many([name], temperatures)[name]
+
+    def evaluate_many(self, names, temperatures=None):
+        # Several quantities at once, as a dict {name: values}. A single
+        # temperature gives numbers.
+        if temperatures is not None:
+            temperatures = np.asarray(temperatures, dtype=np.float64)
+        values = self.memo(temperatures)
+        for name in dependency_order(names, self.registry) + list(names):
+            if name in values:
+                continue
+            quantity = self.registry.get(name)
+            if quantity is None:
+                values[name] = self.input_value(name, temperatures)
+                continue
+            inputs = []
+            for dependency in quantity.inputs:
+                if dependency not in values:
+                    values[dependency] = self.input_value(dependency, temperatures)
+                inputs.append(values[dependency])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values[name] = quantity.function(*inputs)
+        return {name: scalar_if_0d(values[name]) for name in names}
@@ -0,0 +1,167 @@
+import numpy as np
+
+
+class EnthalpyModel:
+    # Specific enthalpy H(T) (per unit mass, relative to reference_temperature)
+    # and its inverse T(H) for enthalpy-based solvers.
+    #
+    # Below the solidus/eutectic temperature T_s, H is the integral of
+    # specific_heat_solid. Between T_s and the liquidus temperature T_l the
+    # latent heat of fusion is released linearly in temperature (as in the
+    # AdditiveFOAM thermoPath) on top of the solid sensible heat, and above T_l
+    # specific_heat_liquid is integrated from H(T_l). The specific heat
+    # integrals are analytic (see Property.antiderivative).
+    #
+    # The inverse uses a precomputed monotone (T, H) table between t_min and
+    # t_max to bracket and start each point, followed by a few vectorized,
+    # bracketed Newton iterations.
+    def __init__(
+        self,
+        material,
+        reference_temperature=298.15,
+        t_min=None,
+        t_max=None,
+        num_points=257,
+    ):
+        properties = material.properties
+        self.specific_heat_solid = properties["specific_heat_solid"]
+        self.specific_heat_liquid = properties["specific_heat_liquid"]
+        self.solidus_temperature = float(
+            properties["solidus_eutectic_temperature"].value
+        )
+        self.liquidus_temperature = float(properties["liquidus_temperature"].value)
+        self.latent_heat = float(properties["latent_heat_fusion"].value)
+        self.reference_temperature = reference_temperature
+
+        assert self.liquidus_temperature >= self.solidus_temperature
+
+        # Offsets that make H continuous and zero at the reference temperature
+        self._solid_offset = self.specific_heat_solid.antiderivative(
+            reference_temperature
+        )
+        self._liquid_offset = (
+            self.solid_sensible_enthalpy(self.liquidus_temperature)
+            + self.latent_heat
+            - self.specific_heat_liquid.antiderivative(self.liquidus_temperature)
+        )
+
+        # Monotone lookup table used to start the inversion. The solidus and
+        # liquidus temperatures are always grid points so that every interval
+        # is smooth. For an isothermal transformation the solidus appears
+        # twice, once on each side of the latent heat jump.
+        if t_min is None:
+            t_min = min(reference_temperature, self.solidus_temperature)
+        if t_max is None:
+            t_max = 2.0 * self.liquidus_temperature
+        grid = np.linspace(t_min, t_max, num_points)
+        grid = np.union1d(grid, [self.solidus_temperature, self.liquidus_temperature])
+        enthalpies = self.enthalpy(grid)
+        if self.liquidus_temperature == self.solidus_temperature:
+            i = np.searchsorted(grid, self.solidus_temperature)
+            grid = np.insert(grid, i, self.solidus_temperature)
+            enthalpies = np.insert(
+                enthalpies, i, self.solid_sensible_enthalpy(self.solidus_temperature)
+            )
+        self.table_temperature = grid
+        self.table_enthalpy = enthalpies
+
+        # Check that the enthalpy increases with temperature over the table
+        assert np.all(np.diff(self.table_enthalpy) > 0.0)
+
+        return
+
+    def solid_sensible_enthalpy(self, temperature):
+        return self.specific_heat_solid.antiderivative(temperature) - self._solid_offset
+
+    def liquid_fraction(self, temperature):
+        t = np.asarray(temperature, dtype=np.float64)
+        if self.liquidus_temperature > self.solidus_temperature:
+            fraction = np.clip(
+                (t - self.solidus_temperature)
+                / (self.liquidus_temperature - self.solidus_temperature),
+                0.0,
+                1.0,
+            )
+        else:
+            fraction = np.where(t >= self.solidus_temperature, 1.0, 0.0)
+        return fraction
+
+    def enthalpy(self, temperature):
+        # H(T) for a scalar or an array of temperatures
+        t = np.asarray(temperature, dtype=np.float64)
+        solid = self.solid_sensible_enthalpy(
+            np.minimum(t, self.liquidus_temperature)
+        ) + self.latent_heat * self.liquid_fraction(t)
+        liquid = (
+            self.specific_heat_liquid.antiderivative(
+                np.maximum(t, self.liquidus_temperature)
+            )
+            + self._liquid_offset
+        )
+        result = np.where(t > self.liquidus_temperature, liquid, solid)
+        if result.ndim == 0:
+            return float(result)
+        return result
+
+    def effective_specific_heat(self, temperature):
+        # dH/dT, including the latent heat spread over the mushy zone
+        t = np.asarray(temperature, dtype=np.float64)
+        c_s = np.asarray(self.specific_heat_solid.evaluate(t), dtype=np.float64)
+        c_l = np.asarray(self.specific_heat_liquid.evaluate(t), dtype=np.float64)
+        result = np.where(t > self.liquidus_temperature, c_l, c_s)
+        if self.liquidus_temperature > self.solidus_temperature:
+            mushy = (t >= self.solidus_temperature) & (t <= self.liquidus_temperature)
+            result = result + np.where(
+                mushy,
+                self.latent_heat
+                / (self.liquidus_temperature - self.solidus_temperature),
+                0.0,
+            )
+        if result.ndim == 0:
+            return float(result)
+        return result
+
+    def temperature(self, enthalpy, iterations=4):
+        # T(H) for a scalar or an array of enthalpies
+        h = np.asarray(enthalpy, dtype=np.float64)
+        table_t = self.table_temperature
+        table_h = self.table_enthalpy
+
+        # Bracket each point in the table and start from linear interpolation.
+        # Outside of the table the bracket is open on one side.
+        idx = np.searchsorted(table_h, h, side="right") - 1
+        idx = np.clip(idx, 0, len(table_h) - 2)
+        lower = table_t[idx]
+        upper = table_t[idx + 1]
+        lower = np.where(h < table_h[0], -np.inf, lower)
+        upper = np.where(h > table_h[-1], np.inf, upper)
+        t = np.interp(h, table_h, table_t)
+        # Extend linearly outside of the table with the end specific heats
+        t = np.where(
+            h < table_h[0],
+            table_t[0] + (h - table_h[0]) / self.effective_specific_heat(table_t[0]),
+            t,
+        )
+        t = np.where(
+            h > table_h[-1],
+            table_t[-1] + (h - table_h[-1]) / self.effective_specific_heat(table_t[-1]),
+            t,
+        )
+
+        # Points inside an isothermal latent heat jump have a zero width
+        # bracket and need no refinement
+        jump = upper == lower
+        for i in range(iterations):
+            # Evaluate the slope in the middle of the bracket side of the
+            # current point so that kinks at the bracket ends are not crossed
+            residual = self.enthalpy(t) - h
+            slope = self.effective_specific_heat(
+                np.clip(t, lower + 1.0e-9, upper - 1.0e-9)
+            )
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = np.where(jump, lower, t - residual / slope)
+            t = np.clip(t, lower, upper)
+
+        if t.ndim == 0:
+            return float(t)
+        return t
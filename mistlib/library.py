@@ -0,0 +1,365 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+from mistlib.core import MaterialInformation
+
+# Bump when the layout of the index entries changes so that old persisted
+# indexes are rebuilt
+LIBRARY_INDEX_VERSION = 1
+
+
+class MaterialLibrary:
+    # A directory of material JSON files. Scanning only builds a lightweight
+    # index of each file (name, composition and which properties exist), full
+    # MaterialInformation objects are loaded on first access and kept in a
+    # bounded least recently used cache. An optional MaterialCache is used to
+    # skip parsing for files that were loaded before.
+    #
+    # The index is kept in index_path (by default in the directory of the
+    # cache, if any), so that later scans, also by other processes, only
+    # parse the files whose modification time or size changed.
+    def __init__(
+        self, directory, max_loaded=64, recursive=False, cache=None, index_path=None
+    ):
+        self.directory = directory
+        self.max_loaded = max_loaded
+        self.recursive = recursive
+        self.cache = cache
+        if index_path is None and cache is not None:
+            key = hashlib.sha256(os.path.abspath(directory).encode("utf-8"))
+            index_path = os.path.join(
+                cache.cache_dir, "library-" + key.hexdigest()[:32] + ".json"
+            )
+        self.index_path = index_path
+
+        # Material name -> index entry
+        self.index = OrderedDict()
+        # Material name -> loaded MaterialInformation
+        self._loaded = OrderedDict()
+
+        self.scan()
+
+        return
+
+    def find_files(self):
+        return find_material_files(self.directory, self.recursive)
+
+    def scan(self):
+        # (Re)build the index. Files that are unchanged since the last scan
+        # (or since the persisted index was written) are not parsed again.
+        if len(self.index) == 0 and self.index_path is not None:
+            previous = self.read_index()
+        else:
+            previous = {entry["file"]: entry for entry in self.index.values()}
+        changed = False
+        index = OrderedDict()
+        for file in self.find_files():
+            stat = os.stat(file)
+            entry = previous.get(file)
+            if (
+                entry is None
+                or entry["mtime"] != stat.st_mtime_ns
+                or entry.get("size") != stat.st_size
+            ):
+                changed = True
+                entry = self.index_file(file, stat)
+                if entry is None:
+                    continue
+                # Drop a stale loaded copy
+                self._loaded.pop(entry["name"], None)
+
+            if entry["name"] in index:
+                print(
+                    f"Warning: skipping {file}, material {entry['name']} is already defined in {index[entry['name']]['file']}."
+                )
+                continue
+            index[entry["name"]] = entry
+
+        # Drop loaded materials whose files were removed
+        for name in list(self._loaded.keys()):
+            if name not in index:
+                del self._loaded[name]
+
+        changed = changed or len(index) != len(previous)
+        self.index = index
+        if changed and self.index_path is not None:
+            self.write_index()
+        return
+
+    def read_index(self):
+        # Entries of the persisted index by file, empty if there is none
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Warning: ignoring unreadable index {self.index_path} ({e}).")
+            return {}
+        if data.get("version") != LIBRARY_INDEX_VERSION or data.get(
+            "directory"
+        ) != os.path.abspath(self.directory):
+            return {}
+        return {entry["file"]: entry for entry in data.get("entries", [])}
+
+    def write_index(self):
+        # Write to a temporary file and rename it into place so that other
+        # processes never read a partial index
+        data = {
+            "version": LIBRARY_INDEX_VERSION,
+            "directory": os.path.abspath(self.directory),
+            "entries": list(self.index.values()),
+        }
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_file = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        except OSError as e:
+            print(
+                f"Warning: the index could not be written to {self.index_path} ({e})."
+            )
+            return
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_file, self.index_path)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+        return
+
+    def index_file(self, file, stat=None):
+        # Only the keys of each section are recorded, no Property objects are
+        # created
+        try:
+            with open(file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: skipping {file}, it could not be read ({e}).")
+            return None
+        if not isinstance(data, dict) or "name" not in data:
+            print(f"Warning: skipping {file}, it is not a material file.")
+            return None
+
+        if stat is None:
+            stat = os.stat(file)
+
+        composition = data.get("composition", {})
+        single_phase_properties = data.get("single_phase_properties", {})
+        entry = {
+            "name": data["name"],
+            "file": file,
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "base_element": composition.get("base_element"),
+            "solute_elements": composition.get("solute_elements", []),
+            "properties": sorted(data.get("thermophysical_properties", {}).keys()),
+            "phases": single_phase_properties.get("phases", []),
+        }
+        return entry
+
+    def load(self, name):
+        # Return the full material, loading it if needed
+        material = self._loaded.get(name)
+        if material is not None:
+            self._loaded.move_to_end(name)
+            return material
+
+        entry = self.index[name]
+        material = self.load_material(entry["file"])
+        self._loaded[name] = material
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+        return material
+
+    def load_material(self, file):
+        if self.cache is not None:
+            return self.cache.load(file)
+        return MaterialInformation(file)
+
+    def get(self, name, default=None):
+        if name not in self.index:
+            return default
+        return self.load(name)
+
+    def names(self):
+        return list(self.index.keys())
+
+    def find(self, base_element=None, solute_elements=None, properties=None):
+        # Names of the materials that match all of the given criteria, using
+        # only the index
+        if isinstance(solute_elements, str):
+            solute_elements = [solute_elements]
+        if isinstance(properties, str):
+            properties = [properties]
+
+        names = []
+        for name, entry in self.index.items():
+            if base_element is not None and entry["base_element"] != base_element:
+                continue
+            if solute_elements is not None and not set(solute_elements).issubset(
+                entry["solute_elements"]
+            ):
+                continue
+            if properties is not None and not set(properties).issubset(
+                entry["properties"]
+            ):
+                continue
+            names.append(name)
+        return names
+
+    def num_loaded(self):
+        return len(self._loaded)
+
+    def clear_cache(self):
+        self._loaded.clear()
+
+    def __getitem__(self, name):
+        return self.load(name)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.index.keys())
+
+    def __len__(self):
+        return len(self.index)
+
+
+class MaterialRecord:
+    # One material of a JSON Lines or JSON array file (see
+    # mistlib.serialization.read_records), kept as the raw record and only
+    # loaded by load(), e.g. in the worker exporting it. A record that could
+    # not be parsed carries the error instead, which load() raises. label
+    # ("file:line") locates the record in its file.
+    def __init__(self, file, line, record=None, error=None):
+        self.file = file
+        self.line = line
+        self.record = record
+        self.error = error
+
+        return
+
+    @property
+    def name(self):
+        if isinstance(self.record, dict) and isinstance(self.record.get("name"), str):
+            return self.record["name"]
+        return None
+
+    @property
+    def label(self):
+        return f"{self.file}:{self.line}"
+
+    def load(self):
+        if self.error is not None:
+            raise ValueError(f"{self.label}: {self.error}")
+        if self.name is None:
+            raise ValueError(f"{self.label}: the record is not a material.")
+        material = MaterialInformation()
+        try:
+            material.load_dict(self.record)
+        except Exception as e:
+            raise ValueError(f"{self.label}: {type(e).__name__}: {e}") from e
+        return material
+
+    def content_hash(self):
+        # SHA-256 of the record (or of the error), for incremental exports
+        if self.error is not None:
+            content = "error:" + self.error
+        else:
+            content = json.dumps(self.record, sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def load_source(source, cache=None):
+    # MaterialInformation of a source yielded by material_sources: a path, a
+    # MaterialRecord or a MaterialInformation object
+    if isinstance(source, str):
+        if cache is not None:
+            return cache.load(source)
+        return MaterialInformation(source)
+    if isinstance(source, MaterialRecord):
+        return source.load()
+    return source
+
+
+def source_label(source):
+    # Name of a source in reports, before it is loaded
+    if isinstance(source, str):
+        return source
+    if isinstance(source, MaterialRecord):
+        return source.label
+    return source.name
+
+
+def check_file_name(name):
+    # Material names become file and directory names of the exporters, so a
+    # name that could point outside of the output directory is rejected
+    if (
+        not isinstance(name, str)
+        or name in ("", ".", "..")
+        or "/" in name
+        or "\\" in name
+        or "\0" in name
+        or (os.altsep is not None and os.altsep in name)
+    ):
+        raise ValueError(f"Material name {name!r} can not be used as a file name.")
+    return name
+
+
+def find_material_files(directory, recursive=False):
+    # Sorted paths of the JSON files in a directory
+    files = []
+    if recursive:
+        for root, dirs, names in os.walk(directory):
+            dirs.sort()
+            for name in sorted(names):
+                if name.endswith(".json"):
+                    files.append(os.path.join(root, name))
+    else:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith(".json") and entry.is_file():
+                    files.append(entry.path)
+        files.sort()
+    return files
+
+
+def material_sources(materials):
+    # Expand a MaterialLibrary, a directory or an iterable of JSON paths,
+    # directories and MaterialInformation objects into paths and objects,
+    # without loading anything. The materials of JSON Lines and JSON array
+    # files are read one at a time, as MaterialRecord.
+    from mistlib.serialization import is_multi_material_file, read_records
+
+    if isinstance(materials, MaterialLibrary):
+        for entry in materials.index.values():
+            yield entry["file"]
+        return
+    if isinstance(materials, str):
+        materials = [materials]
+    for material in materials:
+        if isinstance(material, str) and os.path.isdir(material):
+            for file in find_material_files(material):
+                yield file
+        elif isinstance(material, str) and is_multi_material_file(material):
+            # JSON Lines and JSON array files are streamed
+            for source in read_records(material):
+                yield source
+        else:
+            yield material
+
+
+def iter_materials(materials, cache=None):
+    # Yield MaterialInformation objects one at a time for any of the inputs
+    # accepted by material_sources
+    if cache is None and isinstance(materials, MaterialLibrary):
+        cache = materials.cache
+    for source in material_sources(materials):
+        yield load_source(source, cache)
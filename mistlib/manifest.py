@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from mistlib.cache import file_hash
+from mistlib.library import MaterialRecord
+
+# Bump when the layout of the manifest changes, or when a writer changes its
+# output, so that every deck is regenerated once
+MANIFEST_FORMAT_VERSION = 1
+
+# Default manifest file, kept in the export output directory
+MANIFEST_FILE = ".mist-manifest.json"
+
+# Export options that change the output of each target. Options that are not
+# listed (e.g. validate) do not make a deck stale.
+TARGET_OPTIONS = {
+    "adamantine": (),
+    "additivefoam": (),
+    "3dthesis": ("initial_temperature",),
+    "markdown": ("tables",),
+    "pdf": ("tables",),
+}
+
+
+def output_record(file):
+    stat = os.stat(file)
+    return {"hash": file_hash(file), "mtime": stat.st_mtime_ns, "size": stat.st_size}
+
+
+class BuildManifest:
+    # Record of the decks written by incremental exports (see
+    # mistlib.batch.export_batch). Every (source, target) entry stores
+    #   input    hash of the source contents, the target, the export options
+    #            of the target (TARGET_OPTIONS) and the manifest version
+    #   source   modification time, size and content hash of the source file
+    #   outputs  modification time, size and content hash of every file
+    #            written, relative to the output directory
+    # A deck is stale, make-style, if its input hash changed or one of its
+    # outputs is missing or was modified since it was written. Source files
+    # are only re-hashed when their modification time or size changed, and
+    # outputs are checked by modification time and size, so checking an up to
+    # date tree costs a few stat calls per deck.
+    def __init__(self, output_dir, file=None):
+        self.output_dir = output_dir
+        if file is None:
+            file = os.path.join(output_dir, MANIFEST_FILE)
+        self.file = file
+        self.entries = {}
+        # Source key -> source record, for the sources seen in this run
+        self.sources = {}
+        self.load()
+
+        return
+
+    def load(self):
+        try:
+            with open(self.file, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Warning: ignoring unreadable manifest {self.file} ({e}).")
+            return
+        if data.get("version") != MANIFEST_FORMAT_VERSION:
+            return
+        self.entries = data.get("entries", {})
+        return
+
+    def save(self):
+        # Write the manifest to a temporary file and rename it into place so
+        # that an interrupted export never leaves a partial manifest
+        os.makedirs(self.output_dir, exist_ok=True)
+        data = {"version": MANIFEST_FORMAT_VERSION, "entries": self.entries}
+        directory = os.path.dirname(os.path.abspath(self.file))
+        fd, temp_file = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(temp_file, self.file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+        return
+
+    def source_key(self, source):
+        if isinstance(source, str):
+            return os.path.abspath(source)
+        if isinstance(source, MaterialRecord):
+            # Records are identified by name, so that inserting lines does
+            # not invalidate the decks of the records after them
+            record_id = source.name if source.name is not None else source.line
+            return f"record:{os.path.abspath(source.file)}:{record_id}"
+        return "material:" + source.name
+
+    def entry_key(self, source, target):
+        return self.source_key(source) + "::" + target
+
+    def source_record(self, source, target):
+        # Modification time, size and content hash of a source, reusing the
+        # recorded hash if the file did not change. Sources are checked once
+        # per run, so the record matches the contents the decks are built from.
+        key = self.source_key(source)
+        record = self.sources.get(key)
+        if record is not None:
+            return record
+        if not isinstance(source, str):
+            record = {"hash": source.content_hash()}
+        else:
+            stat = os.stat(source)
+            record = {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+            previous = self.entries.get(self.entry_key(source, target), {})
+            previous = previous.get("source")
+            if (
+                previous is not None
+                and previous.get("mtime") == record["mtime"]
+                and previous.get("size") == record["size"]
+            ):
+                record["hash"] = previous["hash"]
+            else:
+                record["hash"] = file_hash(source)
+        self.sources[key] = record
+        return record
+
+    def input_hash(self, source_hash, target, options):
+        parameters = {
+            "version": MANIFEST_FORMAT_VERSION,
+            "source": source_hash,
+            "target": target,
+            "options": {name: options.get(name) for name in TARGET_OPTIONS[target]},
+        }
+        content = json.dumps(parameters, sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def outputs_unchanged(self, outputs):
+        for path, record in outputs.items():
+            try:
+                stat = os.stat(os.path.join(self.output_dir, path))
+            except OSError:
+                return False
+            if stat.st_mtime_ns != record["mtime"] or stat.st_size != record["size"]:
+                return False
+        return True
+
+    def is_stale(self, source, target, options):
+        # True if the deck of source for target has to be (re)generated. A
+        # source that can not be read is stale, so that the export reports
+        # the error.
+        try:
+            source_hash = self.source_record(source, target)["hash"]
+        except OSError:
+            return True
+        entry = self.entries.get(self.entry_key(source, target))
+        if entry is None:
+            return True
+        if entry["input"] != self.input_hash(source_hash, target, options):
+            return True
+        return not self.outputs_unchanged(entry["outputs"])
+
+    def outputs(self, source, target):
+        # Files recorded for a deck, as paths in the output directory
+        entry = self.entries.get(self.entry_key(source, target))
+        if entry is None:
+            return []
+        return [os.path.join(self.output_dir, path) for path in entry["outputs"]]
+
+    def material_name(self, source, target):
+        entry = self.entries.get(self.entry_key(source, target))
+        if entry is None:
+            return self.source_key(source)
+        return entry["material"]
+
+    def record(self, source, target, options, material_name, files):
+        # Record the files written for a deck
+        record = self.source_record(source, target)
+        self.entries[self.entry_key(source, target)] = {
+            "material": material_name,
+            "input": self.input_hash(record["hash"], target, options),
+            "source": record,
+            "outputs": {
+                os.path.relpath(file, self.output_dir): output_record(file)
+                for file in files
+            },
+        }
+        return
+
+    def forget(self, source, target):
+        # Drop the entry of a deck that failed, so that it is retried
+        self.entries.pop(self.entry_key(source, target), None)
+        return
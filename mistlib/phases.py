@@ -0,0 +1,196 @@
+import numpy as np
+
+from mistlib.core import SinglePhase, ValueTypes
+
+# Phase properties with one value per solute element
+PER_SOLUTE_PROPERTIES = ("solute_diffusivities", "solute_misfit_strains")
+
+
+class PackedProperty:
+    # The values of one phase property for all phases (and solutes), grouped
+    # by value type: constants in one array, Laurent polynomials as padded
+    # coefficient and exponent matrices (zero coefficients for the padding)
+    # and tables evaluated one by one. Entries are flat indices into the
+    # (phases,) or (phases, solutes) shape.
+    def __init__(self, name, axes, shape, properties, unit=None):
+        self.name = name
+        self.axes = axes
+        self.shape = shape
+        self.defined = np.zeros(shape, dtype=bool)
+        self.units = np.full(shape, None, dtype=object)
+
+        constant_index = []
+        constant_values = []
+        polynomial_index = []
+        polynomials = []
+        self.tables = []
+        kept_units = set()
+        for index, p in properties:
+            self.defined.flat[index] = True
+            evaluator = None
+            if unit is not None:
+                try:
+                    evaluator = p.compile(unit)
+                    self.units.flat[index] = unit
+                except ValueError:
+                    kept_units.add(p.unit)
+            if evaluator is None:
+                evaluator = p.compile()
+                self.units.flat[index] = p.unit
+            if p.value_type == ValueTypes.SCALAR:
+                constant_index.append(index)
+                constant_values.append(evaluator.value)
+            elif p.value_type == ValueTypes.LAURENT_POLYNOMIAL:
+                polynomial_index.append(index)
+                polynomials.append((evaluator.coefficients, evaluator.exponents))
+            else:
+                self.tables.append((index, evaluator))
+
+        if len(kept_units) > 0:
+            print(
+                f"Warning: {name} is kept in {', '.join(sorted(kept_units))}, which can not be converted to {unit}."
+            )
+
+        self.constant_index = np.array(constant_index, dtype=np.int64)
+        self.constant_values = np.array(constant_values, dtype=np.float64)
+        self.polynomial_index = np.array(polynomial_index, dtype=np.int64)
+        terms = max([len(c) for c, e in polynomials], default=0)
+        self.coefficients = np.zeros((len(polynomials), terms))
+        self.exponents = np.zeros((len(polynomials), terms))
+        for i, (coefficients, exponents) in enumerate(polynomials):
+            self.coefficients[i, : len(coefficients)] = coefficients
+            self.exponents[i, : len(exponents)] = exponents
+
+        return
+
+    @property
+    def is_constant(self):
+        return len(self.polynomial_index) == 0 and len(self.tables) == 0
+
+    def evaluate(self, temperatures=None):
+        # Values of shape self.shape + temperatures.shape, nan where the
+        # property is not defined. Without temperatures all values have to
+        # be constants.
+        if temperatures is None:
+            if not self.is_constant:
+                raise ValueError(
+                    f"{self.name} depends on the temperature, pass temperatures."
+                )
+            values = np.full(self.shape, np.nan)
+            values.flat[self.constant_index] = self.constant_values
+            return values
+
+        t = np.asarray(temperatures, dtype=np.float64)
+        x = t.reshape(-1)
+        values = np.full((self.defined.size, x.size), np.nan)
+        values[self.constant_index] = self.constant_values[:, None]
+        if len(self.polynomial_index) > 0:
+            # All polynomials in one pass, (entries, terms, temperatures)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                powers = np.power(x[None, None, :], self.exponents[:, :, None])
+                values[self.polynomial_index] = np.einsum(
+                    "ik,ikt->it", self.coefficients, powers
+                )
+        for index, evaluator in self.tables:
+            values[index] = evaluator(x)
+        return values.reshape(self.shape + t.shape)
+
+
+class PhaseTensors:
+    # Single phase properties of a material as dense arrays with the axes
+    #   "phase"        the phases of the material (self.phases)
+    #   "solute"       the solute elements (self.solutes), for the per solute
+    #                  properties (PER_SOLUTE_PROPERTIES) only
+    #   "temperature"  the temperatures passed to evaluate, if any
+    # Missing values are nan (see defined). The properties are packed once,
+    # after which every property is evaluated for all phases, solutes and
+    # temperatures with a few vectorized operations. The tensors are a
+    # snapshot: create new ones after changing the material.
+    #
+    # unit converts the values, either a unit system for all properties
+    # (e.g. "SI", see mistlib.units) or a dict {property name: unit}. Values
+    # that can not be converted, such as those in composition-relative units
+    # (at.%, wt.%, mol.%, e.g. liquidus slopes), keep their unit, see units().
+    def __init__(self, material, property_names=None, unit=None):
+        if property_names is None:
+            property_names = SinglePhase.property_names
+        self.phases = tuple(material.phase_properties)
+        composition = material.composition or {}
+        self.solutes = tuple(composition.get("solute_elements") or [])
+
+        solute_index = {element: j for j, element in enumerate(self.solutes)}
+        self.properties = {}
+        for name in property_names:
+            per_solute = name in PER_SOLUTE_PROPERTIES
+            if per_solute:
+                axes = ("phase", "solute")
+                shape = (len(self.phases), len(self.solutes))
+            else:
+                axes = ("phase",)
+                shape = (len(self.phases),)
+            entries = []
+            for i, phase in enumerate(material.phase_properties.values()):
+                value = phase.properties.get(name)
+                if value is None:
+                    continue
+                if not per_solute:
+                    entries.append((i, value))
+                    continue
+                for element, p in value.items():
+                    if p is not None and element in solute_index:
+                        entries.append(
+                            (i * len(self.solutes) + solute_index[element], p)
+                        )
+            if len(entries) == 0:
+                continue
+            property_unit = unit.get(name) if isinstance(unit, dict) else unit
+            self.properties[name] = PackedProperty(
+                name, axes, shape, entries, property_unit
+            )
+
+        return
+
+    @property
+    def property_names(self):
+        return list(self.properties)
+
+    def packed(self, property_name):
+        packed = self.properties.get(property_name)
+        if packed is None:
+            raise KeyError(f"No phase has {property_name}.")
+        return packed
+
+    def axes(self, property_name, temperatures=None):
+        # Axis labels of the tensors returned by evaluate
+        axes = self.packed(property_name).axes
+        if temperatures is not None:
+            axes = axes + ("temperature",) * np.ndim(temperatures)
+        return axes
+
+    def defined(self, property_name):
+        # Mask of the phases (and solutes) with a value
+        return self.packed(property_name).defined
+
+    def units(self, property_name):
+        # Unit of every value, None where there is no value
+        return self.packed(property_name).units
+
+    def evaluate(self, property_name, temperatures=None):
+        # Property of every phase (and solute) at the temperatures, of shape
+        # (phases,) or (phases, solutes) followed by the temperatures' shape
+        return self.packed(property_name).evaluate(temperatures)
+
+    def evaluate_all(self, temperatures=None):
+        # Every property, as a dict {property name: tensor}. Without
+        # temperatures only the constant properties are included.
+        return {
+            name: packed.evaluate(temperatures)
+            for name, packed in self.properties.items()
+            if temperatures is not None or packed.is_constant
+        }
+
+    def phase_index(self, phase):
+        return self.phases.index(phase)
+
+    def solute_index(self, solute):
+        return self.solutes.index(solute)
@@ -0,0 +1,256 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+# Opt-in instrumentation of the mistlib hot paths (loading, property
+# evaluation and the writers). For every operation the number of calls, the
+# cumulative wall time and the bytes written to output files are recorded.
+# Collection is off by default, in which case instrumented methods run
+# without any wrapper. It can be switched on with enable(), the
+# profile context manager or by setting MISTLIB_PROFILE=1 in the environment.
+# mistlib.batch merges the statistics of its worker processes.
+#
+# Times are inclusive, so nested operations (e.g. json_blob_to_property inside
+# load_json) are also counted in the enclosing operation.
+
+_enabled = os.environ.get("MISTLIB_PROFILE", "") not in ("", "0")
+_lock = threading.Lock()
+# Operation name -> [calls, seconds, bytes written]
+_stats = {}
+# (class, attribute, function, wrapper) of the instrumented methods
+_methods = []
+
+
+def enable():
+    global _enabled
+    _enabled = True
+    for owner, attribute, function, wrapper in _methods:
+        setattr(owner, attribute, wrapper)
+    return
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    for owner, attribute, function, wrapper in _methods:
+        setattr(owner, attribute, function)
+    return
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+    return
+
+
+def record(name, elapsed, num_bytes=0):
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = [0, 0.0, 0]
+            _stats[name] = entry
+        entry[0] = entry[0] + 1
+        entry[1] = entry[1] + elapsed
+        entry[2] = entry[2] + num_bytes
+    return
+
+
+def merge(stats):
+    # Add statistics returned by get_stats (e.g. from another process)
+    with _lock:
+        for name, s in stats.items():
+            entry = _stats.get(name)
+            if entry is None:
+                entry = [0, 0.0, 0]
+                _stats[name] = entry
+            entry[0] = entry[0] + s["calls"]
+            entry[1] = entry[1] + s["time"]
+            entry[2] = entry[2] + s["bytes"]
+    return
+
+
+def get_stats():
+    # Operation name -> {"calls", "time", "mean_time", "bytes"}
+    with _lock:
+        items = [(name, list(entry)) for name, entry in _stats.items()]
+    stats = {}
+    for name, (calls, elapsed, num_bytes) in sorted(items):
+        stats[name] = {
+            "calls": calls,
+            "time": elapsed,
+            "mean_time": elapsed / calls if calls > 0 else 0.0,
+            "bytes": num_bytes,
+        }
+    return stats
+
+
+def summary():
+    # Text table of the recorded operations, slowest first
+    stats = get_stats()
+    names = sorted(stats.keys(), key=lambda name: -stats[name]["time"])
+    width = max([len("operation")] + [len(name) for name in names])
+    lines = [
+        f"{'operation':<{width}}  {'calls':>10}  {'total [s]':>12}  {'mean [us]':>12}  {'bytes':>12}"
+    ]
+    for name in names:
+        s = stats[name]
+        lines.append(
+            f"{name:<{width}}  {s['calls']:>10}  {s['time']:>12.6f}  {1.0e6 * s['mean_time']:>12.3f}  {s['bytes']:>12}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def dump(file, format="json"):
+    # Write the statistics to a path or an open text stream, as JSON or as the
+    # text summary
+    if format == "json":
+        content = json.dumps(get_stats(), indent=4) + "\n"
+    elif format == "text":
+        content = summary()
+    else:
+        raise ValueError(f"Unknown profiling output format {format}.")
+
+    if hasattr(file, "write"):
+        file.write(content)
+    else:
+        with open(file, "w") as f:
+            f.write(content)
+    return
+
+
+def output_size(files):
+    # Total size of the output file(s). Open streams and missing files count
+    # as zero.
+    if files is None:
+        return 0
+    if isinstance(files, (str, os.PathLike)):
+        files = [files]
+    elif not isinstance(files, (list, tuple)):
+        return 0
+    size = 0
+    for file in files:
+        if isinstance(file, (str, os.PathLike)) and os.path.isfile(file):
+            size = size + os.path.getsize(file)
+    return size
+
+
+def profiled(name, output=None):
+    # Decorator that records the calls of a function under name. output is
+    # the name of the argument holding the output file path, or "return" if
+    # the function returns the path(s) of the files it wrote.
+    def decorator(function):
+        return Instrumented(name, function, output)
+
+    return decorator
+
+
+class Instrumented:
+    # A profiled function. When used as a method the class attribute is
+    # replaced by the plain function and only swapped for the recording
+    # wrapper while profiling is enabled, so disabled profiling adds no
+    # overhead at all. Plain functions always go through the wrapper, which
+    # checks the enabled flag.
+    def __init__(self, name, function, output=None):
+        self.name = name
+        self.function = function
+        self.output = output
+        self.signature = None
+        if output is not None and output != "return":
+            self.signature = inspect.signature(function)
+        self.wrapper = self.make_wrapper()
+        functools.update_wrapper(self, function)
+
+    def make_wrapper(self):
+        name = self.name
+        function = self.function
+        output = self.output
+        signature = self.signature
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            num_bytes = 0
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+                if output == "return":
+                    num_bytes = output_size(result)
+                elif signature is not None:
+                    bound = signature.bind(*args, **kwargs)
+                    bound.apply_defaults()
+                    num_bytes = output_size(bound.arguments[output])
+            finally:
+                record(name, time.perf_counter() - start, num_bytes)
+            return result
+
+        return wrapper
+
+    def __set_name__(self, owner, attribute):
+        _methods.append((owner, attribute, self.function, self.wrapper))
+        setattr(owner, attribute, self.wrapper if _enabled else self.function)
+
+    def __call__(self, *args, **kwargs):
+        return self.wrapper(*args, **kwargs)
+
+
+class timer:
+    # Context manager that records a block of code under name
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if _enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            record(self.name, time.perf_counter() - self.start)
+            self.start = None
+        return False
+
+
+class profile:
+    # Context manager that collects statistics inside a block:
+    #
+    #   with mistlib.profiling.profile() as prof:
+    #       mat = mistlib.core.MaterialInformation("SS316L.json")
+    #       mat.write_adamantine_input("mistinput.info")
+    #   print(prof.summary())
+    #
+    # Previously recorded statistics are cleared first unless reset=False, and
+    # the previous enabled state is restored on exit.
+    def __init__(self, reset=True):
+        self.reset = reset
+        self.was_enabled = None
+
+    def __enter__(self):
+        self.was_enabled = _enabled
+        if self.reset:
+            reset()
+        enable()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.was_enabled:
+            disable()
+        return False
+
+    def get_stats(self):
+        return get_stats()
+
+    def summary(self):
+        return summary()
+
+    def dump(self, file, format="json"):
+        return dump(file, format)
@@ -0,0 +1,352 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from mistlib.core import MaterialInformation, ValueTypes
+from mistlib.library import find_material_files
+
+# Bump when the layout of saved indexes changes so that old files are rebuilt
+INDEX_FORMAT_VERSION = 1
+
+# Temperatures (K) at which temperature-dependent properties are indexed
+REFERENCE_TEMPERATURES = (300.0, 1000.0)
+
+
+class PropertyIndex:
+    # Query index over a directory of material files. Every numeric property
+    # is stored as a column with one value per material (nan if missing), in
+    # SI units where the unit can be parsed (see mistlib.units):
+    #   (name, None)         scalar values
+    #   (name, temperature)  values at each of the reference temperatures,
+    #                        scalars included
+    # Range queries use a binary search on the sorted column of the most
+    # selective predicate, and the other predicates are checked with
+    # vectorized masks on the remaining rows.
+    #
+    # update() re-reads only the files that were added or changed (by
+    # modification time and size) since the last update, and save()/open()
+    # keep the index on disk between runs.
+    def __init__(
+        self,
+        directory,
+        reference_temperatures=REFERENCE_TEMPERATURES,
+        property_names=None,
+        recursive=False,
+        cache=None,
+    ):
+        if property_names is None:
+            property_names = MaterialInformation.thermophysical_property_names
+        self.directory = os.path.abspath(directory)
+        self.reference_temperatures = tuple(float(t) for t in reference_temperatures)
+        self.property_names = tuple(property_names)
+        self.recursive = recursive
+        self.cache = cache
+
+        self.names = []
+        self.files = []
+        self.mtimes = np.zeros(0, dtype=np.int64)
+        self.sizes = np.zeros(0, dtype=np.int64)
+        self.columns = {}
+        # Files that are not materials, file -> (mtime, size)
+        self.skipped = {}
+        # Column key -> (order, sorted values), built on first use
+        self._sorted = {}
+
+        self.update()
+
+        return
+
+    def __len__(self):
+        return len(self.names)
+
+    def material_values(self, material):
+        # Column values of one material
+        values = {}
+        for name in self.property_names:
+            p = material.properties.get(name)
+            if p is None or p.value_type not in (
+                ValueTypes.SCALAR,
+                ValueTypes.LAURENT_POLYNOMIAL,
+                ValueTypes.TABLE,
+            ):
+                continue
+            try:
+                evaluator = p.compile("SI")
+            except ValueError:
+                evaluator = p.compile()
+            if p.value_type == ValueTypes.SCALAR:
+                values[(name, None)] = float(evaluator())
+            for temperature in self.reference_temperatures:
+                values[(name, temperature)] = float(evaluator(temperature))
+        return values
+
+    def load_material(self, file):
+        if self.cache is not None:
+            return self.cache.load(file)
+        with open(file, "r") as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or "name" not in data:
+            raise ValueError("it is not a material file")
+        material = MaterialInformation()
+        material.load_dict(data)
+        return material
+
+    def update(self):
+        # Bring the index up to date with the directory, parsing only new and
+        # changed files. Returns True if anything changed.
+        previous = {file: row for row, file in enumerate(self.files)}
+        kept_rows = []
+        new_values = []
+        entries = []
+        skipped = {}
+        changed = False
+        for file in find_material_files(self.directory, self.recursive):
+            stat = os.stat(file)
+            row = previous.get(file)
+            if (
+                row is not None
+                and self.mtimes[row] == stat.st_mtime_ns
+                and self.sizes[row] == stat.st_size
+            ):
+                entries.append((self.names[row], file, stat, len(kept_rows), None))
+                kept_rows.append(row)
+                continue
+            if self.skipped.get(file) == (stat.st_mtime_ns, stat.st_size):
+                skipped[file] = self.skipped[file]
+                continue
+            changed = True
+            try:
+                material = self.load_material(file)
+            except Exception as e:
+                print(f"Warning: skipping {file} ({e}).")
+                skipped[file] = (stat.st_mtime_ns, stat.st_size)
+                continue
+            entries.append((material.name, file, stat, None, len(new_values)))
+            new_values.append(self.material_values(material))
+        if len(kept_rows) != len(self.files):
+            changed = True
+        self.skipped = skipped
+        if not changed:
+            return False
+
+        # Assemble the new columns from the kept rows and the new values
+        kept_rows = np.array(kept_rows, dtype=np.int64)
+        kept_positions = [i for i, entry in enumerate(entries) if entry[3] is not None]
+        new_positions = [i for i, entry in enumerate(entries) if entry[4] is not None]
+        keys = set(self.columns)
+        for values in new_values:
+            keys.update(values)
+        columns = {}
+        for key in keys:
+            column = np.full(len(entries), np.nan)
+            old = self.columns.get(key)
+            if old is not None:
+                column[kept_positions] = old[kept_rows]
+            column[new_positions] = [values.get(key, np.nan) for values in new_values]
+            if not np.all(np.isnan(column)):
+                columns[key] = column
+
+        self.names = [entry[0] for entry in entries]
+        self.files = [entry[1] for entry in entries]
+        self.mtimes = np.array(
+            [entry[2].st_mtime_ns for entry in entries], dtype=np.int64
+        )
+        self.sizes = np.array([entry[2].st_size for entry in entries], dtype=np.int64)
+        self.columns = columns
+        self._sorted = {}
+        return True
+
+    def column_key(self, property_name, temperature=None):
+        if temperature is None:
+            return (property_name, None)
+        temperature = float(temperature)
+        if temperature not in self.reference_temperatures:
+            raise ValueError(
+                f"Properties are indexed at {self.reference_temperatures} K, not at {temperature} K."
+            )
+        return (property_name, temperature)
+
+    def values(self, property_name, temperature=None):
+        # Column of one value per material, nan where there is none
+        column = self.columns.get(self.column_key(property_name, temperature))
+        if column is None:
+            return np.full(len(self.names), np.nan)
+        return column
+
+    def sorted_column(self, key):
+        entry = self._sorted.get(key)
+        if entry is None:
+            column = self.columns.get(key)
+            if column is None:
+                column = np.zeros(0)
+            # nan sorts last and is left out
+            order = np.argsort(column, kind="stable")
+            order = order[: np.count_nonzero(~np.isnan(column))]
+            entry = (order, column[order])
+            self._sorted[key] = entry
+        return entry
+
+    def bounds(self, key, low, high):
+        order, sorted_values = self.sorted_column(key)
+        start = 0 if low is None else np.searchsorted(sorted_values, low, "left")
+        end = (
+            len(order)
+            if high is None
+            else np.searchsorted(sorted_values, high, "right")
+        )
+        return order, start, max(start, end)
+
+    def select(self, property_name, low=None, high=None, temperature=None):
+        # Rows with low <= value <= high (either bound can be None), in
+        # increasing order of value
+        order, start, end = self.bounds(
+            self.column_key(property_name, temperature), low, high
+        )
+        return order[start:end]
+
+    def query_rows(self, *predicates, **ranges):
+        # Rows matching all predicates, in index order. A predicate is a
+        # tuple (property name, low, high) or (property name, low, high,
+        # temperature), keyword arguments property_name=(low, high) are
+        # shorthand for scalar properties.
+        predicates = [tuple(p) for p in predicates]
+        predicates.extend((name, low, high) for name, (low, high) in ranges.items())
+        if len(predicates) == 0:
+            return np.arange(len(self.names))
+
+        bounded = []
+        for predicate in predicates:
+            name, low, high = predicate[:3]
+            temperature = predicate[3] if len(predicate) > 3 else None
+            key = self.column_key(name, temperature)
+            order, start, end = self.bounds(key, low, high)
+            bounded.append((end - start, key, low, high, order[start:end]))
+        bounded.sort(key=lambda b: b[0])
+
+        rows = bounded[0][4]
+        for count, key, low, high, selected in bounded[1:]:
+            values = self.columns.get(key)
+            if values is None:
+                return np.zeros(0, dtype=np.int64)
+            values = values[rows]
+            mask = ~np.isnan(values)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+            rows = rows[mask]
+        return np.sort(rows)
+
+    def query(self, *predicates, **ranges):
+        # Names of the materials matching all predicates, see query_rows. For
+        # example
+        #   index.query(
+        #       ("liquidus_temperature", 1600.0, 1750.0),
+        #       ("thermal_conductivity_solid", 25.0, None, 1000.0),
+        #   )
+        return [self.names[row] for row in self.query_rows(*predicates, **ranges)]
+
+    def save(self, file):
+        # Write the index to a .npz file (no pickles)
+        keys = list(self.columns)
+        metadata = {
+            "version": INDEX_FORMAT_VERSION,
+            "directory": os.path.abspath(self.directory),
+            "recursive": self.recursive,
+            "reference_temperatures": list(self.reference_temperatures),
+            "property_names": list(self.property_names),
+            "columns": [list(key) for key in keys],
+            "skipped": self.skipped,
+        }
+        arrays = {
+            "metadata": np.array(json.dumps(metadata)),
+            "names": np.array(self.names, dtype=str),
+            "files": np.array(self.files, dtype=str),
+            "mtimes": self.mtimes,
+            "sizes": self.sizes,
+        }
+        for i, key in enumerate(keys):
+            arrays[f"column_{i}"] = self.columns[key]
+
+        # Write to a temporary file and rename it into place so that readers
+        # never see a partial index
+        directory = os.path.dirname(os.path.abspath(file))
+        fd, temp_file = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temp_file, file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+        return
+
+    @classmethod
+    def load(cls, file, cache=None):
+        # Read an index written by save(), without checking the directory
+        with np.load(file, allow_pickle=False) as data:
+            metadata = json.loads(str(data["metadata"]))
+            if metadata.get("version") != INDEX_FORMAT_VERSION:
+                raise ValueError(f"{file} has an unsupported index format.")
+            index = cls.__new__(cls)
+            index.directory = metadata["directory"]
+            index.recursive = metadata["recursive"]
+            index.reference_temperatures = tuple(metadata["reference_temperatures"])
+            index.property_names = tuple(metadata["property_names"])
+            index.cache = cache
+            index.names = data["names"].tolist()
+            index.files = data["files"].tolist()
+            index.mtimes = data["mtimes"]
+            index.sizes = data["sizes"]
+            index.columns = {
+                (key[0], key[1]): data[f"column_{i}"]
+                for i, key in enumerate(metadata["columns"])
+            }
+            index.skipped = {
+                file: tuple(stat) for file, stat in metadata["skipped"].items()
+            }
+            index._sorted = {}
+        return index
+
+    @classmethod
+    def open(
+        cls,
+        directory,
+        file,
+        reference_temperatures=REFERENCE_TEMPERATURES,
+        property_names=None,
+        recursive=False,
+        cache=None,
+    ):
+        # Load the index saved in file and update it, or build it if the file
+        # is missing or was built with other settings. The file is rewritten
+        # if anything changed.
+        if property_names is None:
+            property_names = MaterialInformation.thermophysical_property_names
+        index = None
+        if os.path.exists(file):
+            try:
+                index = cls.load(file, cache)
+            except Exception:
+                index = None
+        if index is not None and (
+            index.directory != os.path.abspath(directory)
+            or index.recursive != recursive
+            or index.reference_temperatures
+            != tuple(float(t) for t in reference_temperatures)
+            or index.property_names != tuple(property_names)
+        ):
+            index = None
+
+        if index is None:
+            index = cls(
+                directory, reference_temperatures, property_names, recursive, cache
+            )
+            index.save(file)
+        elif index.update():
+            index.save(file)
+        return index
@@ -0,0 +1,33 @@
+from mistlib.library import iter_materials
+from mistlib.profiling import profiled
+
+# Size of the write buffer used for combined reports
+REPORT_BUFFER_SIZE = 1 << 20
+
+
+@profiled("write_markdown_report", output="file")
+def write_markdown_report(
+    materials,
+    file,
+    tables=["composition", "properties", "phases"],
+    title="Material Properties",
+    cache=None,
+):
+    # Write a single Markdown datasheet for a set of materials (a
+    # MaterialLibrary, a directory or an iterable of paths and
+    # MaterialInformation objects). Materials are loaded and written one at a
+    # time, and references are numbered once across the whole report.
+    references = {}
+    num_materials = 0
+    with open(file, "w", buffering=REPORT_BUFFER_SIZE) as f:
+        f.write("# " + title + "\n\n")
+
+        material = None
+        for material in iter_materials(materials, cache):
+            material.write_markdown_stream(f, tables, references, level=2)
+            num_materials = num_materials + 1
+
+        if material is not None:
+            f.write("".join(material.markdown_references(references, "##")))
+
+    return num_materials
@@ -0,0 +1,288 @@
+import gzip
+import json
+import os
+import re
+
+from mistlib.library import MaterialRecord, check_file_name, iter_materials
+
+# Size of the write buffer used for bulk JSON output
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Size of the chunks read by the streaming JSON reader
+READ_CHUNK_SIZE = 1 << 20
+
+# Largest JSON value (in characters) the streaming reader buffers. A value
+# that is still incomplete at this size is taken to be malformed, so that an
+# error does not make the reader buffer the rest of the file.
+MAX_RECORD_SIZE = 64 << 20
+
+# Extensions of JSON Lines files (optionally gzip compressed)
+JSONL_EXTENSIONS = (".jsonl", ".jsonl.gz")
+
+# Characters up to the end of the buffer that could continue a JSON number
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*\Z")
+
+# "name" keys of a JSON record, used to skip records before parsing them
+NAME_KEY = re.compile(r'"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def write_json_files(materials, directory, indent=4, cache=None):
+    # Write every material (any of the inputs accepted by
+    # mistlib.library.iter_materials) to <directory>/<name>.json and return
+    # the files written
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for material in iter_materials(materials, cache):
+        file = os.path.join(directory, check_file_name(material.name) + ".json")
+        material.write_json(file, indent)
+        files.append(file)
+    return files
+
+
+def write_jsonl(materials, file, cache=None):
+    # Write many materials to a single JSON Lines file (one compact material
+    # per line) in one buffered pass. file can also be an open text stream.
+    # Returns the number of materials written.
+    if hasattr(file, "write"):
+        return write_jsonl_stream(materials, file, cache)
+    with open(file, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        return write_jsonl_stream(materials, f, cache)
+
+
+def write_jsonl_stream(materials, f, cache=None):
+    num_materials = 0
+    for material in iter_materials(materials, cache):
+        f.write(material.json_string(indent=None))
+        num_materials = num_materials + 1
+    return num_materials
+
+
+def read_jsonl(file):
+    # Yield the materials of a JSON Lines file one at a time
+    return read_materials(file)
+
+
+def open_text(file):
+    # Open a (possibly gzip compressed) text file for reading
+    if file.endswith(".gz"):
+        return gzip.open(file, "rt", encoding="utf-8")
+    return open(file, "r", encoding="utf-8")
+
+
+def is_multi_material_file(file):
+    # True for JSON Lines files and files holding a JSON array, whose
+    # materials are read with read_materials rather than load_json
+    if file.endswith(JSONL_EXTENSIONS):
+        return True
+    if not file.endswith((".json", ".json.gz")) or not os.path.isfile(file):
+        return False
+    with open_text(file) as f:
+        return JSONStream(f, 4096).peek() == "["
+
+
+class JSONStream:
+    # Incremental reader of the values in a JSON text stream. Only the part of
+    # the stream holding the current value is kept in memory, read in chunks
+    # of (at least) chunk_size characters and at most max_record_size.
+    def __init__(self, f, chunk_size=READ_CHUNK_SIZE, max_record_size=MAX_RECORD_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.max_record_size = max_record_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        # Line number at self.counted in the buffer
+        self.line = 1
+        self.counted = 0
+
+        return
+
+    def read_more(self, size):
+        # Drop the consumed part of the buffer and append the next chunk
+        chunk = self.f.read(size)
+        if chunk == "":
+            self.eof = True
+            return False
+        self.line = self.line_at(self.position)
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        self.counted = 0
+        return True
+
+    def line_at(self, position):
+        # Line number of a position in the buffer, at or after self.counted
+        self.line = self.line + self.buffer.count("\n", self.counted, position)
+        self.counted = position
+        return self.line
+
+    def peek(self):
+        # The next character that is not whitespace, "" at the end
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position].isspace()
+            ):
+                self.position = self.position + 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more(self.chunk_size):
+                return ""
+
+    def skip(self):
+        self.position = self.position + 1
+        return
+
+    def value(self):
+        # Decode the next value. Values that do not fit into the buffer are
+        # retried with twice as much input each time, up to max_record_size.
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if len(self.buffer) - self.position >= self.max_record_size:
+                    raise ValueError(
+                        f"Malformed JSON value, or a value longer than {self.max_record_size} characters."
+                    )
+                if not self.read_more(size):
+                    raise
+                size = 2 * size
+                continue
+            # A number followed by nothing but number characters (e.g. "1."
+            # or "1e" of "1.5e3") may go on in the next chunk
+            if (
+                not self.eof
+                and isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                and NUMBER_TAIL.match(self.buffer, end) is not None
+            ):
+                self.read_more(size)
+                continue
+            self.position = end
+            return value
+
+    def values(self):
+        # Yield (line number, value) for the elements of a top level array, or
+        # for every top level value of a sequence of values (a single object,
+        # or JSON Lines)
+        if self.peek() != "[":
+            while self.peek() != "":
+                yield self.line_at(self.position), self.value()
+            return
+        self.skip()
+        while True:
+            c = self.peek()
+            if c == "]":
+                return
+            if c == "":
+                raise ValueError("Unterminated JSON array.")
+            if c == ",":
+                self.skip()
+                continue
+            yield self.line_at(self.position), self.value()
+
+
+def may_be_named(text, names):
+    # False if the record in text is certainly none of the named materials.
+    # Names with escapes are left to the JSON parser.
+    for name in NAME_KEY.findall(text):
+        if name in names or "\\" in name:
+            return True
+    return False
+
+
+def iter_records(file, names=None, chunk_size=READ_CHUNK_SIZE):
+    # Yield the material records of a JSON Lines file, a JSON array file or a
+    # single material file, one at a time as MaterialRecord, optionally gzip
+    # compressed. With names, lines of JSON Lines files that can not be one
+    # of the named materials are skipped without being parsed. Lines that are
+    # not valid JSON give a record with the error. A JSON array can not be
+    # read past an error, so its last record is the error.
+    with open_text(file) as f:
+        if file.endswith(JSONL_EXTENSIONS):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                if names is not None and not may_be_named(line, names):
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    error = f"JSONDecodeError: {e.msg} (column {e.colno})"
+                    yield MaterialRecord(file, line_number, error=error)
+                    continue
+                yield MaterialRecord(file, line_number, record)
+        else:
+            stream = JSONStream(f, chunk_size)
+            try:
+                for line_number, record in stream.values():
+                    yield MaterialRecord(file, line_number, record)
+            except json.JSONDecodeError as e:
+                error = f"JSONDecodeError: {e.msg}"
+                yield MaterialRecord(file, stream.line_at(e.pos), error=error)
+            except ValueError as e:
+                yield MaterialRecord(
+                    file, stream.line_at(stream.position), error=str(e)
+                )
+
+
+def record_matches(record, names=None, base_element=None, solutes=None, where=None):
+    # Filters of read_records, applied to a record before it is loaded.
+    # Records that are not materials always match, so that they are reported.
+    if record.name is None:
+        return True
+    data = record.record
+    if names is not None and data["name"] not in names:
+        return False
+    if base_element is not None or solutes is not None:
+        composition = data.get("composition") or {}
+        if base_element is not None and composition.get("base_element") != base_element:
+            return False
+        if solutes is not None and not set(solutes).issubset(
+            composition.get("solute_elements") or []
+        ):
+            return False
+    if where is not None and not where(data):
+        return False
+    return True
+
+
+def read_records(
+    file,
+    names=None,
+    base_element=None,
+    solutes=None,
+    where=None,
+    chunk_size=READ_CHUNK_SIZE,
+):
+    # Yield the records of a JSON Lines or JSON array file (see iter_records)
+    # that pass the filters, one at a time and with bounded memory:
+    #   names         only these materials
+    #   base_element  only materials with this base element
+    #   solutes       only materials containing all of these solute elements
+    #   where         a function of the raw record (dict) returning True for
+    #                 the materials to keep
+    # The records are loaded by whoever consumes them, so the generator can
+    # be passed to mistlib.batch.export_batch (or validate_batch), which load
+    # them in the workers and report records that fail per item.
+    if names is not None:
+        names = set(names)
+    for record in iter_records(file, names, chunk_size):
+        if record_matches(record, names, base_element, solutes, where):
+            yield record
+
+
+def read_materials(
+    file,
+    names=None,
+    base_element=None,
+    solutes=None,
+    where=None,
+    chunk_size=READ_CHUNK_SIZE,
+):
+    # Yield the materials of a JSON Lines or JSON array file, filtered as by
+    # read_records, as MaterialInformation objects. A record that can not be
+    # loaded raises a ValueError naming its file and line.
+    for record in read_records(file, names, base_element, solutes, where, chunk_size):
+        yield record.load()
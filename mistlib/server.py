@@ -0,0 +1,441 @@
+import argparse
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from mistlib.library import MaterialLibrary
+
+# Largest request body accepted by the server
+MAX_BODY_SIZE = 64 << 20
+
+STATUS_MESSAGES = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+# Endpoints whose work (NumPy evaluation, scanning the directory) runs off the
+# event loop, see PropertyServer.handle_connection
+BLOCKING_PATHS = ("/evaluate", "/reload")
+
+
+class ServerStats:
+    # Request counters and the latencies of the most recent requests
+    def __init__(self, window=10000):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.evaluations = 0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency, status, evaluations=0):
+        self.requests = self.requests + 1
+        if status != 200:
+            self.errors = self.errors + 1
+        self.evaluations = self.evaluations + evaluations
+        self.latencies.append(latency)
+        return
+
+    def to_dict(self):
+        uptime = time.perf_counter() - self.started
+        latency = {}
+        if len(self.latencies) > 0:
+            latencies = np.array(self.latencies)
+            latency = {
+                "mean": float(latencies.mean()),
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "p99": float(np.percentile(latencies, 99)),
+                "max": float(latencies.max()),
+            }
+        return {
+            "uptime": uptime,
+            "requests": self.requests,
+            "errors": self.errors,
+            "evaluations": self.evaluations,
+            "requests_per_second": self.requests / uptime if uptime > 0 else 0.0,
+            "latency": latency,
+        }
+
+
+class PropertyServer:
+    # Serves property values from a MaterialLibrary that stays loaded in
+    # memory, over HTTP on a TCP port or a Unix socket. The endpoints are
+    #
+    #   GET  /health     {"status": "ok"}
+    #   GET  /materials  names of the materials in the library
+    #   GET  /stats      request counts, throughput, latency and cache stats
+    #   POST /evaluate   {"material": ..., "property": ..., "temperatures": ...,
+    #                    "unit": ... (optional)}
+    #                    or {"requests": [{...}, ...]} for a batch
+    #   POST /reload     rescan the library directory
+    #
+    # Evaluation goes through MaterialInformation.get_property, and results
+    # are memoized in a least recently used cache that is invalidated when a
+    # material's Property changes. Connections are handled by one asyncio
+    # event loop, so many clients can be connected at once, while evaluations
+    # and rescans run one at a time on a worker thread so that they do not
+    # block the loop.
+    def __init__(self, materials, cache_size=4096, preload=False):
+        if isinstance(materials, MaterialLibrary):
+            self.library = materials
+        else:
+            self.library = MaterialLibrary(materials, max_loaded=1 << 30)
+        self.cache_size = cache_size
+        self.stats = ServerStats()
+
+        # (material, property, shape, temperatures) -> (Property, version, values)
+        self._results = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        if preload:
+            for name in self.library.names():
+                self.library.load(name)
+
+        self._server = None
+        self._executor = None
+        self._connections = set()
+
+        return
+
+    def evaluate(
+        self, material_name, property_name, temperatures, code_name="server", unit=None
+    ):
+        # Values of one property of one material as a list (or a float for a
+        # single temperature), optionally converted to a unit (see
+        # mistlib.units). Non-finite values are returned as None.
+        if material_name not in self.library:
+            raise KeyError(f"Unknown material {material_name}.")
+        material = self.library.load(material_name)
+        p = material.properties.get(property_name)
+        if p is None:
+            raise KeyError(f"{material_name} has no property {property_name}.")
+
+        t = np.asarray(temperatures, dtype=np.float64)
+        key = (material_name, property_name, unit, t.shape, t.tobytes())
+        entry = self._results.get(key)
+        if entry is not None and entry[0] is p and entry[1] == p._version:
+            self._results.move_to_end(key)
+            self.cache_hits = self.cache_hits + 1
+            return entry[2]
+
+        self.cache_misses = self.cache_misses + 1
+        if t.ndim == 0:
+            values = material.get_property(property_name, code_name, float(t), unit)
+        else:
+            values = material.get_property(property_name, code_name, t, unit)
+        if values is None:
+            raise ValueError(
+                f"{property_name} of {material_name} can not be evaluated."
+            )
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 0:
+            result = float(values) if np.isfinite(values) else None
+        elif np.all(np.isfinite(values)):
+            result = values.tolist()
+        else:
+            result = np.where(np.isfinite(values), values, None).tolist()
+
+        self._results[key] = (p, p._version, result)
+        if len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+        return result
+
+    def evaluate_request(self, request):
+        # One item of a batch, errors are reported per item
+        try:
+            values = self.evaluate(
+                request["material"],
+                request["property"],
+                request["temperatures"],
+                request.get("code", "server"),
+                request.get("unit"),
+            )
+            return {"values": values}
+        except (KeyError, TypeError, ValueError) as e:
+            message = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+            return {"error": f"{type(e).__name__}: {message}"}
+
+    def handle(self, method, path, body):
+        # Returns (status, response object, number of evaluations)
+        if path == "/health":
+            return 200, {"status": "ok"}, 0
+        if path == "/materials":
+            return 200, {"materials": self.library.names()}, 0
+        if path == "/stats":
+            stats = self.stats.to_dict()
+            stats["cache"] = {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "size": len(self._results),
+            }
+            stats["materials_loaded"] = self.library.num_loaded()
+            return 200, stats, 0
+        if path == "/reload":
+            if method != "POST":
+                return 405, {"error": "Use POST for /reload."}, 0
+            self.library.scan()
+            self._results.clear()
+            return 200, {"materials": len(self.library)}, 0
+        if path == "/evaluate":
+            if method != "POST":
+                return 405, {"error": "Use POST for /evaluate."}, 0
+            try:
+                data = json.loads(body)
+            except ValueError as e:
+                return 400, {"error": f"Invalid JSON: {e}"}, 0
+            if not isinstance(data, dict):
+                return 400, {"error": "Expected a JSON object."}, 0
+            if "requests" in data:
+                results = [self.evaluate_request(r) for r in data["requests"]]
+                return 200, {"results": results}, len(results)
+            result = self.evaluate_request(data)
+            status = 200 if "values" in result else 400
+            return status, result, 1
+        return 404, {"error": f"Unknown path {path}."}, 0
+
+    async def handle_connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.perf_counter()
+                parts = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                length = int(headers.get("content-length", "0") or 0)
+                if len(parts) != 3:
+                    status, response, evaluations = 400, {"error": "Bad request."}, 0
+                    keep_alive = False
+                elif length > MAX_BODY_SIZE:
+                    status, response, evaluations = 413, {"error": "Too large."}, 0
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length > 0 else b""
+                    method, target, version = parts
+                    keep_alive = keep_alive and version == "HTTP/1.1"
+                    path = target.split("?")[0]
+                    try:
+                        if path in BLOCKING_PATHS:
+                            loop = asyncio.get_running_loop()
+                            result = await loop.run_in_executor(
+                                self._executor, self.handle, method, path, body
+                            )
+                        else:
+                            result = self.handle(method, path, body)
+                        status, response, evaluations = result
+                    except Exception as e:
+                        status, evaluations = 500, 0
+                        response = {"error": f"{type(e).__name__}: {e}"}
+
+                content = json.dumps(response).encode("utf-8")
+                header = (
+                    f"HTTP/1.1 {status} {STATUS_MESSAGES[status]}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    "\r\n"
+                ).encode("latin-1")
+                writer.write(header + content)
+                await writer.drain()
+                self.stats.record(time.perf_counter() - start, status, evaluations)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Cancelled by stop(), the connection ends with the server
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+        return
+
+    async def start(self, host="127.0.0.1", port=8765, unix_socket=None):
+        # The library and the result cache are not thread safe, so the
+        # blocking work runs on a single worker thread
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        if unix_socket is not None:
+            self._server = await asyncio.start_unix_server(
+                self.handle_connection, path=unix_socket
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self.handle_connection, host, port
+            )
+        return self._server
+
+    async def stop(self):
+        # Stop listening, cancel the open connections and wait for them, then
+        # for the work already handed to the worker thread
+        if self._server is not None:
+            self._server.close()
+        connections = list(self._connections)
+        for task in connections:
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return
+
+    def address(self):
+        # (host, port) of a TCP server, or the socket path
+        return self._server.sockets[0].getsockname()
+
+    async def serve_forever(self, host="127.0.0.1", port=8765, unix_socket=None):
+        server = await self.start(host, port, unix_socket)
+        try:
+            await server.serve_forever()
+        finally:
+            await self.stop()
+
+
+class ServerThread:
+    # Runs a PropertyServer on its own event loop in a background thread, for
+    # tests, load tests and embedding in other programs. port=0 picks a free
+    # port, see address().
+    def __init__(self, server, host="127.0.0.1", port=0, unix_socket=None):
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._error = None
+        self.thread = threading.Thread(
+            target=self._run, args=(host, port, unix_socket), daemon=True
+        )
+        self.thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+        return
+
+    def _run(self, host, port, unix_socket):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.server.start(host, port, unix_socket))
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    def address(self):
+        return self.server.address()
+
+    def stop(self):
+        # Shut the server down on its loop before stopping the loop, so that
+        # no connection handler is left pending
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        return
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30.0):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class PropertyClient:
+    # Blocking client for a PropertyServer, keeping one connection open
+    def __init__(self, host="127.0.0.1", port=8765, unix_socket=None, timeout=30.0):
+        if unix_socket is not None:
+            self.connection = UnixHTTPConnection(unix_socket, timeout)
+        else:
+            self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+        return
+
+    def request(self, method, path, data=None):
+        body = None if data is None else json.dumps(data)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        result = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(result.get("error", f"HTTP {response.status}"))
+        return result
+
+    def evaluate(self, material, property, temperatures, unit=None):
+        data = {"material": material, "property": property}
+        data["temperatures"] = np.asarray(temperatures, dtype=np.float64).tolist()
+        if unit is not None:
+            data["unit"] = unit
+        return self.request("POST", "/evaluate", data)["values"]
+
+    def evaluate_batch(self, requests):
+        # requests is a list of {"material", "property", "temperatures"}. Each
+        # result is {"values": ...} or {"error": ...}.
+        return self.request("POST", "/evaluate", {"requests": requests})["results"]
+
+    def materials(self):
+        return self.request("GET", "/materials")["materials"]
+
+    def stats(self):
+        return self.request("GET", "/stats")
+
+    def close(self):
+        self.connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m mistlib serve",
+        description="Serve property values of a directory of materials over HTTP.",
+    )
+    parser.add_argument("directory", help="Directory of material JSON files")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument(
+        "--unix-socket", default=None, help="Listen on a Unix socket instead"
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=4096, help="Number of cached results"
+    )
+    parser.add_argument(
+        "--preload", action="store_true", help="Load all materials at start up"
+    )
+    args = parser.parse_args(argv)
+
+    server = PropertyServer(args.directory, args.cache_size, args.preload)
+    where = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"Serving {len(server.library)} materials on {where}")
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,179 @@
+import numpy as np
+
+from mistlib.core import MaterialInformation, ValueTypes
+from mistlib.library import iter_materials
+from mistlib.units import conversion
+
+
+class CoefficientStore:
+    # Columnar storage of the numeric property values of many materials. For
+    # every property name the Laurent polynomial terms of all materials are
+    # kept in two flat float64 arrays (coefficients and exponents) with
+    # per-material offsets, scalars being stored as a constant term. A
+    # property can then be evaluated for every material in one vectorized
+    # pass, and a long-running process can keep the store (a few arrays per
+    # property) instead of the full MaterialInformation objects.
+    #
+    # Tabulated properties are kept as Property objects and evaluated one by
+    # one. Materials without a property evaluate to nan. Values are in the
+    # unit of each material's property unless a unit (or unit system, see
+    # mistlib.units) is requested.
+    def __init__(self, materials, property_names=None, cache=None):
+        if property_names is None:
+            property_names = MaterialInformation.thermophysical_property_names
+        self.property_names = tuple(property_names)
+        self.names = []
+
+        coefficients = {p: [] for p in self.property_names}
+        exponents = {p: [] for p in self.property_names}
+        counts = {p: [] for p in self.property_names}
+        # Distinct units of each property and the code of every material's
+        # unit in that list (-1 if the material has no value)
+        self.units = {p: [] for p in self.property_names}
+        unit_codes = {p: [] for p in self.property_names}
+        self.tables = {p: {} for p in self.property_names}
+
+        for row, material in enumerate(iter_materials(materials, cache)):
+            self.names.append(material.name)
+            for p in self.property_names:
+                prop = material.properties.get(p)
+                count = 0
+                if prop is None:
+                    pass
+                elif prop.value_type == ValueTypes.SCALAR:
+                    coefficients[p].append(float(prop.value))
+                    exponents[p].append(0.0)
+                    count = 1
+                elif prop.value_type == ValueTypes.LAURENT_POLYNOMIAL:
+                    coefficients[p].extend(prop._laurent_coefficients)
+                    exponents[p].extend(prop._laurent_exponents)
+                    count = len(prop._laurent_coefficients)
+                elif prop.value_type == ValueTypes.TABLE:
+                    self.tables[p][row] = prop
+                counts[p].append(count)
+                code = -1
+                if prop is not None:
+                    if prop.unit not in self.units[p]:
+                        self.units[p].append(prop.unit)
+                    code = self.units[p].index(prop.unit)
+                unit_codes[p].append(code)
+
+        self.index = {name: row for row, name in enumerate(self.names)}
+
+        # (property name, unit) -> per-material conversion scales and offsets
+        self._conversions = {}
+
+        # Property name -> (coefficients, exponents, offsets, row of each term)
+        self.columns = {}
+        self.unit_codes = {}
+        for p in self.property_names:
+            self.unit_codes[p] = np.array(unit_codes[p], dtype=np.int16)
+            offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+            np.cumsum(counts[p], out=offsets[1:])
+            self.columns[p] = (
+                np.array(coefficients[p], dtype=np.float64),
+                np.array(exponents[p], dtype=np.float64),
+                offsets,
+                np.repeat(np.arange(len(self.names)), np.diff(offsets)),
+            )
+
+        return
+
+    def __len__(self):
+        return len(self.names)
+
+    def nbytes(self):
+        # Memory used by the numeric arrays
+        return sum(
+            sum(array.nbytes for array in column) for column in self.columns.values()
+        )
+
+    def defined(self, property_name):
+        # Boolean mask of the materials that have a value for the property
+        coefficients, exponents, offsets, rows = self.columns[property_name]
+        mask = np.diff(offsets) > 0
+        for row in self.tables[property_name]:
+            mask[row] = True
+        return mask
+
+    def unit_conversion(self, property_name, unit):
+        # Per-material (scale, offset) arrays converting to unit
+        key = (property_name, unit)
+        arrays = self._conversions.get(key)
+        if arrays is None:
+            # One plan per distinct unit, the last entry is for missing values
+            plans = [conversion(u, unit) for u in self.units[property_name]]
+            scale = np.array([plan.scale for plan in plans] + [1.0])
+            offset = np.array([plan.offset for plan in plans] + [0.0])
+            codes = self.unit_codes[property_name]
+            arrays = (scale[codes], offset[codes])
+            self._conversions[key] = arrays
+        return arrays
+
+    def evaluate(self, property_name, dependent_variable_value, unit=None):
+        # Evaluate a property for every material. A scalar gives an array with
+        # one value per material, an array of n values a (materials, n) array.
+        coefficients, exponents, offsets, rows = self.columns[property_name]
+        x = np.asarray(dependent_variable_value, dtype=np.float64)
+        scalar = x.ndim == 0
+        x = x.reshape(-1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            terms = coefficients[:, None] * np.power(x[None, :], exponents[:, None])
+        result = np.full((len(self.names), len(x)), np.nan)
+        has_terms = np.diff(offsets) > 0
+        if np.any(has_terms):
+            result[has_terms] = np.add.reduceat(terms, offsets[:-1][has_terms], axis=0)
+        if unit is not None:
+            scale, offset = self.unit_conversion(property_name, unit)
+            result = result * scale[:, None] + offset[:, None]
+        for row, prop in self.tables[property_name].items():
+            result[row] = prop.compile(unit)(x)
+
+        if scalar:
+            return result[:, 0]
+        return result
+
+    def evaluate_at(self, property_name, dependent_variable_values, unit=None):
+        # Evaluate a property for every material, each at its own value of the
+        # dependent variable (e.g. each material's solidus temperature)
+        coefficients, exponents, offsets, rows = self.columns[property_name]
+        x = np.asarray(dependent_variable_values, dtype=np.float64)
+        assert x.shape == (len(self.names),)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            terms = coefficients * np.power(x[rows], exponents)
+        result = np.bincount(rows, weights=terms, minlength=len(self.names))
+        result[np.diff(offsets) == 0] = np.nan
+        if unit is not None:
+            scale, offset = self.unit_conversion(property_name, unit)
+            result = result * scale + offset
+        for row, prop in self.tables[property_name].items():
+            result[row] = prop.compile(unit)(x[row])
+        return result
+
+    def get(self, name, property_name, dependent_variable_value, unit=None):
+        # Value of one property of one material
+        row = self.index[name]
+        prop = self.tables[property_name].get(row)
+        if prop is not None:
+            return prop.compile(unit)(dependent_variable_value)
+        coefficients, exponents, offsets, rows = self.columns[property_name]
+        start = offsets[row]
+        end = offsets[row + 1]
+        if start == end:
+            return None
+        x = np.asarray(dependent_variable_value, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = np.sum(
+                coefficients[start:end, None]
+                * np.power(x.reshape(1, -1), exponents[start:end, None]),
+                axis=0,
+            ).reshape(x.shape)
+        if unit is not None:
+            code = self.unit_codes[property_name][row]
+            plan = conversion(self.units[property_name][code], unit)
+            result = result * plan.scale + plan.offset
+        if result.ndim == 0:
+            return float(result)
+        return result
@@ -0,0 +1,272 @@
+import csv
+import os
+
+import numpy as np
+
+from mistlib import batch
+from mistlib.core import MaterialInformation, ValueTypes
+
+
+def parse_uncertainty(uncertainty):
+    # Parse the uncertainty field of a Property, one standard deviation given
+    # as
+    #   "5%"           relative to the value
+    #   0.5 or "0.5"   absolute, in the unit of the property
+    #   [0.5, 1e-3]    absolute, per coefficient of a Laurent polynomial
+    # Returns (kind, sigma) with kind "relative", "absolute" or
+    # "coefficients", or None if the value is certain.
+    if uncertainty is None:
+        return None
+    if isinstance(uncertainty, (list, tuple)):
+        return "coefficients", [float(sigma) for sigma in uncertainty]
+    if isinstance(uncertainty, str):
+        text = uncertainty.strip()
+        if text in ("", "None"):
+            return None
+        if text.endswith("%"):
+            return "relative", float(text[:-1]) / 100.0
+        return "absolute", float(text)
+    return "absolute", float(uncertainty)
+
+
+class Ensemble:
+    # Monte Carlo realizations of one material. Every uncertain property
+    # (from the uncertainty fields of the material, or the uncertainties
+    # argument, which takes precedence) contributes one standard normal
+    # variable, or one per coefficient for per-coefficient uncertainties.
+    # All variables are drawn at once as a (num_samples, num_variables)
+    # array, optionally correlated through a correlation matrix (Cholesky
+    # factor) and reproducible with a seed.
+    #
+    # A realization of a property is stored as
+    #   value = factor * nominal(T) + offset + sum_j delta_j * T**exponent_j
+    # with one factor and offset per sample (relative and absolute
+    # uncertainties) and coefficient deltas for per-coefficient
+    # uncertainties, so the whole ensemble is evaluated with a few vectorized
+    # operations on top of the nominal property.
+    def __init__(
+        self, material, num_samples, uncertainties=None, correlation=None, seed=None
+    ):
+        if uncertainties is None:
+            uncertainties = {}
+        self.material = material
+        self.num_samples = num_samples
+        self.seed = seed
+
+        # Uncertain properties and the columns of their variables
+        self.variables = []
+        specs = {}
+        for name, p in material.properties.items():
+            uncertainty = uncertainties.get(name, p.uncertainty)
+            try:
+                spec = parse_uncertainty(uncertainty)
+            except ValueError:
+                print(f"Warning: ignoring uncertainty {uncertainty} of {name}.")
+                spec = None
+            if spec is None:
+                continue
+            if p.value_type not in (
+                ValueTypes.SCALAR,
+                ValueTypes.LAURENT_POLYNOMIAL,
+                ValueTypes.TABLE,
+            ):
+                print(f"Warning: {name} has no numeric value, ignoring uncertainty.")
+                continue
+            kind, sigma = spec
+            if kind == "coefficients":
+                if p.value_type != ValueTypes.LAURENT_POLYNOMIAL:
+                    raise ValueError(
+                        f"Per coefficient uncertainties need a Laurent polynomial, {name} is {p.value_type.name}."
+                    )
+                if len(sigma) != len(p._laurent_coefficients):
+                    raise ValueError(
+                        f"{name} has {len(p._laurent_coefficients)} coefficients but {len(sigma)} uncertainties."
+                    )
+                columns = list(
+                    range(len(self.variables), len(self.variables) + len(sigma))
+                )
+                self.variables.extend(f"{name}[{j}]" for j in range(len(sigma)))
+            else:
+                columns = [len(self.variables)]
+                self.variables.append(name)
+            specs[name] = (kind, sigma, columns)
+
+        # Correlated standard normal samples
+        rng = np.random.default_rng(seed)
+        self.samples = rng.standard_normal((num_samples, len(self.variables)))
+        if correlation is not None and len(self.variables) > 0:
+            matrix = self.correlation_matrix(correlation)
+            try:
+                cholesky = np.linalg.cholesky(matrix)
+            except np.linalg.LinAlgError:
+                raise ValueError("The correlation matrix is not positive definite.")
+            self.samples = self.samples @ cholesky.T
+
+        # Property name -> (factor, offset, deltas, exponents)
+        self.perturbations = {}
+        for name, (kind, sigma, columns) in specs.items():
+            p = material.properties[name]
+            z = self.samples[:, columns]
+            factor = np.ones(num_samples)
+            offset = np.zeros(num_samples)
+            deltas = None
+            exponents = None
+            if kind == "relative":
+                factor = 1.0 + sigma * z[:, 0]
+            elif kind == "absolute":
+                offset = sigma * z[:, 0]
+            else:
+                deltas = z * np.array(sigma)
+                exponents = np.array(p._laurent_exponents, dtype=np.float64)
+            self.perturbations[name] = (factor, offset, deltas, exponents)
+
+        return
+
+    def correlation_matrix(self, correlation):
+        # correlation is a square matrix over self.variables, or a dict
+        # {(variable, variable): coefficient} for the correlated pairs
+        if isinstance(correlation, dict):
+            matrix = np.eye(len(self.variables))
+            index = {name: i for i, name in enumerate(self.variables)}
+            for (a, b), rho in correlation.items():
+                if a not in index or b not in index:
+                    raise ValueError(f"{a} and {b} are not both uncertain.")
+                matrix[index[a], index[b]] = rho
+                matrix[index[b], index[a]] = rho
+            return matrix
+        matrix = np.asarray(correlation, dtype=np.float64)
+        assert matrix.shape == (len(self.variables), len(self.variables))
+        return matrix
+
+    def __len__(self):
+        return self.num_samples
+
+    def evaluate(self, property_name, dependent_variable_value):
+        # Property of every sample at the same dependent variable value(s): a
+        # (num_samples,) array for a scalar, (num_samples, n) for n values
+        p = self.material.properties[property_name]
+        x = np.asarray(dependent_variable_value, dtype=np.float64)
+        scalar = x.ndim == 0
+        x = x.reshape(-1)
+        nominal = np.broadcast_to(np.asarray(p.compile()(x), dtype=np.float64), x.shape)
+
+        perturbation = self.perturbations.get(property_name)
+        if perturbation is None:
+            result = np.tile(nominal, (self.num_samples, 1))
+        else:
+            factor, offset, deltas, exponents = perturbation
+            result = factor[:, None] * nominal[None, :] + offset[:, None]
+            if deltas is not None:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    result = result + deltas @ np.power(x[None, :], exponents[:, None])
+
+        if scalar:
+            return result[:, 0]
+        return result
+
+    def evaluate_at(self, property_name, dependent_variable_values):
+        # Property of every sample, each at its own dependent variable value
+        # (e.g. each sample's solidus temperature)
+        p = self.material.properties[property_name]
+        x = np.asarray(dependent_variable_values, dtype=np.float64)
+        assert x.shape == (self.num_samples,)
+        nominal = np.broadcast_to(np.asarray(p.compile()(x), dtype=np.float64), x.shape)
+
+        perturbation = self.perturbations.get(property_name)
+        if perturbation is None:
+            return np.array(nominal)
+        factor, offset, deltas, exponents = perturbation
+        result = factor * nominal + offset
+        if deltas is not None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                result = result + np.sum(
+                    deltas * np.power(x[:, None], exponents[None, :]), axis=1
+                )
+        return result
+
+    def scalar(self, property_name):
+        # Samples of a SCALAR property. The value of a certain property is
+        # repeated as is, so that it is formatted as in the nominal decks.
+        p = self.material.properties[property_name]
+        assert p.value_type == ValueTypes.SCALAR
+        if property_name not in self.perturbations:
+            return [p.value] * self.num_samples
+        return self.evaluate(property_name, 0.0)
+
+    def coefficients(self, property_name):
+        # Laurent polynomial coefficients of every sample, (num_samples, terms)
+        p = self.material.properties[property_name]
+        assert p.value_type == ValueTypes.LAURENT_POLYNOMIAL
+        coefficients = np.tile(
+            np.array(p._laurent_coefficients, dtype=np.float64), (self.num_samples, 1)
+        )
+        perturbation = self.perturbations.get(property_name)
+        if perturbation is None:
+            return coefficients
+        factor, offset, deltas, exponents = perturbation
+        coefficients = coefficients * factor[:, None]
+        if deltas is not None:
+            coefficients = coefficients + deltas
+        constant = [j for j, e in enumerate(p._laurent_exponents) if e == 0]
+        if len(constant) > 0:
+            coefficients[:, constant[0]] += offset
+        elif np.any(offset != 0.0):
+            coefficients = np.column_stack([coefficients, offset])
+        return coefficients
+
+    def solver_inputs(self, target, initial_temperature=None):
+        # Columns of solver inputs for the decks of a target
+        return batch.deck_inputs(self, target, initial_temperature)
+
+    def write_decks(
+        self, directory, target, workers=None, initial_temperature=None, chunk_size=256
+    ):
+        # Write <directory>/sample_<i>/<deck file> for every sample, plus
+        # <directory>/samples.csv with the sampled variables and solver inputs
+        # of each deck. Returns the deck files.
+        inputs = self.solver_inputs(target, initial_temperature)
+        files = [
+            os.path.join(directory, f"sample_{i:05d}", batch.DECK_FILES[target])
+            for i in range(self.num_samples)
+        ]
+        batch.write_decks(target, files, inputs, workers, chunk_size)
+        self.write_samples(os.path.join(directory, "samples.csv"), inputs)
+        return files
+
+    def write_samples(self, file, inputs=None):
+        # CSV table of the standard normal variables (and optionally solver
+        # inputs) of every sample
+        if inputs is None:
+            inputs = {}
+        with open(file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["sample"] + self.variables + list(inputs))
+            columns = [self.samples[:, j] for j in range(len(self.variables))]
+            columns = columns + [np.asarray(values) for values in inputs.values()]
+            for i in range(self.num_samples):
+                writer.writerow([i] + [column[i] for column in columns])
+        return
+
+    def realization(self, i):
+        # Sample i as a MaterialInformation, for writers without a columnar
+        # path (e.g. AdditiveFOAM or the datasheets)
+        material = MaterialInformation()
+        material.load_dict(self.material.to_dict())
+        material.name = f"{self.material.name}_{i:05d}"
+        for name, (factor, offset, deltas, exponents) in self.perturbations.items():
+            p = material.properties[name]
+            if p.value_type == ValueTypes.SCALAR:
+                p.value = float(factor[i] * p.value + offset[i])
+            elif p.value_type == ValueTypes.LAURENT_POLYNOMIAL:
+                coefficients = self.coefficients(name)[i]
+                terms = [list(term) for term in p.value_laurent_poly]
+                for j in range(len(terms)):
+                    terms[j][0] = float(coefficients[j])
+                if len(coefficients) > len(terms):
+                    terms.append([float(coefficients[-1]), 0])
+                p.value_laurent_poly = terms
+            else:
+                p.value_table = [
+                    [x, float(factor[i] * y + offset[i])] for x, y in p.value_table
+                ]
+        return material
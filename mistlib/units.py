@@ -0,0 +1,327 @@
+import math
+import re
+from functools import lru_cache
+
+# Base dimensions of the SI
+DIMENSIONS = ("m", "kg", "s", "K", "mol", "A", "cd")
+
+
+def dimension(**powers):
+    return tuple(float(powers.get(d, 0)) for d in DIMENSIONS)
+
+
+DIMENSIONLESS = dimension()
+
+# Unit name -> (factor to the coherent SI unit, dimension). The temperature
+# scales with an offset are listed in TEMPERATURE_OFFSETS. "C" is taken to be
+# degrees Celsius (not coulomb) as it is the common use in material data.
+UNITS = {
+    "m": (1.0, dimension(m=1)),
+    "g": (1e-3, dimension(kg=1)),
+    "s": (1.0, dimension(s=1)),
+    "K": (1.0, dimension(K=1)),
+    "mol": (1.0, dimension(mol=1)),
+    "A": (1.0, dimension(A=1)),
+    "cd": (1.0, dimension(cd=1)),
+    "min": (60.0, dimension(s=1)),
+    "h": (3600.0, dimension(s=1)),
+    "Hz": (1.0, dimension(s=-1)),
+    "N": (1.0, dimension(kg=1, m=1, s=-2)),
+    "Pa": (1.0, dimension(kg=1, m=-1, s=-2)),
+    "bar": (1e5, dimension(kg=1, m=-1, s=-2)),
+    "atm": (101325.0, dimension(kg=1, m=-1, s=-2)),
+    "J": (1.0, dimension(kg=1, m=2, s=-2)),
+    "cal": (4.184, dimension(kg=1, m=2, s=-2)),
+    "eV": (1.602176634e-19, dimension(kg=1, m=2, s=-2)),
+    "W": (1.0, dimension(kg=1, m=2, s=-3)),
+    "L": (1e-3, dimension(m=3)),
+    "degC": (1.0, dimension(K=1)),
+    "°C": (1.0, dimension(K=1)),
+    "C": (1.0, dimension(K=1)),
+    "degF": (5.0 / 9.0, dimension(K=1)),
+    "°F": (5.0 / 9.0, dimension(K=1)),
+    "F": (5.0 / 9.0, dimension(K=1)),
+    "None": (1.0, DIMENSIONLESS),
+    "%": (1e-2, DIMENSIONLESS),
+    "at.%": (1e-2, DIMENSIONLESS),
+    "wt.%": (1e-2, DIMENSIONLESS),
+    "mol.%": (1e-2, DIMENSIONLESS),
+    "ppm": (1e-6, DIMENSIONLESS),
+    "rad": (1.0, DIMENSIONLESS),
+    "deg": (math.pi / 180.0, DIMENSIONLESS),
+    "degrees": (math.pi / 180.0, DIMENSIONLESS),
+    "°": (math.pi / 180.0, DIMENSIONLESS),
+}
+
+# Offsets (in kelvin) of the temperature scales, applied only when a unit is
+# a plain temperature. In compound units (J/(kg~degC)) they are differences.
+TEMPERATURE_OFFSETS = {
+    "degC": 273.15,
+    "°C": 273.15,
+    "C": 273.15,
+    "degF": 273.15 - 32.0 * 5.0 / 9.0,
+    "°F": 273.15 - 32.0 * 5.0 / 9.0,
+    "F": 273.15 - 32.0 * 5.0 / 9.0,
+}
+
+# Composition-relative units, see conversion
+CONTENT_UNITS = ("at.%", "wt.%", "mol.%")
+
+PREFIXES = {
+    "G": 1e9,
+    "M": 1e6,
+    "k": 1e3,
+    "c": 1e-2,
+    "m": 1e-3,
+    "u": 1e-6,
+    "µ": 1e-6,
+    "n": 1e-9,
+    "p": 1e-12,
+}
+
+# Unit systems, as the size of the unit of each base dimension in SI units
+UNIT_SYSTEMS = {
+    "SI": dict.fromkeys(DIMENSIONS, 1.0),
+    "CGS": dict(dict.fromkeys(DIMENSIONS, 1.0), m=1e-2, kg=1e-3),
+}
+
+TOKEN = re.compile(
+    r"\s*(?:(?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)"
+    r"|(?P<name>(?:at|wt|mol)\.%|[A-Za-zµ°]+|%)"
+    r"|(?P<operator>[*/^()·~-]))"
+)
+
+
+class Unit:
+    # A parsed unit: value in SI = factor * value + offset
+    __slots__ = ("factor", "dimension", "offset")
+
+    def __init__(self, factor, dimension, offset=0.0):
+        self.factor = factor
+        self.dimension = dimension
+        self.offset = offset
+
+    def __mul__(self, other):
+        return Unit(
+            self.factor * other.factor,
+            tuple(a + b for a, b in zip(self.dimension, other.dimension)),
+        )
+
+    def __truediv__(self, other):
+        return Unit(
+            self.factor / other.factor,
+            tuple(a - b for a, b in zip(self.dimension, other.dimension)),
+        )
+
+    def __pow__(self, power):
+        return Unit(
+            self.factor**power, tuple(round(a * power, 9) for a in self.dimension)
+        )
+
+    def __repr__(self):
+        powers = [f"{d}^{p:g}" for d, p in zip(DIMENSIONS, self.dimension) if p != 0]
+        return (
+            f"Unit({self.factor:g} {' '.join(powers) or '1'}, offset={self.offset:g})"
+        )
+
+
+class UnitParser:
+    # Recursive descent parser for mist unit strings, e.g. "kg/m^3",
+    # "J/(kg~K)", "Pa/sqrt(m)" or "K\~at.\~%". "~" (a LaTeX space), "*", "·"
+    # and juxtaposition multiply, "/" divides the next factor.
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []
+        position = 0
+        while position < len(text):
+            match = TOKEN.match(text, position)
+            if match is None or match.end() == position:
+                if text[position:].strip() == "":
+                    break
+                raise ValueError(f"Can not parse unit {text!r} at {text[position:]!r}.")
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind)))
+            position = match.end()
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position = self.position + 1
+        return token
+
+    def expect(self, value):
+        kind, token = self.next()
+        if token != value:
+            raise ValueError(f"Expected {value!r} in unit {self.text!r}.")
+
+    def parse(self):
+        unit = self.product()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected {self.peek()[1]!r} in unit {self.text!r}.")
+        return unit
+
+    def product(self):
+        unit = self.power()
+        while True:
+            kind, token = self.peek()
+            if token in ("*", "·", "~"):
+                self.next()
+                unit = unit * self.power()
+            elif token == "/":
+                self.next()
+                unit = unit / self.power()
+            elif kind in ("name", "number") or token == "(":
+                unit = unit * self.power()
+            else:
+                return unit
+
+    def power(self):
+        unit = self.atom()
+        if self.peek()[1] == "^":
+            self.next()
+            unit = unit ** self.exponent()
+        return unit
+
+    def exponent(self):
+        kind, token = self.next()
+        sign = 1.0
+        if token == "-":
+            sign = -1.0
+            kind, token = self.next()
+        if kind == "number":
+            return sign * float(token)
+        if token == "(":
+            numerator = self.exponent()
+            if self.peek()[1] == "/":
+                self.next()
+                numerator = numerator / self.exponent()
+            self.expect(")")
+            return sign * numerator
+        raise ValueError(f"Invalid exponent in unit {self.text!r}.")
+
+    def atom(self):
+        kind, token = self.next()
+        if kind == "number":
+            return Unit(float(token), DIMENSIONLESS)
+        if token == "(":
+            unit = self.product()
+            self.expect(")")
+            return unit
+        if kind == "name":
+            if token == "sqrt" and self.peek()[1] == "(":
+                self.next()
+                unit = self.product()
+                self.expect(")")
+                return unit**0.5
+            return lookup_unit(token)
+        raise ValueError(f"Unexpected {token!r} in unit {self.text!r}.")
+
+
+def lookup_unit(name):
+    # A temperature scale keeps its offset only as long as it is not combined
+    # with other units (see Unit.__mul__)
+    if name in UNITS:
+        factor, dimension = UNITS[name]
+        return Unit(factor, dimension, TEMPERATURE_OFFSETS.get(name, 0.0))
+    if len(name) > 1 and name[0] in PREFIXES and name[1:] in UNITS:
+        factor, dimension = UNITS[name[1:]]
+        return Unit(PREFIXES[name[0]] * factor, dimension)
+    raise ValueError(f"Unknown unit {name}.")
+
+
+def normalize_unit_string(text):
+    # Remove LaTeX escapes and the spaces mist files put in "at. %"
+    text = text.replace("\\", "").strip()
+    return re.sub(r"\b(at|wt|mol)\.\s*~?\s*%", r"\1.%", text)
+
+
+def is_composition_unit(text):
+    # True for units relative to the composition (at.%, wt.%, mol.%). mist
+    # files write e.g. liquidus slopes as "K\~at.\~%" (kelvin per at.%), which
+    # would parse as a product, so such units are not converted (see
+    # conversion).
+    if text is None:
+        return False
+    return re.search(r"\b(at|wt|mol)\.%", normalize_unit_string(text)) is not None
+
+
+@lru_cache(maxsize=None)
+def parse_unit(text):
+    # Parse a unit string once, returning a Unit. None, "" and "None" are
+    # dimensionless.
+    if text is None:
+        return Unit(1.0, DIMENSIONLESS)
+    text = normalize_unit_string(text)
+    if text in ("", "None"):
+        return Unit(1.0, DIMENSIONLESS)
+    return UnitParser(text).parse()
+
+
+class ConversionPlan:
+    # Affine map from one unit to another, y = scale * x + offset
+    __slots__ = ("scale", "offset")
+
+    def __init__(self, scale, offset=0.0):
+        self.scale = scale
+        self.offset = offset
+
+    @property
+    def is_identity(self):
+        return self.scale == 1.0 and self.offset == 0.0
+
+    def __call__(self, value):
+        if self.is_identity:
+            return value
+        return value * self.scale + self.offset
+
+    def __repr__(self):
+        return f"ConversionPlan(scale={self.scale!r}, offset={self.offset!r})"
+
+
+@lru_cache(maxsize=None)
+def conversion(from_unit, to_unit):
+    # Cached ConversionPlan between two unit strings. to_unit can also be the
+    # name of a unit system in UNIT_SYSTEMS (e.g. "SI" or "CGS"), converting
+    # to the coherent unit of the same dimension in that system.
+    # Composition-relative units are only "converted" to themselves, except
+    # that a content on its own (e.g. at.%) is a fraction that can be given in
+    # other dimensionless units (e.g. None or ppm).
+    if is_composition_unit(from_unit) or is_composition_unit(to_unit):
+        source_text = normalize_unit_string(from_unit or "")
+        target_text = normalize_unit_string(to_unit or "")
+        if source_text == target_text:
+            return ConversionPlan(1.0)
+        fraction = (
+            to_unit not in UNIT_SYSTEMS
+            and is_composition_unit(from_unit) != is_composition_unit(to_unit)
+            and (source_text in CONTENT_UNITS or target_text in CONTENT_UNITS)
+        )
+        if not fraction:
+            raise ValueError(
+                f"Can not convert {from_unit} to {to_unit}, composition-relative units are not converted."
+            )
+    source = parse_unit(from_unit)
+    if to_unit in UNIT_SYSTEMS:
+        system = UNIT_SYSTEMS[to_unit]
+        factor = 1.0
+        for d, power in zip(DIMENSIONS, source.dimension):
+            factor = factor * system[d] ** power
+        target = Unit(factor, source.dimension)
+    else:
+        target = parse_unit(to_unit)
+    if any(abs(a - b) > 1e-9 for a, b in zip(source.dimension, target.dimension)):
+        raise ValueError(f"Can not convert {from_unit} to {to_unit}.")
+    # Rounded to 15 digits so that e.g. g/cm^3 -> kg/m^3 is exactly 1000
+    scale = float(f"{source.factor / target.factor:.15g}")
+    offset = float(f"{(source.offset - target.offset) / target.factor:.15g}")
+    return ConversionPlan(scale, offset)
+
+
+def convert(value, from_unit, to_unit):
+    # Convert a value or array between units
+    return conversion(from_unit, to_unit)(value)
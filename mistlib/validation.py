@@ -0,0 +1,443 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from mistlib.batch import map_sources
+from mistlib.core import ValueTypes
+from mistlib.library import MaterialRecord, load_source, material_sources, source_label
+from mistlib.units import conversion
+
+# Unit of each thermophysical property, and physically sensible ranges of
+# its values in that unit. Any unit of the same dimension is accepted (see
+# mistlib.units), the values are converted before the range is checked.
+# "None" is dimensionless, None skips the unit check.
+PROPERTY_CHECKS = {
+    "density": ("kg/m^3", (100.0, 3.0e4)),
+    "specific_heat_solid": ("J/(kg~K)", (10.0, 1.0e4)),
+    "specific_heat_liquid": ("J/(kg~K)", (10.0, 1.0e4)),
+    "thermal_conductivity_solid": ("W/(m~K)", (0.01, 5000.0)),
+    "thermal_conductivity_liquid": ("W/(m~K)", (0.01, 5000.0)),
+    "dynamic_viscosity": ("Pa~s", (1.0e-6, 10.0)),
+    "thermal_expansion": ("1/K", (-1.0e-3, 1.0e-3)),
+    "latent_heat_fusion": ("J/kg", (1.0e3, 1.0e7)),
+    "latent_heat_vaporization": ("J/kg", (1.0e4, 1.0e8)),
+    "emissivity": ("None", (0.0, 1.0)),
+    "molecular_mass": ("g/mol", (1.0, 300.0)),
+    "liquidus_temperature": ("K", (1.0, 6000.0)),
+    "log_vapor_pressure": (None, None),
+    "laser_absorption": ("None", (0.0, 1.0)),
+    "solidus_eutectic_temperature": ("K", (1.0, 6000.0)),
+    "hall_petch_coefficient": ("Pa/sqrt(m)", (0.0, 1.0e9)),
+}
+
+# Requirement profiles of the export targets: the properties each writer
+# reads, and those of them that are written directly and so have to be
+# scalars. The report profile checks whatever properties are present, and
+# is the only one whose writer takes values in any unit (the input decks are
+# written without converting, so they need the units of PROPERTY_CHECKS).
+PROFILES = {
+    "adamantine": {
+        "required": [
+            "density",
+            "specific_heat_solid",
+            "specific_heat_liquid",
+            "thermal_conductivity_solid",
+            "thermal_conductivity_liquid",
+            "emissivity",
+            "solidus_eutectic_temperature",
+            "liquidus_temperature",
+            "latent_heat_fusion",
+        ],
+        "scalar": [
+            "solidus_eutectic_temperature",
+            "liquidus_temperature",
+            "latent_heat_fusion",
+        ],
+        "any_unit": False,
+    },
+    "additivefoam": {
+        "required": [
+            "density",
+            "specific_heat_solid",
+            "specific_heat_liquid",
+            "thermal_conductivity_solid",
+            "thermal_conductivity_liquid",
+            "dynamic_viscosity",
+            "thermal_expansion",
+            "latent_heat_fusion",
+            "solidus_eutectic_temperature",
+            "liquidus_temperature",
+        ],
+        "scalar": ["solidus_eutectic_temperature", "liquidus_temperature"],
+        "any_unit": False,
+    },
+    "3dthesis": {
+        "required": [
+            "density",
+            "specific_heat_solid",
+            "thermal_conductivity_solid",
+            "solidus_eutectic_temperature",
+            "liquidus_temperature",
+        ],
+        "scalar": ["solidus_eutectic_temperature", "liquidus_temperature"],
+        "any_unit": False,
+    },
+    "report": {"required": None, "scalar": [], "any_unit": True},
+}
+
+TARGETS = tuple(PROFILES.keys())
+
+# Temperature used for properties that are not solid or liquid specific, and
+# for the lower end of the solid range
+ROOM_TEMPERATURE = 298.15
+
+
+class ValidationIssue:
+    # One problem found in a material. severity is "error" (the target's
+    # writer would fail or write wrong input) or "warning".
+    def __init__(self, severity, code, message, property=None, targets=None):
+        self.severity = severity
+        self.code = code
+        self.message = message
+        self.property = property
+        self.targets = targets if targets is not None else []
+
+    def to_dict(self):
+        return {
+            "severity": self.severity,
+            "code": self.code,
+            "property": self.property,
+            "targets": self.targets,
+            "message": self.message,
+        }
+
+    def __repr__(self):
+        return f"ValidationIssue({self.severity}, {self.code}, {self.message})"
+
+
+class ValidationReport:
+    # The issues found for one material
+    def __init__(self, material, file=None, targets=None, issues=None):
+        self.material = material
+        self.file = file
+        self.targets = targets if targets is not None else []
+        self.issues = issues if issues is not None else []
+
+    @property
+    def ok(self):
+        return len(self.errors()) == 0
+
+    def errors(self, target=None):
+        return [
+            issue
+            for issue in self.issues
+            if issue.severity == "error" and (target is None or target in issue.targets)
+        ]
+
+    def warnings(self):
+        return [issue for issue in self.issues if issue.severity == "warning"]
+
+    def ok_for(self, target):
+        return len(self.errors(target)) == 0
+
+    def to_dict(self):
+        return {
+            "material": self.material,
+            "file": self.file,
+            "targets": self.targets,
+            "ok": self.ok,
+            "issues": [issue.to_dict() for issue in self.issues],
+        }
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"{len(self.errors())} errors"
+        return f"ValidationReport({self.material}, {status})"
+
+
+def file_unit(unit):
+    # Unit of a property as understood by mistlib.units, with the spellings
+    # of dimensionless values in material files
+    if unit is None or unit.strip() in ("", "-"):
+        return "None"
+    return unit
+
+
+def check_temperatures(material, property_name):
+    # Temperatures at which a property is checked: the solid range for solid
+    # properties, above the liquidus for liquid ones and the reference
+    # (solidus) temperature of the writers otherwise
+    solidus = scalar_value(material, "solidus_eutectic_temperature")
+    liquidus = scalar_value(material, "liquidus_temperature")
+    if property_name.endswith("_solid") and solidus is not None:
+        return np.linspace(min(ROOM_TEMPERATURE, solidus), solidus, 5)
+    if property_name.endswith("_liquid") and liquidus is not None:
+        return np.linspace(liquidus, 1.5 * liquidus, 5)
+    if solidus is not None:
+        return np.array([solidus])
+    return np.array([ROOM_TEMPERATURE])
+
+
+def scalar_value(material, property_name):
+    p = material.properties.get(property_name)
+    if p is None or p.value_type != ValueTypes.SCALAR:
+        return None
+    try:
+        return float(p.value)
+    except (TypeError, ValueError):
+        return None
+
+
+def check_property(material, property_name):
+    # Issues of one property, without the targets filled in
+    p = material.properties.get(property_name)
+    if p is None:
+        return [
+            ValidationIssue(
+                "error", "missing", f"{property_name} is missing.", property_name
+            )
+        ]
+    if p.value_type is None:
+        return [
+            ValidationIssue(
+                "error", "no_value", f"{property_name} has no value.", property_name
+            )
+        ]
+    issues = []
+    unit, value_range = PROPERTY_CHECKS.get(property_name, (None, None))
+    evaluator = p.compile()
+    if unit is not None:
+        try:
+            plan = conversion(file_unit(p.unit), unit)
+        except ValueError:
+            issues.append(
+                ValidationIssue(
+                    "error",
+                    "unit",
+                    f"{property_name} has unit {p.unit}, expected a unit of the dimension of {unit}.",
+                    property_name,
+                )
+            )
+            # Values in a unit of another dimension can not be range checked
+            value_range = None
+        else:
+            evaluator = p.compile(unit)
+            if not plan.is_identity:
+                # Only a problem for the writers that do not convert, see
+                # validate_material
+                issues.append(
+                    ValidationIssue(
+                        "error",
+                        "unit_scale",
+                        f"{property_name} has unit {p.unit}, the input decks need {unit}.",
+                        property_name,
+                    )
+                )
+
+    try:
+        with np.errstate(all="ignore"):
+            values = np.asarray(
+                evaluator(check_temperatures(material, property_name)),
+                dtype=np.float64,
+            )
+    except (TypeError, ValueError) as e:
+        issues.append(
+            ValidationIssue(
+                "error",
+                "not_finite",
+                f"{property_name} could not be evaluated ({e}).",
+                property_name,
+            )
+        )
+        return issues
+
+    if not np.all(np.isfinite(values)):
+        issues.append(
+            ValidationIssue(
+                "error",
+                "not_finite",
+                f"{property_name} is not finite over its temperature range.",
+                property_name,
+            )
+        )
+    elif value_range is not None:
+        low, high = value_range
+        if np.any(values < low) or np.any(values > high):
+            issues.append(
+                ValidationIssue(
+                    "error",
+                    "range",
+                    f"{property_name} is outside of [{low:g}, {high:g}] (between {values.min():g} and {values.max():g}).",
+                    property_name,
+                )
+            )
+
+    if p.unit is None and unit is None:
+        issues.append(
+            ValidationIssue(
+                "warning", "unit", f"{property_name} has no unit.", property_name
+            )
+        )
+    return issues
+
+
+def validate_material(material, targets=TARGETS, file=None):
+    # Check a MaterialInformation against the requirement profiles of the
+    # given targets and return a ValidationReport. An issue found for a
+    # property lists every target that needs that property.
+    if isinstance(targets, str):
+        targets = [targets]
+    for target in targets:
+        if target not in PROFILES:
+            raise ValueError(
+                f"Unknown validation target {target}, expected one of {TARGETS}."
+            )
+
+    report = ValidationReport(material.name, file, list(targets))
+
+    # Which targets need each property, and which need it as a scalar
+    needed_by = {}
+    scalar_for = {}
+    for target in targets:
+        required = PROFILES[target]["required"]
+        if required is None:
+            required = [p for p in material.properties if material.properties[p]]
+        for p in required:
+            needed_by.setdefault(p, []).append(target)
+        for p in PROFILES[target]["scalar"]:
+            scalar_for.setdefault(p, []).append(target)
+
+    if not material.name:
+        report.issues.append(
+            ValidationIssue("error", "missing", "The material has no name.", None)
+        )
+
+    for p, property_targets in needed_by.items():
+        for issue in check_property(material, p):
+            issue.targets = list(property_targets)
+            if issue.code == "unit_scale":
+                issue.targets = [
+                    target
+                    for target in property_targets
+                    if not PROFILES[target]["any_unit"]
+                ]
+            if issue.targets:
+                report.issues.append(issue)
+
+        # Values that the writers format directly have to be scalars
+        prop = material.properties.get(p)
+        scalar_targets = scalar_for.get(p, [])
+        if (
+            scalar_targets
+            and prop is not None
+            and prop.value_type is not None
+            and prop.value_type != ValueTypes.SCALAR
+        ):
+            report.issues.append(
+                ValidationIssue(
+                    "error",
+                    "value_type",
+                    f"{p} has to be a SCALAR, not a {prop.value_type.name}.",
+                    p,
+                    list(scalar_targets),
+                )
+            )
+
+    # Consistency between properties
+    solidus = scalar_value(material, "solidus_eutectic_temperature")
+    liquidus = scalar_value(material, "liquidus_temperature")
+    if solidus is not None and liquidus is not None and liquidus < solidus:
+        report.issues.append(
+            ValidationIssue(
+                "error",
+                "order",
+                f"liquidus_temperature ({liquidus:g}) is below solidus_eutectic_temperature ({solidus:g}).",
+                "liquidus_temperature",
+                list(needed_by.get("liquidus_temperature", [])),
+            )
+        )
+
+    return report
+
+
+def validate_source(source, targets=TARGETS):
+    # Load (if needed) and validate one material. Files and records that
+    # cannot be read give a report with a "load" error instead of raising.
+    if not isinstance(source, (str, MaterialRecord)):
+        return validate_material(source, targets)
+    try:
+        material = load_source(source)
+    except Exception as e:
+        if isinstance(source, str):
+            name = os.path.splitext(os.path.basename(source))[0]
+            what = "file"
+        else:
+            name = source.name if source.name is not None else source.label
+            what = "record"
+        report = ValidationReport(name, source_label(source), list(targets))
+        report.issues.append(
+            ValidationIssue(
+                "error",
+                "load",
+                f"The {what} could not be loaded ({type(e).__name__}: {e}).",
+                None,
+                list(targets),
+            )
+        )
+        return report
+    return validate_material(material, targets, source_label(source))
+
+
+def validate_batch(materials, targets=TARGETS, workers=None):
+    # Validate many materials (a MaterialLibrary, a directory or an iterable
+    # of paths and MaterialInformation objects) in parallel and return the
+    # reports in input order
+    if isinstance(targets, str):
+        targets = [targets]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return list(
+        map_sources(validate_source, material_sources(materials), workers, (targets,))
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m mistlib validate",
+        description="Check that materials have everything the export targets need.",
+    )
+    parser.add_argument(
+        "materials", nargs="+", help="Material JSON files or directories of them"
+    )
+    parser.add_argument(
+        "-t",
+        "--targets",
+        nargs="+",
+        default=list(TARGETS),
+        choices=TARGETS,
+        help="Targets to validate for",
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--json", default=None, help="Write the full report to this JSON file"
+    )
+    args = parser.parse_args(argv)
+
+    reports = validate_batch(args.materials, args.targets, args.workers)
+
+    for report in reports:
+        for issue in report.issues:
+            severity = "Error" if issue.severity == "error" else "Warning"
+            print(
+                f"{severity}: {report.material} ({', '.join(issue.targets)}): {issue.message}"
+            )
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump([report.to_dict() for report in reports], f, indent=4)
+
+    failures = [report for report in reports if not report.ok]
+    print(f"{len(reports) - len(failures)} of {len(reports)} materials are valid.")
+    return 1 if failures else 0
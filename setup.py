@@ -6,6 +6,11 @@ requirement_path = os.path.join(path, "requirements.txt")
 requires = []
 with open(requirement_path) as f:
     requires = f.read().splitlines()
+# Only needed for writing PDF reports
+report_requirement_path = os.path.join(path, "requirements-report.txt")
+report_requires = []
+with open(report_requirement_path) as f:
+    report_requires = f.read().splitlines()
 
 setup(
     name="mistlib",
@@ -17,6 +22,7 @@ setup(
     license="BSD 3-Clause",
     packages=["mistlib"],
     install_requires=requires,
+    extras_require={"report": report_requires},
     classifiers=[
         "Development Status :: 1 - Planning",
         "Intended Audience :: Science/Research",
@@ -3,9 +3,32 @@ import sys
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from md2pdf.core import md2pdf
+import io
+import socket
+import tempfile
 import unittest
+import numpy as np
 import mistlib as mist
 
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "../examples")
+
+
+def make_test_library(directory, num_variants):
+    # Write renamed copies of the example materials into a directory
+    import json
+
+    files = []
+    for example in ["SS316L", "AlCu"]:
+        with open(os.path.join(EXAMPLES_DIR, example + ".json"), "r") as f:
+            data = json.load(f)
+        for i in range(num_variants):
+            data["name"] = f"{example}_{i}"
+            file = os.path.join(directory, f"{example}_{i}.json")
+            with open(file, "w") as f:
+                json.dump(data, f)
+            files.append(file)
+    return files
+
 
 class TestSuite(unittest.TestCase):
     """Test cases."""
@@ -28,6 +51,140 @@ class TestSuite(unittest.TestCase):
         assert abs(prop.uncertainty - 1.5) < 1.0e-13
         assert prop.print_symbol == None
 
+    def test_evaluate_laurent_polynomial(self):
+        prop = mist.core.Property(
+            "thermal_conductivity_solid",
+            "J/(m~s~K)",
+            value_laurent_poly=[[0.6658, 0], [1.571e-2, 1], [2.0e3, -1], [0.5, 0.5]],
+        )
+
+        # Scalar input returns a float
+        value = prop.evaluate_laurent_polynomial(1670.0)
+        expected = 0.6658 + 1.571e-2 * 1670.0 + 2.0e3 / 1670.0 + 0.5 * 1670.0**0.5
+        assert isinstance(value, float)
+        assert abs(value - expected) < 1.0e-10
+
+        # Array input keeps its shape and matches the scalar evaluation
+        temperatures = np.linspace(300.0, 2000.0, 24).reshape(2, 3, 4)
+        values = prop.evaluate_laurent_polynomial(temperatures)
+        assert values.shape == temperatures.shape
+        for t, v in zip(temperatures.ravel(), values.ravel()):
+            assert abs(prop.evaluate_laurent_polynomial(float(t)) - v) < 1.0e-10
+
+        # Undefined points give inf/nan rather than errors or complex values
+        values = prop.evaluate_laurent_polynomial(np.array([0.0, -4.0]))
+        assert np.isinf(values[0])
+        assert np.isnan(values[1])
+
+        # Reassigning the terms updates the stored coefficient arrays
+        prop.value_laurent_poly = [[1.0, 0], [2.0, 2]]
+        assert abs(prop.evaluate_laurent_polynomial(3.0) - 19.0) < 1.0e-13
+
+    def test_compiled_evaluator_and_property_cache(self):
+        path_to_example_data = os.path.join(
+            os.path.dirname(__file__), "../examples/SS316L.json"
+        )
+        mat = mist.core.MaterialInformation(path_to_example_data)
+
+        # Compiled evaluators are reused until the value changes
+        k = mat.properties["thermal_conductivity_solid"]
+        evaluator = k.compile()
+        assert k.compile() is evaluator
+        assert abs(evaluator(1670.0) - k.evaluate_laurent_polynomial(1670.0)) < 1e-13
+        assert evaluator(np.ones((3, 2))).shape == (3, 2)
+
+        density = mat.properties["density"].compile()
+        assert density(1670.0) == 7955
+        assert np.all(density(np.ones(4)) == 7955.0)
+
+        # Repeated queries are served from the cache
+        value = mat.get_property("thermal_conductivity_solid", "test", 1670.0)
+        assert ("thermal_conductivity_solid", 1670.0) in mat._property_cache
+        assert mat.get_property("thermal_conductivity_solid", "test", 1670.0) == value
+
+        # Changing the coefficients or value invalidates cached results
+        k.value_laurent_poly = [[1.0, 0], [1.0e-2, 1]]
+        assert k.compile() is not evaluator
+        value = mat.get_property("thermal_conductivity_solid", "test", 1670.0)
+        assert abs(value - 17.7) < 1.0e-12
+
+        mat.properties["density"].value = 8000.0
+        assert mat.get_property("density", "test", 1670.0) == 8000.0
+
+        # The cache is bounded
+        mat.property_cache_size = 4
+        for t in range(10):
+            mat.get_property("specific_heat_solid", "test", float(t))
+        assert len(mat._property_cache) == 4
+
+        # Arrays bypass the cache
+        values = mat.get_property("specific_heat_solid", "test", np.ones(5))
+        assert values.shape == (5,)
+
+    def test_table_property(self):
+        # Unsorted input is sorted on creation
+        prop = mist.core.Property(
+            "thermal_conductivity_solid",
+            "J/(m~s~K)",
+            value_table=[[400.0, 20.0], [300.0, 10.0], [600.0, 20.0], [700.0, 40.0]],
+            dependent_variable_print_symbol="T",
+        )
+        assert prop.value_type == mist.core.ValueTypes.TABLE
+        assert np.all(prop._table_x == [300.0, 400.0, 600.0, 700.0])
+
+        # Linear interpolation with constant extrapolation by default
+        values = prop.evaluate(np.array([200.0, 350.0, 500.0, 650.0, 800.0]))
+        assert np.allclose(values, [10.0, 15.0, 20.0, 30.0, 40.0])
+        assert abs(prop.interpolate_table(350.0) - 15.0) < 1.0e-13
+
+        prop.table_extrapolation = "linear"
+        assert np.allclose(prop.evaluate([200.0, 800.0]), [0.0, 60.0])
+
+        prop.table_extrapolation = "nan"
+        values = prop.evaluate([200.0, 800.0])
+        assert np.all(np.isnan(values))
+
+        # Monotone cubic interpolation goes through the points, does not
+        # overshoot the flat segment and keeps the input shape
+        prop.table_interpolation = "monotone_cubic"
+        temperatures = np.linspace(300.0, 700.0, 401).reshape(401, 1)
+        values = prop.evaluate(temperatures)
+        assert values.shape == (401, 1)
+        assert np.allclose(
+            prop.evaluate([300.0, 400.0, 600.0, 700.0]), [10, 20, 20, 40]
+        )
+        assert np.all(np.diff(values[:, 0]) >= -1.0e-12)
+        assert np.allclose(prop.evaluate(np.linspace(400.0, 600.0, 11)), 20.0)
+
+        # Tables can be used by get_property and by all of the writers
+        path_to_example_data = os.path.join(
+            os.path.dirname(__file__), "../examples/SS316L.json"
+        )
+        mat = mist.core.MaterialInformation(path_to_example_data)
+        table = [[300.0, 5.0], [1000.0, 19.0], [1700.0, 33.0]]
+        mat.properties["thermal_conductivity_solid"] = mist.core.Property(
+            "thermal_conductivity_solid", "J/(m~s~K)", value_table=table
+        )
+        value = mat.get_property("thermal_conductivity_solid", "test", 1670.0)
+        assert abs(value - 32.4) < 1.0e-10
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mat.write_markdown(os.path.join(tmp_dir, "table.md"))
+            with open(os.path.join(tmp_dir, "table.md"), "r") as f:
+                assert "19.0 ($x$ = 1000.0)" in f.read()
+
+            transport_file, _ = mat.write_additivefoam_input(
+                os.path.join(tmp_dir, "transportProperties"),
+                os.path.join(tmp_dir, "thermoPath"),
+            )
+            with open(transport_file, "r") as f:
+                line = [l for l in f.readlines() if "kappa" in l][0]
+            coeff = [float(c) for c in line.split("(")[1].split(")")[0].split()]
+            assert np.allclose(coeff, [-1.0, 0.02, 0.0], atol=1.0e-8)
+
+            mat.write_adamantine_input(os.path.join(tmp_dir, "mistinput.info"))
+            mat.write_3dthesis_input(os.path.join(tmp_dir, "3dthesis_input.txt"))
+
     def test_material_information_creation(self):
         # Create from the SS316L JSON file
         path_to_example_data = os.path.join(
@@ -234,6 +391,1325 @@ class TestSuite(unittest.TestCase):
                 else:
                     assert lines[i] == expected_lines[i]
 
+    def test_material_library(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            make_test_library(tmp_dir, 5)
+            with open(os.path.join(tmp_dir, "not_a_material.json"), "w") as f:
+                f.write("[1, 2, 3]")
+
+            library = mist.library.MaterialLibrary(tmp_dir, max_loaded=3)
+            assert len(library) == 10
+            assert "SS316L_3" in library
+            assert library.num_loaded() == 0
+
+            # The index is available without loading anything
+            entry = library.index["AlCu_2"]
+            assert entry["base_element"] == "Al"
+            assert entry["solute_elements"] == ["Cu"]
+            assert entry["phases"] == ["liquid", "alpha", "theta"]
+            assert "density" in library.index["SS316L_0"]["properties"]
+            assert len(library.find(base_element="Al")) == 5
+            assert (
+                len(library.find(properties=["density", "liquidus_temperature"])) == 5
+            )
+            assert library.num_loaded() == 0
+
+            # Materials are loaded on first access and then reused
+            mat = library["SS316L_1"]
+            assert mat.name == "SS316L_1"
+            assert abs(mat.properties["density"].value - 7955.0) < 1.0e-13
+            assert library["SS316L_1"] is mat
+            assert library.get("missing") is None
+
+            # Least recently used materials are evicted
+            for name in ["AlCu_0", "AlCu_1", "AlCu_2"]:
+                library.load(name)
+            assert library.num_loaded() == 3
+            assert library["SS316L_1"] is not mat
+
+            # Rescanning picks up new files and drops removed ones
+            os.remove(os.path.join(tmp_dir, "AlCu_0.json"))
+            library.scan()
+            assert "AlCu_0" not in library
+            assert len(library) == 9
+
+            # A persisted index is reused, only changed files are parsed
+            class CountingLibrary(mist.library.MaterialLibrary):
+                parsed = []
+
+                def index_file(self, file, stat=None):
+                    self.parsed.append(os.path.basename(file))
+                    return super().index_file(file, stat)
+
+            index_path = os.path.join(tmp_dir, "index", "library.json")
+            library = CountingLibrary(tmp_dir, index_path=index_path)
+            assert len(CountingLibrary.parsed) == 10
+            file = os.path.join(tmp_dir, "SS316L_2.json")
+            material = mist.core.MaterialInformation(file)
+            material.name = "SS316L_renamed"
+            material.write_json(file)
+            CountingLibrary.parsed.clear()
+            library = CountingLibrary(tmp_dir, index_path=index_path)
+            assert CountingLibrary.parsed == ["SS316L_2.json", "not_a_material.json"]
+            assert library.index["SS316L_renamed"]["base_element"] is None
+            assert library.names() == mist.library.MaterialLibrary(tmp_dir).names()
+
+    def test_material_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files = make_test_library(tmp_dir, 1)
+            cache_dir = os.path.join(tmp_dir, "cache")
+
+            for validate in ["mtime", "hash"]:
+                cache = mist.cache.MaterialCache(cache_dir, validate=validate)
+                cache.clear()
+
+                mat = cache.load(files[0])
+                assert cache.misses == 1 and cache.hits == 0
+                mat = cache.load(files[0])
+                assert cache.misses == 1 and cache.hits == 1
+                assert mat.name == "SS316L_0"
+                value = mat.get_property("thermal_conductivity_solid", "test", 1670.0)
+                assert abs(value - 26.9015) < 1.0e-10
+
+                # Changing the source file invalidates the entry
+                mat.name = "SS316L_edited"
+                with open(files[0], "r") as f:
+                    content = f.read()
+                with open(files[0], "w") as f:
+                    f.write(content.replace("SS316L_0", "SS316L_x") + " ")
+                mat = cache.load(files[0])
+                assert cache.misses == 2
+                assert mat.name == "SS316L_x"
+                with open(files[0], "w") as f:
+                    f.write(content)
+
+            # Table properties survive the round trip through the cache format
+            import pickle
+
+            prop = mist.core.Property(
+                "density", "kg/m^3", value_table=[[300.0, 7900.0], [1700.0, 7300.0]]
+            )
+            restored = pickle.loads(pickle.dumps(prop))
+            assert restored.value_type == mist.core.ValueTypes.TABLE
+            assert abs(restored.evaluate(1000.0) - 7600.0) < 1.0e-10
+
+            # Libraries can load through the cache
+            library = mist.library.MaterialLibrary(tmp_dir, cache=cache)
+            library["AlCu_0"]
+            library.clear_cache()
+            library["AlCu_0"]
+            assert cache.hits == 2
+
+    def test_export_batch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source_dir = os.path.join(tmp_dir, "materials")
+            output_dir = os.path.join(tmp_dir, "output")
+            os.makedirs(source_dir)
+            make_test_library(source_dir, 2)
+
+            # Generators of files and objects are accepted
+            files = [os.path.join(source_dir, f"SS316L_{i}.json") for i in range(2)]
+            mat = mist.core.MaterialInformation(files[0])
+            mat.name = "SS316L_object"
+            sources = (f for f in files + [mat, os.path.join(tmp_dir, "missing.json")])
+            results = mist.batch.export_batch(
+                sources,
+                output_dir=output_dir,
+                workers=2,
+                options={"initial_temperature": 300.0},
+            )
+            assert len(results) == 4 * len(mist.batch.TARGETS)
+            assert [r.material for r in results[::3]] == [
+                "SS316L_0",
+                "SS316L_1",
+                "SS316L_object",
+                os.path.join(tmp_dir, "missing.json"),
+            ]
+            assert all(r.ok for r in results[:9])
+            assert not any(r.ok for r in results[9:])
+
+            thesis_file = os.path.join(
+                output_dir, "SS316L_1", "3dthesis", "3dthesis_input.txt"
+            )
+            with open(thesis_file, "r") as f:
+                assert "T_0\t300.0" in f.read()
+            for r in results[:9]:
+                for file in r.files:
+                    assert os.path.exists(file)
+
+            # The AlCu example is missing properties, which is reported per item
+            # without stopping the batch
+            library = mist.library.MaterialLibrary(source_dir)
+            results = mist.batch.export_batch(
+                library, ["3dthesis"], output_dir, workers=1
+            )
+            assert len(results) == 4
+            assert [r.ok for r in results] == [False, False, True, True]
+            assert "KeyError" in results[0].error
+
+            # Names that would write outside of the output directory are
+            # rejected per item
+            unsafe = []
+            for name in ["../escaped", os.path.join("a", "b"), ".."]:
+                mat = mist.core.MaterialInformation(files[0])
+                mat.name = name
+                unsafe.append(mat)
+            results = mist.batch.export_batch(unsafe, ["adamantine"], output_dir, 1)
+            assert not any(r.ok for r in results)
+            assert all("can not be used as a file name" in r.error for r in results)
+            assert not os.path.exists(os.path.join(tmp_dir, "escaped"))
+
+            # Command line mode
+            status = mist.batch.main(
+                [source_dir, "-o", output_dir, "-t", "adamantine", "-j", "2"]
+            )
+            assert status == 1
+            assert os.path.exists(
+                os.path.join(output_dir, "SS316L_0", "adamantine", "mistinput.info")
+            )
+
+    def test_markdown_in_memory(self):
+        path_to_example_data = os.path.join(
+            os.path.dirname(__file__), "AlCu_test_in.json"
+        )
+        mat = mist.core.MaterialInformation(path_to_example_data)
+        tables = ["properties", "composition"]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = os.path.join(tmp_dir, "AlCu.md")
+            mat.write_markdown(file, tables)
+            with open(file, "r") as f:
+                content = f.read()
+
+            # Rendering to a string or an open stream gives the same Markdown
+            assert mat.markdown_string(tables) == content
+            stream = io.StringIO()
+            mat.write_markdown(stream, tables)
+            assert stream.getvalue() == content
+
+            # Markdown datasheets can be written in batches
+            results = mist.batch.export_batch(
+                [path_to_example_data],
+                ["markdown"],
+                tmp_dir,
+                workers=1,
+                options={"tables": tables},
+            )
+            assert results[0].ok
+            with open(results[0].files[0], "r") as f:
+                assert f.read() == content
+
+    def test_markdown_report(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source_dir = os.path.join(tmp_dir, "materials")
+            os.makedirs(source_dir)
+            make_test_library(source_dir, 3)
+
+            file = os.path.join(tmp_dir, "report.md")
+            num_materials = mist.report.write_markdown_report(
+                mist.library.MaterialLibrary(source_dir), file
+            )
+            assert num_materials == 6
+            with open(file, "r") as f:
+                content = f.read()
+
+            assert content.startswith("# Material Properties\n")
+            assert content.count("## Material Properties: ") == 6
+            assert "### Thermophysical Properties" in content
+            assert "#### $\\alpha$" in content
+            assert (
+                "| Diffusivity (Cu in liquid AlCu) | 2.4e-09 | $m^2/s$ | [1] |"
+                in content
+            )
+            assert (
+                "| Misfit strain (Cu in \\alpha Al) | -0.0194 | $-$ | [3] |" in content
+            )
+
+            # Each reference is listed once across all of the materials
+            references = content.split("## References \n")[1]
+            assert references.count("C.S. Kim") == 1
+            assert "[5] " in references and "[6] " not in references
+
+    def test_property_tables(self):
+        path_to_example_data = os.path.join(
+            os.path.dirname(__file__), "../examples/SS316L.json"
+        )
+        mat = mist.core.MaterialInformation(path_to_example_data)
+        names = mat.temperature_dependent_property_names()
+        assert names == [
+            "specific_heat_solid",
+            "thermal_conductivity_solid",
+            "thermal_conductivity_liquid",
+        ]
+
+        temperatures = np.linspace(300.0, 1700.0, 1001)
+        tables = mat.tabulate_properties(temperatures, names + ["density"])
+        assert np.allclose(
+            tables["specific_heat_solid"], 386.7 + 1.329e-1 * temperatures
+        )
+        assert np.all(tables["density"] == 7955.0)
+
+        # Linear properties need no refinement, curved ones are refined until
+        # linear interpolation is within the tolerance
+        grid = mat.adaptive_temperature_grid(300.0, 1700.0, initial_points=5)
+        assert len(grid) == 5
+        prop = mist.core.Property(
+            "test", "-", value_laurent_poly=[[1.0, 0], [1.0e3, -1]]
+        )
+        mat.properties["log_vapor_pressure"] = prop
+        grid = mat.adaptive_temperature_grid(
+            300.0, 1700.0, ["log_vapor_pressure"], tolerance=1.0e-5
+        )
+        assert len(grid) > 17
+        test_points = np.linspace(300.0, 1700.0, 9999)
+        interpolated = np.interp(test_points, grid, prop.evaluate(grid))
+        assert np.all(
+            np.abs(interpolated - prop.evaluate(test_points))
+            < 1.0e-5 * prop.evaluate(test_points)
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # One memory-mappable .npy file per property
+            path = os.path.join(tmp_dir, "tables")
+            mat.save_property_tables(path, temperatures, names)
+            loaded = mist.core.load_property_tables(path)
+            assert isinstance(loaded["thermal_conductivity_solid"], np.memmap)
+            assert np.all(loaded["temperature"] == temperatures)
+            assert np.all(
+                loaded["specific_heat_solid"] == tables["specific_heat_solid"]
+            )
+
+            # Or a single archive
+            files = mat.save_property_tables(
+                os.path.join(tmp_dir, "tables"), temperatures, format="npz"
+            )
+            loaded = mist.core.load_property_tables(files[0])
+            assert np.all(
+                loaded["specific_heat_solid"] == tables["specific_heat_solid"]
+            )
+
+    def test_enthalpy(self):
+        path_to_example_data = os.path.join(
+            os.path.dirname(__file__), "../examples/SS316L.json"
+        )
+        mat = mist.core.MaterialInformation(path_to_example_data)
+
+        # Analytic integrals of the specific heat
+        cp = mat.properties["specific_heat_solid"]
+        assert np.isclose(
+            cp.integrate(300.0, 1000.0),
+            386.7 * 700.0 + 0.5 * 1.329e-1 * (1000.0**2 - 300.0**2),
+        )
+        table = mist.core.Property(
+            "test", "-", value_table=[[300.0, 1.0], [500.0, 3.0], [700.0, 3.0]]
+        )
+        assert np.isclose(table.integrate(300.0, 700.0), 2.0 * 200.0 + 3.0 * 200.0)
+        assert np.isclose(table.integrate(200.0, 300.0), 100.0)
+
+        model = mist.enthalpy.EnthalpyModel(mat)
+        assert model.enthalpy(298.15) == 0.0
+        t_s = model.solidus_temperature
+        t_l = model.liquidus_temperature
+        assert np.isclose(
+            model.enthalpy(t_l) - model.enthalpy(t_s),
+            cp.integrate(t_s, t_l) + model.latent_heat,
+        )
+        assert np.isclose(model.enthalpy(t_l + 1.0e-6), model.enthalpy(t_l))
+
+        # The inverse recovers the temperature inside and outside of the table
+        temperatures = np.linspace(100.0, 5000.0, 10001)
+        assert np.allclose(
+            model.temperature(model.enthalpy(temperatures)), temperatures
+        )
+        assert np.isclose(model.temperature(model.enthalpy(1700.0)), 1700.0)
+
+        # Isothermal melting: every enthalpy in the latent heat jump maps to
+        # the melting point
+        mat.properties["liquidus_temperature"].value = t_s
+        model = mist.enthalpy.EnthalpyModel(mat)
+        h_s = model.solid_sensible_enthalpy(t_s)
+        h = np.linspace(h_s, h_s + model.latent_heat, 5)
+        assert np.allclose(model.temperature(h), t_s)
+        assert np.allclose(
+            model.temperature(model.enthalpy(temperatures)), temperatures
+        )
+
+    def test_import_is_lightweight(self):
+        # The report rendering stack and the optional submodules are only
+        # imported when they are used
+        import subprocess
+
+        code = (
+            "import sys; import mistlib; "
+            "heavy = ['pandoc', 'md2pdf', 'weasyprint', 'mistlib.batch']; "
+            "print(','.join(m for m in heavy if m in sys.modules)); "
+            "mistlib.batch; print('mistlib.batch' in sys.modules)"
+        )
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split("\n")
+        assert output[0] == ""
+        assert output[1] == "True"
+
+    def test_benchmarks(self):
+        # Smoke test of the benchmark suite on a tiny library
+        import importlib.util
+        import json
+
+        file = os.path.join(os.path.dirname(__file__), "../benchmarks/benchmark.py")
+        spec = importlib.util.spec_from_file_location("benchmark", file)
+        benchmark = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(benchmark)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, "results.json")
+            args = ["-n", "4", "--array-size", "10", "-r", "1", "-o", output]
+            assert benchmark.main(args) == 0
+            with open(output, "r") as f:
+                results = json.load(f)
+            assert results["parameters"]["materials"] == 4
+            for name in [
+                "load_json",
+                "evaluate_laurent_polynomial_array",
+                "get_property_scalar_cached",
+                "write_markdown",
+                "write_3dthesis_input",
+            ]:
+                assert results["benchmarks"][name]["best"] > 0.0
+            assert results["benchmarks"]["load_json"]["items"] == 4
+
+            # Identical results are not a regression
+            assert benchmark.compare(results, results) == {}
+
+    def test_profiling(self):
+        import json
+
+        path_to_example_data = os.path.join(
+            os.path.dirname(__file__), "../examples/SS316L.json"
+        )
+        # Disabled profiling leaves the plain methods in place
+        assert not mist.profiling.is_enabled()
+        get_property = mist.core.MaterialInformation.get_property
+        assert not hasattr(get_property, "__wrapped__")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = os.path.join(tmp_dir, "mistinput.info")
+            with mist.profiling.profile() as prof:
+                mat = mist.core.MaterialInformation(path_to_example_data)
+                mat.write_adamantine_input(file)
+                mat.write_markdown(io.StringIO())
+                with mist.profiling.timer("block"):
+                    mat.get_property("density", "test", 300.0)
+            assert not mist.profiling.is_enabled()
+            assert mist.core.MaterialInformation.get_property is get_property
+
+            stats = prof.get_stats()
+            assert stats["load_json"]["calls"] == 1
+            assert stats["json_blob_to_property"]["calls"] == 15
+            assert stats["write_adamantine_input"]["bytes"] == os.path.getsize(file)
+            assert stats["write_markdown"]["bytes"] == 0
+            assert stats["block"]["calls"] == 1
+            assert stats["get_property"]["calls"] > 1
+            assert stats["load_json"]["time"] > 0.0
+
+            # Nothing is recorded outside of the block
+            mat.write_adamantine_input(file)
+            assert mist.profiling.get_stats() == stats
+
+            output = io.StringIO()
+            prof.dump(output, format="json")
+            assert json.loads(output.getvalue()) == stats
+            assert "write_adamantine_input" in prof.summary()
+
+            mist.profiling.merge(stats)
+            assert mist.profiling.get_stats()["load_json"]["calls"] == 2
+            mist.profiling.reset()
+            assert mist.profiling.get_stats() == {}
+
+    def test_write_json(self):
+        import json
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for example in ["SS316L", "AlCu"]:
+                mat = mist.core.MaterialInformation(
+                    os.path.join(EXAMPLES_DIR, example + ".json")
+                )
+                file = os.path.join(tmp_dir, example + ".json")
+                mat.write_json(file)
+                loaded = mist.core.MaterialInformation(file)
+                assert loaded.to_dict() == mat.to_dict()
+                assert loaded.content_hash() == mat.content_hash()
+
+                # Writing is deterministic
+                file_2 = os.path.join(tmp_dir, example + "_2.json")
+                loaded.write_json(file_2)
+                with open(file, "r") as f, open(file_2, "r") as g:
+                    assert f.read() == g.read()
+
+                # Every property of the example is kept, known to mist or not
+                with open(os.path.join(EXAMPLES_DIR, example + ".json")) as f:
+                    original = json.load(f)
+                with open(file) as f:
+                    written = json.load(f)
+                assert written.get("thermophysical_properties") == original.get(
+                    "thermophysical_properties"
+                )
+                if example == "SS316L":
+                    assert "vaporization_temperature" in loaded.properties
+
+            # Composition and per-solute phase properties survive
+            assert loaded.composition["solute_elements"] == ["Cu"]
+            diffusivity = loaded.phase_properties["liquid"].properties[
+                "solute_diffusivities"
+            ]["Cu"]
+            assert diffusivity.value == 2.4e-9
+            assert loaded.phase_properties["alpha"].print_name == "$\\alpha$"
+
+            # Tables and their interpolation settings, also from NumPy values
+            mat.properties["thermal_conductivity_solid"] = mist.core.Property(
+                "thermal_conductivity_solid",
+                "W/(m K)",
+                value_table=np.array([[300.0, 10.0], [1000.0, 20.0]]),
+                table_interpolation="monotone_cubic",
+                table_extrapolation="linear",
+            )
+            old_hash = mat.content_hash()
+            mat.write_json(file)
+            loaded = mist.core.MaterialInformation(file)
+            p = loaded.properties["thermal_conductivity_solid"]
+            assert p.value_type == mist.core.ValueTypes.TABLE
+            assert p.value_table == [[300.0, 10.0], [1000.0, 20.0]]
+            assert p.table_interpolation == "monotone_cubic"
+            assert p.table_extrapolation == "linear"
+            assert loaded.content_hash() == old_hash
+            mat.properties["solidus_eutectic_temperature"].value = 800.0
+            assert mat.content_hash() != old_hash
+
+            # Bulk output
+            os.makedirs(os.path.join(tmp_dir, "library"))
+            files = make_test_library(os.path.join(tmp_dir, "library"), 3)
+            files = mist.serialization.write_json_files(
+                files, os.path.join(tmp_dir, "out")
+            )
+            assert len(files) == 6
+            mat.name = "../escaped"
+            try:
+                mist.serialization.write_json_files([mat], os.path.join(tmp_dir, "out"))
+                assert False
+            except ValueError:
+                pass
+            assert not os.path.exists(os.path.join(tmp_dir, "escaped.json"))
+            jsonl_file = os.path.join(tmp_dir, "materials.jsonl")
+            assert mist.serialization.write_jsonl(files, jsonl_file) == 6
+            materials = list(mist.serialization.read_jsonl(jsonl_file))
+            assert [m.name for m in materials][:2] == ["SS316L_0", "SS316L_1"]
+            for file, material in zip(files, materials):
+                assert (
+                    material.content_hash()
+                    == mist.core.MaterialInformation(file).content_hash()
+                )
+
+    def test_validation(self):
+        mat = mist.core.MaterialInformation(os.path.join(EXAMPLES_DIR, "SS316L.json"))
+        report = mat.validate_completeness()
+        assert report.ok
+        assert report.targets == ["adamantine", "additivefoam", "3dthesis", "report"]
+
+        # AlCu only has what the microstructure models need
+        mat = mist.core.MaterialInformation(os.path.join(EXAMPLES_DIR, "AlCu.json"))
+        report = mat.validate_completeness()
+        assert not report.ok
+        assert report.ok_for("report")
+        assert not report.ok_for("3dthesis")
+        missing = [issue.property for issue in report.errors("3dthesis")]
+        assert "density" in missing and "dynamic_viscosity" not in missing
+
+        # Units, ranges, value types and consistency
+        mat = mist.core.MaterialInformation(os.path.join(EXAMPLES_DIR, "SS316L.json"))
+        mat.properties["density"].unit = "kg/m^2"
+        mat.properties["emissivity"].value = 1.5
+        mat.properties["liquidus_temperature"].value = 1600.0
+        mat.properties["latent_heat_fusion"] = mist.core.Property(
+            "latent_heat_fusion", "J/kg", value_laurent_poly=[[2.68e5, 0]]
+        )
+        report = mist.validation.validate_material(mat)
+        codes = {issue.property: issue.code for issue in report.issues}
+        assert codes["density"] == "unit"
+        assert codes["emissivity"] == "range"
+        assert codes["liquidus_temperature"] == "order"
+        assert codes["latent_heat_fusion"] == "value_type"
+        latent_heat = [i for i in report.issues if i.property == "latent_heat_fusion"]
+        assert latent_heat[0].targets == ["adamantine"]
+        assert not report.ok_for("3dthesis")
+        assert report.ok_for("report") is False  # emissivity is out of range
+
+        # Units are compared by dimension, and the ranges apply to the
+        # converted values. The input decks are written without converting,
+        # so only the report takes any unit of the right dimension.
+        mat = mist.core.MaterialInformation(os.path.join(EXAMPLES_DIR, "SS316L.json"))
+        mat.properties["density"].unit = "g/cm^3"
+        mat.properties["density"].value = 7.955
+        mat.properties["specific_heat_solid"].unit = "J/(kg K)"
+        report = mist.validation.validate_material(mat)
+        assert [(i.property, i.code) for i in report.issues] == [
+            ("density", "unit_scale")
+        ]
+        assert report.issues[0].targets == ["adamantine", "additivefoam", "3dthesis"]
+        assert report.ok_for("report")
+        mat.properties["density"].value = 7955.0
+        report = mist.validation.validate_material(mat, ["report"])
+        assert [(i.property, i.code) for i in report.issues] == [("density", "range")]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            make_test_library(tmp_dir, 2)
+            with open(os.path.join(tmp_dir, "broken.json"), "w") as f:
+                f.write('{"name": "broken"}')
+            reports = mist.validation.validate_batch(tmp_dir, ["3dthesis"], workers=2)
+            assert [r.material for r in reports] == [
+                "AlCu_0",
+                "AlCu_1",
+                "SS316L_0",
+                "SS316L_1",
+                "broken",
+            ]
+            assert [r.ok for r in reports] == [False, False, True, True, False]
+            assert reports[-1].issues[0].code == "load"
+            assert reports[2].to_dict()["ok"]
+
+            # Exports can reject incomplete materials up front
+            results = mist.batch.export_batch(
+                tmp_dir,
+                ["3dthesis"],
+                os.path.join(tmp_dir, "out"),
+                workers=1,
+                options={"validate": True},
+            )
+            assert [r.ok for r in results] == [False, False, True, True, False]
+            assert results[0].error.startswith("ValidationError")
+            assert not os.path.exists(os.path.join(tmp_dir, "out", "AlCu_0"))
+
+    def test_compact_properties(self):
+        import pickle
+
+        files = [os.path.join(EXAMPLES_DIR, "SS316L.json")] * 2
+        mat_1, mat_2 = [mist.core.MaterialInformation(file) for file in files]
+
+        # Properties are slotted and share their strings
+        p_1 = mat_1.properties["density"]
+        assert not hasattr(p_1, "__dict__")
+        assert p_1.reference is mat_2.properties["density"].reference
+        assert p_1.reference is mat_1.properties["specific_heat_solid"].reference
+        assert mat_1.thermophysical_property_names is (
+            mist.core.MaterialInformation.thermophysical_property_names
+        )
+        p_2 = pickle.loads(pickle.dumps(mat_1.properties["specific_heat_solid"]))
+        assert p_2.evaluate(1000.0) == mat_1.properties["specific_heat_solid"].evaluate(
+            1000.0
+        )
+        assert p_2.reference is p_1.reference
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files = make_test_library(tmp_dir, 3)
+            materials = [mist.core.MaterialInformation(file) for file in files]
+            store = mist.store.CoefficientStore(tmp_dir)
+            assert len(store) == 6
+            assert store.names[0] == "AlCu_0"
+
+            # All materials at once, nan where a property is missing
+            temperatures = np.linspace(300.0, 1600.0, 7)
+            values = store.evaluate("specific_heat_solid", temperatures)
+            assert values.shape == (6, 7)
+            assert np.all(np.isnan(values[:3]))
+            expected = (
+                materials[0].properties["specific_heat_solid"].evaluate(temperatures)
+            )
+            assert np.allclose(values[3], expected)
+            assert np.allclose(store.evaluate("density", 500.0)[3:], 7955.0)
+            assert list(store.defined("density")) == [False] * 3 + [True] * 3
+
+            # Each material at its own temperature
+            solidus = store.evaluate("solidus_eutectic_temperature", 0.0)
+            k = store.evaluate_at("thermal_conductivity_solid", solidus)
+            assert np.isclose(k[4], 26.9015)
+            assert store.get("SS316L_1", "thermal_conductivity_solid", 1670.0) == (
+                materials[1].get_property("thermal_conductivity_solid", "test", 1670.0)
+            )
+            assert store.get("AlCu_1", "density", 300.0) is None
+
+    def test_server(self):
+        # Batched evaluation over HTTP with a server running in a thread
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files = make_test_library(tmp_dir, 2)
+            mat = mist.core.MaterialInformation(files[0])
+            server = mist.server.PropertyServer(tmp_dir, cache_size=8)
+            thread = mist.server.ServerThread(server)
+            host, port = thread.address()[:2]
+            client = mist.server.PropertyClient(host, port)
+            try:
+                assert sorted(client.materials()) == [
+                    "AlCu_0",
+                    "AlCu_1",
+                    "SS316L_0",
+                    "SS316L_1",
+                ]
+                temperatures = np.linspace(300.0, 1600.0, 5)
+                values = client.evaluate(
+                    "SS316L_0", "thermal_conductivity_solid", temperatures
+                )
+                expected = mat.get_property(
+                    "thermal_conductivity_solid", "test", temperatures
+                )
+                assert np.allclose(values, expected)
+                assert client.evaluate("SS316L_0", "density", 500.0) == 7955.0
+
+                results = client.evaluate_batch(
+                    [
+                        {
+                            "material": "SS316L_1",
+                            "property": "thermal_conductivity_solid",
+                            "temperatures": temperatures.tolist(),
+                        },
+                        {
+                            "material": "AlCu_0",
+                            "property": "density",
+                            "temperatures": 1,
+                        },
+                        {
+                            "material": "Unknown",
+                            "property": "density",
+                            "temperatures": 1,
+                        },
+                    ]
+                )
+                assert np.allclose(results[0]["values"], expected)
+                assert results[1]["error"].startswith("KeyError")
+                assert results[2]["error"].startswith("KeyError")
+                try:
+                    client.evaluate("Unknown", "density", 1.0)
+                    assert False
+                except RuntimeError as e:
+                    assert "Unknown" in str(e)
+
+                # Repeated queries are served from the result cache
+                client.evaluate("SS316L_0", "density", 500.0)
+                stats = client.stats()
+                assert stats["requests"] == 6
+                assert stats["errors"] == 1
+                assert stats["evaluations"] == 7
+                assert stats["cache"]["hits"] == 1
+                assert stats["cache"]["misses"] == 3
+                assert stats["latency"]["p99"] >= stats["latency"]["p50"] > 0.0
+            finally:
+                client.close()
+                thread.stop()
+
+            # Cached results are invalidated when a property changes
+            p = server.library.load("SS316L_0").properties["density"]
+            p.value = 8000.0
+            assert server.evaluate("SS316L_0", "density", 500.0) == 8000.0
+
+            if hasattr(socket, "AF_UNIX"):
+                path = os.path.join(tmp_dir, "server.sock")
+                thread = mist.server.ServerThread(server, unix_socket=path)
+                client = mist.server.PropertyClient(unix_socket=path)
+                try:
+                    assert client.evaluate("SS316L_0", "density", 500.0) == 8000.0
+                finally:
+                    client.close()
+                    thread.stop()
+
+            # Connections still open are closed when the server stops
+            thread = mist.server.ServerThread(server)
+            host, port = thread.address()[:2]
+            client = mist.server.PropertyClient(host, port)
+            try:
+                assert client.evaluate("SS316L_0", "density", 500.0) == 8000.0
+                thread.stop()
+                assert len(server._connections) == 0
+                assert client.connection.sock.recv(1) == b""
+            finally:
+                client.close()
+
+    def test_uncertainty(self):
+        # Monte Carlo ensembles and ensemble input decks
+        mat = mist.core.MaterialInformation(os.path.join(EXAMPLES_DIR, "SS316L.json"))
+        assert mist.uncertainty.parse_uncertainty("None") is None
+        assert mist.uncertainty.parse_uncertainty("5%") == ("relative", 0.05)
+        assert mist.uncertainty.parse_uncertainty(2) == ("absolute", 2.0)
+
+        uncertainties = {
+            "density": "2%",
+            "specific_heat_solid": "5%",
+            "thermal_conductivity_solid": [0.5, 1e-3],
+            "solidus_eutectic_temperature": 10.0,
+        }
+        correlation = {("density", "specific_heat_solid"): -0.8}
+        ensemble = mist.uncertainty.Ensemble(
+            mat, 2000, uncertainties, correlation, seed=3
+        )
+        assert ensemble.variables == [
+            "density",
+            "specific_heat_solid",
+            "thermal_conductivity_solid[0]",
+            "thermal_conductivity_solid[1]",
+            "solidus_eutectic_temperature",
+        ]
+        assert abs(np.corrcoef(ensemble.samples[:, :2].T)[0, 1] + 0.8) < 0.05
+        density = ensemble.evaluate("density", 300.0)
+        assert density.shape == (2000,)
+        assert abs(np.std(density) / 7955.0 - 0.02) < 0.002
+
+        # Reproducible with a seed
+        again = mist.uncertainty.Ensemble(mat, 2000, uncertainties, correlation, seed=3)
+        assert np.array_equal(again.samples, ensemble.samples)
+
+        # The vectorized ensemble agrees with single realizations
+        temperatures = np.array([500.0, 1000.0])
+        realization = ensemble.realization(7)
+        for name in ["thermal_conductivity_solid", "specific_heat_solid"]:
+            assert np.allclose(
+                ensemble.evaluate(name, temperatures)[7],
+                realization.get_property(name, "test", temperatures),
+            )
+        inputs = ensemble.solver_inputs("adamantine")
+        expected = realization.adamantine_inputs()
+        for name in expected:
+            assert np.isclose(inputs[name][7], expected[name])
+
+        try:
+            mist.uncertainty.Ensemble(
+                mat, 10, uncertainties, {("density", "specific_heat_solid"): 1.5}
+            )
+            assert False
+        except ValueError:
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ensemble = mist.uncertainty.Ensemble(mat, 5, uncertainties, seed=0)
+            files = ensemble.write_decks(tmp_dir, "3dthesis", workers=2, chunk_size=2)
+            assert len(files) == 5
+            realization = ensemble.realization(4)
+            file = os.path.join(tmp_dir, "expected.txt")
+            realization.write_3dthesis_input(file)
+            with open(files[4], "r") as f, open(file, "r") as g:
+                for line, expected in zip(f, g):
+                    if line.startswith("\t"):
+                        assert np.isclose(
+                            float(line.split()[1]), float(expected.split()[1])
+                        )
+                    else:
+                        assert line == expected
+            with open(os.path.join(tmp_dir, "samples.csv"), "r") as f:
+                lines = f.read().splitlines()
+            assert len(lines) == 6
+            assert lines[0].startswith("sample,density,")
+
+    def test_composition_sweep(self):
+        # Properties of compositions mixed from two endpoint materials
+        import json
+
+        with open(os.path.join(EXAMPLES_DIR, "SS316L.json"), "r") as f:
+            data = json.load(f)
+        endpoints = []
+        for name, nickel, scale in [("Low", 10.0, 1.0), ("High", 14.0, 1.1)]:
+            data["name"] = name
+            data["composition"] = {
+                "base_element": "Fe",
+                "solute_elements": ["Ni"],
+                "Ni": {"value": nickel, "unit": "wt.%"},
+            }
+            mat = mist.core.MaterialInformation()
+            mat.load_dict(data)
+            for p in mat.properties.values():
+                if p.value_type == mist.core.ValueTypes.SCALAR:
+                    p.value = p.value * scale
+                else:
+                    p.value_laurent_poly = [
+                        [c * scale, e] for c, e in p.value_laurent_poly
+                    ]
+            endpoints.append(mat)
+
+        grid = mist.composition.composition_grid({"Ni": np.linspace(10.0, 14.0, 5)})
+        sweep = mist.composition.CompositionSweep(endpoints, grid)
+        assert len(sweep) == 5
+        assert np.allclose(sweep.weights[2], [0.5, 0.5])
+        assert not np.any(sweep.extrapolated)
+        density = sweep.evaluate("density", 300.0)
+        assert np.allclose(density, 7955.0 * np.linspace(1.0, 1.1, 5))
+        cp = sweep.evaluate("specific_heat_solid", [300.0, 900.0])
+        assert cp.shape == (5, 2)
+        assert np.allclose(
+            cp[0],
+            endpoints[0].get_property(
+                "specific_heat_solid", "test", np.array([300.0, 900.0])
+            ),
+        )
+
+        # Vegard's law with bowing, and a callable rule
+        vegard = mist.composition.CompositionSweep(
+            endpoints, grid, "vegard", {"density": 100.0}
+        )
+        assert np.allclose(
+            vegard.evaluate("density", 300.0),
+            density - 100.0 * np.array([0.0, 0.1875, 0.25, 0.1875, 0.0]),
+        )
+        custom = mist.composition.CompositionSweep(
+            endpoints, grid, mist.composition.linear_mixing
+        )
+        assert np.allclose(custom.evaluate("specific_heat_solid", [300.0, 900.0]), cp)
+        inputs = sweep.solver_inputs("adamantine")
+        assert np.allclose(
+            custom.solver_inputs("adamantine")["density"], inputs["density"]
+        )
+        assert np.allclose(inputs["solidus_temperature"][[0, 4]], [1670.0, 1837.0])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files = sweep.write_decks(tmp_dir, "adamantine")
+            assert len(files) == 5
+            file = os.path.join(tmp_dir, "expected.info")
+            endpoints[1].write_adamantine_input(file)
+            with open(files[4], "r") as f, open(file, "r") as g:
+                for line, expected in zip(f, g):
+                    for word, expected_word in zip(line.split(), expected.split()):
+                        try:
+                            assert np.isclose(float(word), float(expected_word))
+                        except ValueError:
+                            assert word == expected_word
+            assert os.path.exists(os.path.join(tmp_dir, "compositions.csv"))
+
+    def test_units(self):
+        # Unit parsing, cached conversions and evaluation in a requested unit
+        units = mist.units
+        for unit in ["J/(kg~K)", "K\\~at.\\~%", "at. \\%", "Pa/sqrt(m)", "None"]:
+            units.parse_unit(unit)
+        assert units.conversion("g/cm^3", "kg/m^3").scale == 1000.0
+        assert units.conversion("g/cm^3", "kg/m^3") is units.conversion(
+            "g/cm^3", "kg/m^3"
+        )
+        assert units.conversion("cal/(g~K)", "J/(kg~K)").scale == 4184.0
+        assert units.conversion("J/(kg~K)", "SI").is_identity
+        assert units.conversion("kg/m^3", "CGS").scale == 1e-3
+        assert np.isclose(units.convert(100.0, "degC", "degF"), 212.0)
+        assert units.conversion("at.\\~%", "None").scale == 0.01
+        try:
+            units.conversion("K", "m")
+            assert False
+        except ValueError:
+            pass
+        # Kelvin per at.% is not kelvin times 0.01, it is not converted at all
+        assert units.conversion("K\\~at.\\~%", "K~at.%").is_identity
+        for target in ["SI", "K", "None", "K~wt.%"]:
+            with self.assertRaises(ValueError):
+                units.conversion("K\\~at.\\~%", target)
+        with self.assertRaises(ValueError):
+            units.conversion("at.%", "wt.%")
+        alcu = mist.core.MaterialInformation(
+            os.path.join(os.path.dirname(__file__), "AlCu_test_in.json")
+        )
+        slope = alcu.phase_properties["alpha"].properties["liquidus_slope"]
+        assert slope.evaluate(unit=slope.unit) == slope.evaluate()
+        with self.assertRaises(ValueError):
+            slope.evaluate(unit="SI")
+
+        mat = mist.core.MaterialInformation(os.path.join(EXAMPLES_DIR, "SS316L.json"))
+        assert mat.get_property("density", "test", 300.0, "g/cm^3") == 7.955
+        assert mat.get_property("density", "test", 300.0) == 7955
+        assert np.isclose(
+            mat.get_property("liquidus_temperature", "test", None, "degC"), 1456.85
+        )
+        p = mat.properties["specific_heat_solid"]
+        temperatures = np.linspace(300.0, 1600.0, 11)
+        assert np.allclose(
+            p.evaluate(temperatures, "cal/(g~K)"), p.evaluate(temperatures) / 4184.0
+        )
+        assert p.compile("SI") is p.compile()
+        tables = mat.tabulate_properties(temperatures, unit="CGS")
+        assert np.allclose(
+            tables["thermal_conductivity_solid"],
+            1e5 * mat.properties["thermal_conductivity_solid"].evaluate(temperatures),
+        )
+
+        # A material with its density in g/cm^3 agrees with the SI one
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files = make_test_library(tmp_dir, 2)
+            cgs = mist.core.MaterialInformation(files[1])
+            cgs.properties["density"].unit = "g/cm^3"
+            cgs.properties["density"].value = 7.955
+            cgs.write_json(files[1])
+            store = mist.store.CoefficientStore(tmp_dir)
+            assert np.allclose(store.evaluate("density", 300.0, "SI")[2:], 7955.0)
+            assert store.get("SS316L_1", "density", 300.0, "kg/m^3") == 7955.0
+
+    def test_property_index(self):
+        # Range queries over a directory, persisted and updated incrementally
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            library_dir = os.path.join(tmp_dir, "library")
+            os.makedirs(library_dir)
+            files = make_test_library(library_dir, 3)
+            mat = mist.core.MaterialInformation(files[1])
+            mat.properties["liquidus_temperature"].value = 1800.0
+            mat.write_json(files[1])
+            with open(os.path.join(library_dir, "not_a_material.json"), "w") as f:
+                f.write("[]")
+
+            index_file = os.path.join(tmp_dir, "index.npz")
+            index = mist.query.PropertyIndex.open(library_dir, index_file)
+            assert len(index) == 6
+            assert sorted(index.query(liquidus_temperature=(1700.0, 1750.0))) == [
+                "SS316L_0",
+                "SS316L_2",
+            ]
+            k = mat.properties["thermal_conductivity_solid"].evaluate(1000.0)
+            assert index.query(
+                ("liquidus_temperature", 1700.0, None),
+                ("thermal_conductivity_solid", k - 1.0, k + 1.0, 1000.0),
+            ) == ["SS316L_0", "SS316L_1", "SS316L_2"]
+            assert index.query(("density", None, 7000.0, 300.0)) == []
+            assert list(index.select("liquidus_temperature", 1700.0)) == [3, 5, 4]
+            try:
+                index.query(("thermal_conductivity_solid", 0.0, None, 500.0))
+                assert False
+            except ValueError:
+                pass
+
+            # Reopening reads the saved index, changes are picked up
+            assert mist.query.PropertyIndex.load(index_file).names == index.names
+            mat.properties["liquidus_temperature"].value = 1720.25
+            mat.write_json(files[1])
+            os.remove(files[0])
+            index = mist.query.PropertyIndex.open(library_dir, index_file)
+            assert len(index) == 5
+            assert sorted(index.query(liquidus_temperature=(1700.0, 1750.0))) == [
+                "SS316L_1",
+                "SS316L_2",
+            ]
+            assert not index.update()
+
+    def test_incremental_export(self):
+        # Only stale decks are rewritten, tracked by a build manifest
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source_dir = os.path.join(tmp_dir, "materials")
+            output_dir = os.path.join(tmp_dir, "output")
+            os.makedirs(source_dir)
+            files = make_test_library(source_dir, 2)
+            targets = ["adamantine", "3dthesis", "markdown"]
+            options = {"initial_temperature": 300.0}
+
+            def export():
+                results = mist.batch.export_batch(
+                    source_dir, targets, output_dir, 1, options, incremental=True
+                )
+                return {
+                    (r.material, r.target): r for r in results if r.ok and not r.skipped
+                }
+
+            written = export()
+            assert len(written) == 8
+            assert os.path.exists(os.path.join(output_dir, ".mist-manifest.json"))
+            results = mist.batch.export_batch(
+                source_dir, targets, output_dir, 1, options, incremental=True
+            )
+            assert [r.skipped for r in results if r.ok] == [True] * 8
+            assert all(os.path.exists(file) for r in results for file in r.files)
+            # The failed AlCu decks are retried
+            assert [(r.material, r.target) for r in results if not r.ok] == [
+                ("AlCu_0", "adamantine"),
+                ("AlCu_0", "3dthesis"),
+                ("AlCu_1", "adamantine"),
+                ("AlCu_1", "3dthesis"),
+            ]
+            assert results[2].material == "AlCu_0" and results[2].skipped
+
+            # Editing a source rebuilds its decks only, changing an option the
+            # decks that depend on it
+            mat = mist.core.MaterialInformation(files[1])
+            mat.properties["liquidus_temperature"].value = 1800.0
+            mat.write_json(files[1])
+            assert sorted(export()) == [
+                ("SS316L_1", target) for target in sorted(targets)
+            ]
+            os.utime(files[0])
+            assert export() == {}
+            options["initial_temperature"] = 500.0
+            options["validate"] = False
+            assert sorted(export()) == [
+                ("SS316L_0", "3dthesis"),
+                ("SS316L_1", "3dthesis"),
+            ]
+
+            # Deleted or modified outputs are regenerated
+            deck = os.path.join(output_dir, "SS316L_0", "adamantine", "mistinput.info")
+            with open(deck, "a") as f:
+                f.write("# edited\n")
+            os.remove(os.path.join(output_dir, "SS316L_1", "markdown", "SS316L_1.md"))
+            assert sorted(export()) == [
+                ("SS316L_0", "adamantine"),
+                ("SS316L_1", "markdown"),
+            ]
+            with open(deck, "r") as f:
+                assert "# edited" not in f.read()
+
+            # Command line mode
+            status = mist.batch.main(
+                [source_dir, "-o", output_dir, "-t", "adamantine", "--incremental"]
+            )
+            assert status == 1
+
+    def test_phase_tensors(self):
+        # Phase properties as arrays over phases, solutes and temperatures
+        mat = mist.core.MaterialInformation(os.path.join(EXAMPLES_DIR, "AlCu.json"))
+        mat.composition["solute_elements"] = ["Cu", "Mg"]
+        diffusivities = mat.phase_properties["alpha"].properties.setdefault(
+            "solute_diffusivities", {}
+        )
+        diffusivities["Cu"] = mist.core.Property(
+            "Cu", "m^2/s", value_laurent_poly=[[1.0e-9, 0], [2.0e-6, -1]]
+        )
+        diffusivities["Mg"] = mist.core.Property(
+            "Mg", "cm^2/s", value_table=[[300.0, 1.0e-6], [900.0, 4.0e-5]]
+        )
+
+        tensors = mat.phase_tensors()
+        assert tensors.phases == ("liquid", "alpha", "theta")
+        assert tensors.solutes == ("Cu", "Mg")
+        assert np.allclose(
+            tensors.evaluate("liquidus_slope"), [np.nan, -7.67, 5.74], equal_nan=True
+        )
+        temperatures = np.linspace(300.0, 900.0, 7)
+        values = tensors.evaluate("solute_diffusivities", temperatures)
+        assert values.shape == (3, 2, 7)
+        assert tensors.axes("solute_diffusivities", temperatures) == (
+            "phase",
+            "solute",
+            "temperature",
+        )
+        assert np.all(
+            tensors.defined("solute_diffusivities") == [[1, 0], [1, 1], [0, 0]]
+        )
+        assert np.allclose(values[0, 0], 2.4e-9)
+        assert np.allclose(values[1, 0], 1.0e-9 + 2.0e-6 / temperatures)
+        assert np.allclose(values[1, 1], diffusivities["Mg"].evaluate(temperatures))
+        assert np.all(np.isnan(values[2]))
+        try:
+            tensors.evaluate("solute_diffusivities")
+            assert False
+        except ValueError:
+            pass
+        assert "solute_diffusivities" not in tensors.evaluate_all()
+        assert tensors.evaluate_all(500.0)["taylor_factor"].shape == (3,)
+
+        # Unit conversion is folded into the packed values
+        si = mat.phase_tensors(unit="SI")
+        values = si.evaluate("solute_diffusivities", temperatures)
+        assert np.allclose(
+            values[1, 1], 1.0e-4 * diffusivities["Mg"].evaluate(temperatures)
+        )
+        # Composition-relative units are kept, not converted
+        assert np.allclose(si.evaluate("liquidus_slope")[1:], [-7.67, 5.74])
+        assert (
+            si.units("liquidus_slope")[1]
+            == mat.phase_properties["alpha"].properties["liquidus_slope"].unit
+        )
+        assert np.allclose(si.evaluate("solubility_limit")[1:], [2.48, 31.9])
+        assert si.units("shear_modulus_base_element")[1] == "SI"
+
+    def test_derived_properties(self):
+        # Derived quantities evaluated through their dependency graph
+        mat = mist.core.MaterialInformation(os.path.join(EXAMPLES_DIR, "SS316L.json"))
+        derived = mat.derived_properties()
+        temperatures = np.linspace(300.0, 1600.0, 14)
+        values = derived.evaluate_many(
+            ["thermal_diffusivity_solid", "stefan_number"], temperatures
+        )
+        k = mat.properties["thermal_conductivity_solid"].evaluate(temperatures)
+        cp = mat.properties["specific_heat_solid"].evaluate(temperatures)
+        rho = mat.properties["density"].evaluate(temperatures)
+        assert np.allclose(values["thermal_diffusivity_solid"], k / (rho * cp))
+        freezing_range = (
+            mat.properties["liquidus_temperature"].value
+            - mat.properties["solidus_eutectic_temperature"].value
+        )
+        assert derived.evaluate("freezing_range") == freezing_range
+        assert np.allclose(
+            values["stefan_number"],
+            cp * freezing_range / mat.properties["latent_heat_fusion"].value,
+        )
+        # A single temperature gives a number
+        stefan_number = derived.evaluate("stefan_number", 500.0)
+        assert np.ndim(stefan_number) == 0
+        assert np.isclose(
+            stefan_number,
+            derived.evaluate("stefan_number", np.array([500.0, 600.0]))[0],
+        )
+
+        # Shared inputs are evaluated once and results are memoized until
+        # the material changes
+        registry = dict(mist.derived.REGISTRY)
+        calls = []
+
+        @mist.derived.register(
+            "heat_capacity_ratio", ["specific_heat_liquid", "cp_s"], registry=registry
+        )
+        def ratio(cp_l, cp_s):
+            return cp_l / cp_s
+
+        @mist.derived.register("cp_s", ["specific_heat_solid"], registry=registry)
+        def counted(cp):
+            calls.append(1)
+            return cp
+
+        derived = mist.derived.DerivedProperties(mat, registry=registry)
+        derived.evaluate_many(["heat_capacity_ratio", "cp_s"], temperatures)
+        derived.evaluate("heat_capacity_ratio", temperatures)
+        assert len(calls) == 1
+        mat.properties["specific_heat_solid"].value_laurent_poly = [[500.0, 0]]
+        assert np.allclose(derived.evaluate("cp_s", temperatures), 500.0)
+        assert len(calls) == 2
+
+        registry["cp_s"] = mist.derived.DerivedQuantity(
+            "cp_s", ["heat_capacity_ratio"], counted
+        )
+        try:
+            derived.evaluate("cp_s", [300.0])
+            assert False
+        except ValueError:
+            pass
+
+        # Phase properties and parameters, per solute
+        mat = mist.core.MaterialInformation(os.path.join(EXAMPLES_DIR, "AlCu.json"))
+        derived = mat.derived_properties(
+            phase="alpha",
+            parameters={"solute_contents": {"Cu": 2.0}, "partition_coefficient": 0.17},
+        )
+        assert abs(derived.evaluate("growth_restriction_factor") - 12.7322) < 1e-9
+        try:
+            mat.derived_properties().evaluate("growth_restriction_factor")
+            assert False
+        except KeyError:
+            pass
+
+    def test_streaming_reader(self):
+        # Materials streamed from JSON Lines and JSON array files
+        import gzip
+        import json
+
+        # Numbers split across chunks are only decoded once complete
+        for chunk_size in [1, 2, 3]:
+            stream = mist.serialization.JSONStream(
+                io.StringIO("12.5e1 3\n-7"), chunk_size
+            )
+            assert list(stream.values()) == [(1, 125.0), (1, 3), (2, -7)]
+            stream = mist.serialization.JSONStream(
+                io.StringIO("[1.5e3, -2,\n 1E-2]"), chunk_size
+            )
+            assert [v for line, v in stream.values()] == [1500.0, -2, 0.01]
+
+        # A malformed value does not make the reader buffer the whole file
+        f = io.StringIO('[{"a": 1},\n{"a" 1}' + ', {"b": 2}' * 10000 + "]")
+        stream = mist.serialization.JSONStream(f, 16, max_record_size=256)
+        values = stream.values()
+        assert next(values) == (1, {"a": 1})
+        with self.assertRaises(ValueError):
+            next(values)
+        assert f.tell() <= 1024
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            records = []
+            for example in ["SS316L", "AlCu"]:
+                mat = mist.core.MaterialInformation(
+                    os.path.join(EXAMPLES_DIR, example + ".json")
+                )
+                for i in range(3):
+                    mat.name = f"{example}_{i}"
+                    records.append(mat.to_dict())
+            names = [record["name"] for record in records]
+
+            array_file = os.path.join(tmp_dir, "materials.json")
+            with open(array_file, "w") as f:
+                json.dump(records, f, indent=2)
+            jsonl_file = os.path.join(tmp_dir, "materials.jsonl.gz")
+            with gzip.open(jsonl_file, "wt", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n\n")
+
+            for file in [array_file, jsonl_file]:
+                # Small chunks make values span several reads
+                materials = mist.serialization.read_materials(file, chunk_size=64)
+                assert [m.name for m in materials] == names
+                materials = mist.serialization.read_materials(
+                    file, names=["AlCu_1", "SS316L_2", "missing"]
+                )
+                assert [m.name for m in materials] == ["SS316L_2", "AlCu_1"]
+                materials = mist.serialization.read_materials(
+                    file,
+                    base_element="Al",
+                    solutes=["Cu"],
+                    where=lambda record: not record["name"].endswith("0"),
+                )
+                assert [m.name for m in materials] == ["AlCu_1", "AlCu_2"]
+
+            loaded = next(mist.serialization.read_materials(array_file))
+            assert loaded.to_dict() == records[0]
+
+            # Multi-material files can be exported directly, generators too
+            assert mist.serialization.is_multi_material_file(array_file)
+            assert not mist.serialization.is_multi_material_file(
+                os.path.join(EXAMPLES_DIR, "SS316L.json")
+            )
+            output_dir = os.path.join(tmp_dir, "output")
+            results = mist.batch.export_batch(array_file, ["3dthesis"], output_dir, 1)
+            assert [r.material for r in results if r.ok] == names[:3]
+            materials = mist.serialization.read_materials(
+                jsonl_file, where=lambda record: "composition" not in record
+            )
+            results = mist.batch.export_batch(materials, ["adamantine"], output_dir, 2)
+            assert [r.ok for r in results] == [True, True, True]
+
+            # Records that can not be read or loaded fail per item, with
+            # their file and line
+            bad_file = os.path.join(tmp_dir, "bad.jsonl")
+            no_note = {k: v for k, v in records[1].items() if k != "note"}
+            with open(bad_file, "w") as f:
+                f.write(json.dumps(records[0]) + "\n")
+                f.write('{"name": "broken", \n')
+                f.write(json.dumps(no_note) + "\n")
+                f.write(json.dumps(records[2]) + "\n")
+            for workers in [1, 2]:
+                results = mist.batch.export_batch(
+                    bad_file, ["3dthesis"], output_dir, workers
+                )
+                assert [r.material for r in results] == [
+                    names[0],
+                    bad_file + ":2",
+                    bad_file + ":3",
+                    names[2],
+                ]
+                assert [r.ok for r in results] == [True, False, False, True]
+                assert "JSONDecodeError" in results[1].error
+                assert "KeyError: 'note'" in results[2].error
+            reports = mist.validation.validate_batch(bad_file, ["3dthesis"], 2)
+            assert [r.ok for r in reports] == [True, False, False, True]
+            assert reports[1].file == bad_file + ":2"
+            assert reports[2].issues[0].code == "load"
+            with self.assertRaisesRegex(ValueError, "bad.jsonl:2"):
+                list(mist.serialization.read_materials(bad_file))
+
+            # A JSON array can not be read past a syntax error
+            bad_array = os.path.join(tmp_dir, "bad.json")
+            with open(bad_array, "w") as f:
+                f.write("[\n" + json.dumps(records[0]) + ",\n{]\n")
+            records_read = list(
+                mist.serialization.read_records(bad_array, chunk_size=16)
+            )
+            assert [r.line for r in records_read] == [2, 3]
+            assert records_read[0].load().name == names[0]
+            assert records_read[1].error is not None
+
 
 if __name__ == "__main__":
     unittest.main()